@@ -0,0 +1,55 @@
+"""
+Field decoders of the parser recipes against the Conversions calls they replace (user-038), in ns per call.
+
+The old conversions are timed inline, without the call of the method that wrapped them,
+so the decoders (one call through a functools.partial) start with that overhead.
+
+Usage (from the repository root):
+    python -m benchmarks.decoders [--number 200000] [--repeat 5]
+"""
+
+import argparse
+import timeit
+from decimal import Decimal
+
+from src.processing.parsers.decoders import get_decoder
+from src.utils.conversions import Conversions
+
+# (field, old conversion, recipe decoder spec, raw value): text mode reads str, 'mmap' mode reads bytes
+CASES = [
+    ('invoice_date (str)', "Conversions.convert_to_date('20250814')", 'date_yyyymmdd', '20250814'),
+    ('quantity (str)', "Conversions.to_int('0000012'.strip())", 'signed_int', '0000012'),
+    ('quantity (bytes, mmap)', "Conversions.to_int(b'0000012'.decode('latin-1').strip())", 'signed_int', b'0000012'),
+    ('net_price (str)', "Decimal('0012345') / 10000", ('scaled_decimal', 4), '0012345'),
+    ('net_price (bytes, mmap)', "Decimal(b'0012345'.decode('latin-1')) / 10000", ('scaled_decimal', 4), b'0012345'),
+    ('net_price (scaled int)', "Decimal('0012345') / 10000", 'scaled_int', '0012345'),
+    ('discount (str)', "Decimal('00150'.strip()) / 1000", ('scaled_decimal', 3), '00150'),
+    (
+        'total (str)',
+        "Conversions.to_decimal('000000001234567', default=Decimal('0')) / Decimal('10000')",
+        ('scaled_decimal', 4),
+        '000000001234567',
+    ),
+]
+
+
+def ns_per_call(statement: str, number: int, repeat: int, **names) -> float:
+    namespace = {'Conversions': Conversions, 'Decimal': Decimal, **names}
+    return min(timeit.repeat(statement, globals=namespace, number=number, repeat=repeat)) / number * 1e9
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--number', type=int, default=200_000)
+    arguments.add_argument('--repeat', type=int, default=5)
+    options = arguments.parse_args()
+
+    # The decoder is resolved once, as in the compiled recipes
+    for field_name, old, spec, value in CASES:
+        before = ns_per_call(old, options.number, options.repeat)
+        after = ns_per_call('decode(value)', options.number, options.repeat, decode=get_decoder(spec), value=value)
+        print(f'{field_name:24s} {before:7.0f} ns -> {after:6.0f} ns  x{before / after:.1f}')
+
+
+if __name__ == '__main__':
+    main()
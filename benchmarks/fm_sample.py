@@ -0,0 +1,62 @@
+"""Synthetic France Messagerie invoice files for the benchmarks (same layout as the handler's recipe)."""
+
+import random
+from pathlib import Path
+
+# Same seed, same file: runs on different commits compare the same input
+SEED = 1
+
+
+def _pad(text: str, width: int) -> str:
+    return text.ljust(width)[:width]
+
+
+def write_fm_file(path: Path, lines: int, seed: int = SEED) -> Path:
+    """Writes an invoice with `lines` detail lines (CRLF, cp1252), with its header, totals and footer lines."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='cp1252', newline='\r\n') as f:
+        f.write(
+            '1'
+            + '20250814'
+            + _pad('GEX1234', 7)
+            + ' ' * 7
+            + '01'
+            + ' ' * 32
+            + _pad('INV0000001', 10)
+            + 'EUR'
+            + ' ' * 12
+            + 'TF  F'
+            + ' ' * 20
+            + '\n'
+        )
+        # Totals of the lines, at the scales of the recipe: incl. tax 4, excl. tax 9 (price x discount factor)
+        including_tax = excluding_tax = 0
+        for i in range(lines):
+            quantity = rng.randint(1, 500)
+            net_price = rng.randint(1000, 99999)
+            bipad = rng.randint(0, 9999)
+            discount = rng.randint(0, 30000)
+            weight = rng.randint(0, 9999)
+            gross_price = rng.randint(0, 9999)
+            including_tax += gross_price * quantity
+            excluding_tax += net_price * (100000 - discount) * quantity
+            f.write(
+                '2'
+                + ' ' * 10
+                + f'{bipad:04d}01LB{i % 999999:06d}A{quantity:07d}'
+                + ' ' * 7
+                + _pad(f'PUBLICATION {i % 300}', 30)
+                + f'{i % 999999:06d} {net_price:010d}'
+                + ' ' * 14
+                + f'{discount:05d}'
+                + ' ' * 9
+                + f'{weight:04d}{gross_price:04d}'
+                + ' ' * 8
+                + f'{rng.randint(0, 210000):06d}'
+                + ' ' * 10
+                + '\n'
+            )
+        # The excl. tax total rounded to 4 decimal places, as in the real files
+        f.write('3' + ' ' * 15 + f'{including_tax:015d}{(excluding_tax + 50000) // 100000:015d}' + ' ' * 20 + '\n')
+        f.write('4' + _pad('END', 79) + '\n')
+    return path
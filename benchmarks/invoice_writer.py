@@ -0,0 +1,100 @@
+"""
+Write throughput of a France Messagerie invoice into ZPINVOICEV/ZPINVOICED (user-046, user-048), on SQLite:
+per-object ORM inserts, the Core executemany writer (create_invoice) and InvoiceWriter in chunked mode.
+
+Usage (from the repository root):
+    python -m benchmarks.invoice_writer [--lines 20000] [--chunk-lines 5000]
+
+SQLite has no fast_executemany: this compares the statements and the ORM overhead, not the SQL Server backend.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fm_sample import write_fm_file
+from benchmarks.parser_throughput import recipe
+from benchmarks.sqlite_invoices import invoice_database
+from src.models.data_models import FranceMessagerieFooter, FranceMessagerieHeader, FranceMessagerieInvoice
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.parsers.fixed_format_parser import FixedFormatParser
+from src.repositories.invoices.france_messagerie_invoice import FranceMessagerieInvoiceRepository
+from src.services import invoice_writer
+
+INVOICE_NUMBER = 'PI0000001'
+SUPPLIER = 'FM'
+
+
+def build_invoice(file_path: Path) -> FranceMessagerieInvoice:
+    """The converted invoice of a sample file, as the handler builds it (without the database lookups)."""
+    document = FixedFormatParser().parse(file_path, recipe('text'))
+    header = FranceMessagerieHeader(
+        invoice_date=document.header['invoice_date'],
+        gexpex_code=document.header['gexpex_code'],
+        nim_code=document.header['nim_code'],
+        invoice_number=document.header['invoice_number'],
+        currency=document.header['currency'],
+        transport_type='',
+        invoice_or_complement='',
+        invoice_or_credit_note='F',
+        is_liquidation=False,
+    )
+    return FranceMessagerieInvoice(
+        header=header,
+        details=FranceMessagerieHandler._convert_details(document)[0],
+        totals=[FranceMessagerieHandler._get_totals_data(raw) for raw in document.totals],
+        footer=FranceMessagerieFooter(footer_line=''),
+    )
+
+
+def write_orm(manager, invoice: FranceMessagerieInvoice) -> int:
+    """One ORM object per row, added to the session (what the bulk writer replaces)."""
+    header, lines = FranceMessagerieInvoiceRepository.invoice_rows(invoice, INVOICE_NUMBER, SUPPLIER)
+    with manager.get_db() as session:
+        session.add(PurchaseInvoiceHeader(**header))
+        session.add_all(PurchaseInvoiceLines(**line) for line in lines)
+    return len(invoice.details)
+
+
+def write_bulk(manager, invoice: FranceMessagerieInvoice) -> int:
+    with manager.get_db() as session:
+        return FranceMessagerieInvoiceRepository(session).create_invoice(invoice, INVOICE_NUMBER, SUPPLIER)
+
+
+def write_chunked(manager, invoice: FranceMessagerieInvoice, chunk_lines: int) -> int:
+    # InvoiceWriter works on the application's database manager
+    invoice_writer.db = manager
+    header, lines = FranceMessagerieInvoiceRepository.invoice_rows(invoice, INVOICE_NUMBER, SUPPLIER)
+    return invoice_writer.InvoiceWriter(chunk_lines).write(header, lines, len(invoice.details))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--lines', type=int, default=20_000)
+    arguments.add_argument('--chunk-lines', type=int, default=5_000)
+    options = arguments.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        invoice = build_invoice(write_fm_file(Path(folder) / 'fm.txt', options.lines))
+        writers = {
+            'ORM session.add': lambda manager: write_orm(manager, invoice),
+            'executemany (create_invoice)': lambda manager: write_bulk(manager, invoice),
+            f'InvoiceWriter, chunks of {options.chunk_lines}': lambda manager: write_chunked(
+                manager, invoice, options.chunk_lines
+            ),
+        }
+
+        print(f'{len(invoice.details)} lines per invoice:')
+        for index, (name, write) in enumerate(writers.items()):
+            manager = invoice_database(f'sqlite:///{Path(folder) / f"invoices_{index}.db"}')
+            start = time.perf_counter()
+            written = write(manager)
+            elapsed = time.perf_counter() - start
+            manager.close()
+            print(f'  {name:32s} {elapsed:6.2f}s  {written / elapsed:9,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
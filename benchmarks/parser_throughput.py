@@ -0,0 +1,59 @@
+"""
+Throughput of FixedFormatParser on a synthetic France Messagerie invoice (user-031).
+
+Usage (from the repository root):
+    python -m benchmarks.parser_throughput [--lines 300000] [--repeat 7]
+
+Run it on two commits to compare them: the input file is the same (fixed seed).
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fm_sample import write_fm_file
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.parsers.fixed_format_parser import FixedFormatParser
+
+
+def recipe(read_mode: str) -> dict:
+    config = FranceMessagerieHandler.get_parser_config(None)
+    config.pop('parser_type')
+    config['read_mode'] = read_mode
+    return config
+
+
+def time_parse(file_path: Path, config: dict, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        document = FixedFormatParser().parse(file_path, config)
+        timings.append(time.perf_counter() - start)
+        del document
+    return timings
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--lines', type=int, default=300_000)
+    arguments.add_argument('--repeat', type=int, default=7)
+    options = arguments.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = write_fm_file(Path(folder) / 'fm.txt', options.lines)
+        size_mb = file_path.stat().st_size / 2**20
+        print(f'{options.lines} detail lines, {size_mb:.1f} MB, best/median of {options.repeat} runs')
+
+        for read_mode in ('text', 'mmap'):
+            timings = time_parse(file_path, recipe(read_mode), options.repeat)
+            best = min(timings)
+            print(
+                f'  {read_mode:5s} best {best:.2f}s, median {statistics.median(timings):.2f}s '
+                f'({options.lines / best:,.0f} lines/s)'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Memory per record of the parsed and transfer models (user-040): object size, and memory retained by a whole file.
+
+Usage (from the repository root):
+    python -m benchmarks.record_memory [--lines 300000] [--rows 200000]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.fm_sample import SEED, write_fm_file
+from benchmarks.parser_throughput import recipe
+from src.models.data_models import FranceMessagerieFooter, FranceMessagerieTotals, RemoteFileInfo, TransferTask
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.handlers.mlp_handler import MlpHandler
+from src.processing.parsers.csv_format_parser import CsvParser
+from src.processing.parsers.fixed_format_parser import FixedFormatParser
+from src.utils.local_menus import ImportExport
+
+MB = 2**20
+
+
+def object_size(instance: object) -> int:
+    """Size of the instance itself, plus its __dict__ for classes without slots (the field values are not counted)."""
+    size = sys.getsizeof(instance)
+    if hasattr(instance, '__dict__'):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+def write_mlp_file(path: Path, rows: int, seed: int = SEED) -> Path:
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='latin-1', newline='') as f:
+        f.write('ID-PROD;QTY;DESC\n')
+        for i in range(rows):
+            f.write(f'P{i:07d};{rng.randint(1, 500)};Éd {i}\n')
+    return path
+
+
+def retained(build) -> tuple[object, float, float]:
+    """Runs `build()` under tracemalloc: (result, MB still allocated, peak MB)."""
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / MB, peak / MB
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--lines', type=int, default=300_000)
+    arguments.add_argument('--rows', type=int, default=200_000)
+    options = arguments.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        fm_file = write_fm_file(Path(folder) / 'fm.txt', options.lines)
+        mlp_file = write_mlp_file(Path(folder) / 'mlp.csv', options.rows)
+
+        parsed = FixedFormatParser().parse(fm_file, recipe('text'))
+        convert = FranceMessagerieHandler._convert_details
+
+        print('Object size (bytes, without the field values):')
+        samples = {
+            'FranceMessagerieDetailLine': FranceMessagerieHandler._get_details_data(next(iter(parsed.details))),
+            'FranceMessagerieTotals': FranceMessagerieTotals(0, 0),
+            'FranceMessagerieFooter': FranceMessagerieFooter(footer_line=''),
+            'TransferTask': TransferTask(True, ImportExport.IMPORT, 1, True),
+            'RemoteFileInfo': RemoteFileInfo(name='fm.txt', mtime=0.0, size=0),
+        }
+        for name, instance in samples.items():
+            print(f'  {name:28s} {object_size(instance):5d}')
+
+        start = time.perf_counter()
+        (details, _), current, peak = retained(lambda: convert(parsed))
+        elapsed = time.perf_counter() - start
+        print(
+            f'{len(details)} converted detail lines: {current:.0f} MB retained, {peak:.0f} MB peak '
+            f'({elapsed:.2f}s under tracemalloc)'
+        )
+        del details
+
+        config = MlpHandler.get_parser_config(None)
+        config.pop('parser_type')
+        rows, current, peak = retained(lambda: CsvParser().parse(mlp_file, config))
+        print(f'{len(rows)} MlpRow from the CSV parser: {current:.0f} MB retained, {peak:.0f} MB peak')
+
+
+if __name__ == '__main__':
+    main()
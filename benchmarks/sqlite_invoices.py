@@ -0,0 +1,75 @@
+"""
+The Sage X3 tables of the models on SQLite, for the invoice writer benchmark and the tests: the SQL Server
+types, collation and functions they use are mapped to SQLite, and transactions (with savepoints) behave
+as on SQL Server.
+"""
+
+import uuid
+from collections.abc import Iterable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Unicode, event
+from sqlalchemy.dialects.mssql import TINYINT
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+
+from src.database.base import Base
+from src.database.database import DatabaseManager
+from src.models import counter, edi_partner, edition, publication  # noqa: F401 (registers the models)
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+
+INVOICE_TABLES = (PurchaseInvoiceHeader.__table__, PurchaseInvoiceLines.__table__)
+
+# ZREFPUB has no model (see publication_repository.ZREFPUB): the columns that are used
+ZREFPUB = Table(
+    'ZREFPUB',
+    MetaData(),
+    Column('CODPUB_0', Unicode(7)),
+    Column('BPSREF_0', Unicode(15)),
+    Column('REFEDI_0', Unicode(20)),
+    Column('DIADIS_0', Integer),
+    Column('ENAFLG_0', Integer),
+    Column('UPDDATTIM_0', DateTime),
+)
+
+# Every table of the models, and ZREFPUB
+X3_TABLES = (*Base.metadata.sorted_tables, ZREFPUB)
+
+
+@compiles(TINYINT, 'sqlite')
+def _tinyint_on_sqlite(type_, compiler, **kw):
+    return 'INTEGER'
+
+
+@compiles(CreateColumn, 'sqlite')
+def _rowid_on_sqlite(element, compiler, **kw):
+    # The Sage X3 ROWID identity: an INTEGER primary key is SQLite's own auto-incremented row id
+    if element.element.name == 'ROWID':
+        return 'ROWID INTEGER NOT NULL'
+    return compiler.visit_create_column(element, **kw)
+
+
+def _binary_collation(left: str, right: str) -> int:
+    return (left > right) - (left < right)
+
+
+def invoice_database(url: str, tables: Iterable[Table] = INVOICE_TABLES) -> DatabaseManager:
+    """
+    A database manager on a SQLite URL, with the given (empty) tables: the invoice tables by default.
+    Use a file: the chunked writes keep their stage table on one connection.
+    """
+    manager = DatabaseManager(url)
+
+    @event.listens_for(manager.engine, 'connect')
+    def _sql_server_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_collation('Latin1_General_BIN2', _binary_collation)
+        dbapi_connection.create_function('newid', 0, lambda: uuid.uuid4().bytes)
+        # The transactions are begun by SQLAlchemy (below), so that SAVEPOINT and DDL are transactional
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(manager.engine, 'begin')
+    def _begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+    for table in tables:
+        table.create(manager.engine)
+    return manager
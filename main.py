@@ -5,9 +5,11 @@ from typing import Optional
 
 from src.config.logging import setup_logging
 from src.database.database import db
+from src.processing.parsers.parallel import shutdown_process_pool
 from src.repositories.publication_repository import PublicationRepository
-from src.scheduler.scheduler import run_scheduler, setup_schedules, stop_event
-from src.services.provider_service import get_active_providers
+from src.scheduler.outbox_watcher import start_outbox_watcher
+from src.scheduler.scheduler import run_provider_upload_job, run_scheduler, setup_schedules, stop_event
+from src.services.provider_service import get_active_providers, preload_supplier_data
 from src.services.transfer_service import process_provider_transfer
 
 
@@ -33,6 +35,8 @@ def run_debug_mode(provider_id: Optional[str] = None):
         logger.warning('Nenhum fornecedor ativo encontrado para processar.')
         return
 
+    preload_supplier_data(providers)
+
     for provider in providers:
         process_provider_transfer(provider)
 
@@ -51,6 +55,8 @@ def start_scheduler_service():
         logger.info('Nenhuma tarefa a ser executada. Encerrando.')
         return
 
+    preload_supplier_data(providers)
+
     # Passo 2: Configurar os agendamentos dos fornecedores
     setup_schedules(providers)
 
@@ -58,10 +64,13 @@ def start_scheduler_service():
     scheduler_thread = threading.Thread(target=run_scheduler)
     scheduler_thread.start()
 
+    # Passo 4: Observar as pastas de output para enviar ficheiros assim que são criados
+    watcher_thread = start_outbox_watcher(providers, run_provider_upload_job, stop_event)
+
     logger.info('Thread principal a aguardar. O agendador está a correr em segundo plano.')
     logger.info('Pressione Ctrl+C para parar o serviço.')
 
-    # 4. Manter o programa principal a correr.
+    # 5. Manter o programa principal a correr.
     #    No futuro, é AQUI que você iniciaria o seu servidor de API (Flask/FastAPI).
     try:
         # O programa principal vai ficar aqui à espera até ser interrompido.
@@ -70,12 +79,17 @@ def start_scheduler_service():
     except KeyboardInterrupt:
         logger.info('Recebido sinal de interrupção (Ctrl+C). Iniciar paragem graciosa...')
     finally:
-        # 5. Lógica de paragem graciosa
+        # 6. Lógica de paragem graciosa
         logger.info('Sinalizar à thread do agendador para parar...')
         stop_event.set()
 
         # Espera que a thread do agendador termine o seu ciclo atual.
         scheduler_thread.join(timeout=5)  # Espera no máximo 5 segundos
+        if watcher_thread:
+            watcher_thread.join(timeout=5)
+
+        # Termina os processos usados no parsing paralelo de ficheiros grandes
+        shutdown_process_pool()
 
 
 def main():
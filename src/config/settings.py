@@ -1,4 +1,5 @@
 from datetime import date, datetime
+from decimal import Decimal
 from pathlib import Path
 
 from decouple import config
@@ -13,6 +14,8 @@ SCHEMA = str(config('DB_SCHEMA', default='', cast=str))
 USERNAME = str(config('DB_USERNAME', default='', cast=str))
 PASSWORD = str(config('DB_PASSWORD', default='', cast=str))
 PORT = int(config('DB_PORT', default=1433, cast=int))
+# ODBC driver, only used with the pyodbc backend (BULK_WRITE_FAST_EXECUTEMANY)
+DRIVER = str(config('DB_DRIVER', default='ODBC Driver 18 for SQL Server', cast=str))
 
 
 # Debug mode
@@ -32,6 +35,21 @@ LOG_ERROR_FILE_LEVEL = 'ERROR'
 # SFTP settings
 STANDARD_FOLDER = str(config('STANDARD_FOLDER', default='logs/ftp'))
 
+# High-water marks of the incremental remote scans (providers that never delete remote files)
+WATERMARK_FILE = str(config('WATERMARK_FILE', default=f'{STANDARD_FOLDER}/watermarks.json'))
+
+# Parsing in worker processes (large files split by lines, and several files side by side)
+PARALLEL_PARSING = {
+    # Number of worker processes (0 = one per CPU core; 1 disables parallel parsing)
+    'PARSE_WORKERS': config('PARSE_WORKERS', default=0, cast=int),
+    # Files smaller than this (MB) are always parsed in the current process
+    'PARSE_PARALLEL_MIN_MB': config('PARSE_PARALLEL_MIN_MB', default=64, cast=int),
+    # Size (MB) of the line-aligned byte ranges handed to each worker
+    'PARSE_CHUNK_MB': config('PARSE_CHUNK_MB', default=16, cast=int),
+    # Parse the files downloaded in the same run side by side in the worker processes
+    'PARSE_FILES_IN_POOL': config('PARSE_FILES_IN_POOL', default=True, cast=bool),
+}
+
 # Sage X3 database table settings
 DEFAULT_LEGACY_DATE = date(1753, 1, 1)
 DEFAULT_LEGACY_DATETIME = datetime(1753, 1, 1)
@@ -52,3 +70,55 @@ SCHEDULING = {
     # Execute immediately if the script is started within the allowed time
     'SCHEDULE_RUN_IMMEDIATELY': config('SCHEDULE_RUN_IMMEDIATELY', default=True, cast=bool),
 }
+
+# Outbox watcher settings
+OUTBOX_WATCHER = {
+    'WATCHER_ENABLED': config('OUTBOX_WATCHER_ENABLED', default=True, cast=bool),
+    # Seconds without new files before triggering the upload (debounce)
+    'WATCHER_DEBOUNCE_SECONDS': config('OUTBOX_WATCHER_DEBOUNCE_SECONDS', default=2.0, cast=float),
+    # Maximum seconds a detected file waits for its upload, even if new files keep arriving
+    'WATCHER_MAX_DELAY_SECONDS': config('OUTBOX_WATCHER_MAX_DELAY_SECONDS', default=15.0, cast=float),
+    # Polling interval of the scandir fallback (used when inotify is not available)
+    'WATCHER_POLL_SECONDS': config('OUTBOX_WATCHER_POLL_SECONDS', default=5.0, cast=float),
+}
+
+# Bulk writes of the invoices
+BULK_WRITE = {
+    # Rows per executemany batch
+    'WRITE_BATCH_SIZE': config('BULK_WRITE_BATCH_SIZE', default=1000, cast=int),
+    # Connect with pyodbc (and DB_DRIVER) and send each batch as one parameter array (fast_executemany).
+    # Requires the pyodbc package and the ODBC driver; the default backend is pymssql
+    'WRITE_FAST_EXECUTEMANY': config('BULK_WRITE_FAST_EXECUTEMANY', default=False, cast=bool),
+    # Invoices with more lines are written in chunked mode: staged in a temporary table, one transaction
+    # per chunk of this many lines, then published with their header in one short transaction
+    # (0 = always one transaction)
+    'WRITE_CHUNK_LINES': config('BULK_WRITE_CHUNK_LINES', default=10000, cast=int),
+}
+
+# Reconciliation of the detail lines with the totals lines of the invoices, before any database work
+TOTALS_RECONCILIATION = {
+    'RECONCILE_ENABLED': config('TOTALS_RECONCILE_ENABLED', default=True, cast=bool),
+    # Largest accepted difference between a total and the sum of the lines (currency units)
+    'RECONCILE_TOLERANCE': config('TOTALS_RECONCILE_TOLERANCE', default='0.01', cast=Decimal),
+}
+
+# Ledger of the ingested invoices, checked before a file is parsed
+INGESTION_LEDGER = {
+    'LEDGER_ENABLED': config('INGESTION_LEDGER_ENABLED', default=True, cast=bool),
+    # Records of the ingested files (supplier, invoice number, checksum), appended to a JSON lines file
+    'LEDGER_FILE': str(config('INGESTION_LEDGER_FILE', default=f'{STANDARD_FOLDER}/ingestion_ledger.jsonl')),
+    # Records kept; older invoices are still found in ZPINVOICEV
+    'LEDGER_MAX_KEYS': config('INGESTION_LEDGER_MAX_KEYS', default=100000, cast=int),
+}
+
+# In-process cache of reference data (publications and editions)
+REFERENCE_CACHE = {
+    'CACHE_ENABLED': config('REFERENCE_CACHE_ENABLED', default=True, cast=bool),
+    # Maximum entries per cache; the least recently used are evicted first
+    'CACHE_MAX_ENTRIES': config('REFERENCE_CACHE_MAX_ENTRIES', default=50000, cast=int),
+    # Lifetime of the entries found, and of the lookups that found nothing
+    'CACHE_TTL_SECONDS': config('REFERENCE_CACHE_TTL_SECONDS', default=3600.0, cast=float),
+    'CACHE_NEGATIVE_TTL_SECONDS': config('REFERENCE_CACHE_NEGATIVE_TTL_SECONDS', default=300.0, cast=float),
+    # Interval between checks of the tables' latest update (UPDDATTIM_0); a change clears the cache
+    'CACHE_CHANGE_CHECK_SECONDS': config('REFERENCE_CACHE_CHANGE_CHECK_SECONDS', default=60.0, cast=float),
+}
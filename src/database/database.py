@@ -16,9 +16,13 @@ logger = logging.getLogger(__name__)
 class DatabaseManager:
     """Database session manager."""
 
-    def __init__(self, url: str, echo: bool = False):
-        """Initialize the database session manager."""
-        self.engine = create_engine(url, echo=echo)
+    def __init__(self, url: str, echo: bool = False, fast_executemany: bool = False):
+        """
+        Initialize the database session manager.
+        With `fast_executemany` (pyodbc URLs only), executemany sends each batch as one parameter array.
+        """
+        engine_options = {'fast_executemany': True} if fast_executemany else {}
+        self.engine = create_engine(url, echo=echo, **engine_options)
         self.SessionLocal = sessionmaker(
             bind=self.engine,
             autoflush=False,
@@ -75,14 +79,18 @@ DB_SETTINGS = {
     'USERNAME': settings.USERNAME,
     'PASSWORD': settings.PASSWORD,
     'PORT': settings.PORT,
+    'DRIVER': settings.DRIVER,
 }
 
-DB_CONNECTION_STRING = Generics().build_connection_string(config=DB_SETTINGS)
+# The pyodbc backend is only used for its fast_executemany bulk inserts
+USE_FAST_EXECUTEMANY = settings.BULK_WRITE['WRITE_FAST_EXECUTEMANY']
+
+DB_CONNECTION_STRING = Generics().build_connection_string(config=DB_SETTINGS, use_pyodbc=USE_FAST_EXECUTEMANY)
 
 if DB_CONNECTION_STRING:
     try:
         # Passe echo=True para ver as queries SQL geradas, False para produção
-        db = DatabaseManager(url=DB_CONNECTION_STRING, echo=True)  # type: ignore
+        db = DatabaseManager(url=DB_CONNECTION_STRING, echo=True, fast_executemany=USE_FAST_EXECUTEMANY)  # type: ignore
         logger.info('DatabaseSessionManager initialized successfully.')
     except ValueError as ve:  # Erro específico da nossa validação de URL
         logger.error(f'Configuration Error: {ve}')
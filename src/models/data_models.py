@@ -1,13 +1,23 @@
 from dataclasses import dataclass, field
 from datetime import date
 from decimal import Decimal
-from typing import Optional
+from typing import ClassVar, Optional
 
 from src.models.edition import Edition
 from src.utils.local_menus import ImportExport
+from src.utils.money import rescale, to_decimal
 
+# Casas decimais implícitas dos valores da France Messagerie, guardados em inteiros escalados
+FM_PRICE_SCALE = 4  # preços, montantes, imposto e peso (1/10000)
+FM_DISCOUNT_SCALE = 3  # desconto, em percentagem (1/1000)
+FM_DISCOUNT_FACTOR_SCALE = 5  # 1 - desconto / 100 (desconto / 100 cai na escala 5)
+# Valores com desconto aplicado: preço (escala 4) x (1 - desconto / 100) (escala 5), sem arredondamentos
+FM_DISCOUNTED_SCALE = FM_PRICE_SCALE + FM_DISCOUNT_FACTOR_SCALE
+# Somas da conferência dos totais: a escala dos montantes com desconto
+FM_RECONCILE_SCALE = FM_DISCOUNTED_SCALE
 
-@dataclass
+
+@dataclass(slots=True)
 class TransferTask:
     """Representa uma única tarefa de transferência definida pelos arrays."""
 
@@ -19,7 +29,16 @@ class TransferTask:
     filename: str = field(default='')
 
 
-@dataclass
+@dataclass(slots=True)
+class RemoteFileInfo:
+    """Representa um ficheiro remoto listado com os seus metadados (quando o servidor os fornece)."""
+
+    name: str
+    mtime: Optional[float] = None
+    size: Optional[int] = None
+
+
+@dataclass(slots=True)
 class FranceMessagerieHeader:
     """Representa o cabeçalho do ficheiro da France Messagerie."""
 
@@ -34,9 +53,26 @@ class FranceMessagerieHeader:
     is_liquidation: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class FranceMessagerieDetailLine:
-    """Representa uma linha de detalhe do ficheiro da France Messagerie."""
+    """
+    Representa uma linha de detalhe do ficheiro da France Messagerie.
+
+    Os preços, montantes, desconto, imposto e peso são inteiros escalados (vírgula fixa),
+    com as casas decimais indicadas em `SCALES`. `decimal_amounts()` converte-os para Decimal.
+    """
+
+    SCALES: ClassVar[dict[str, int]] = {
+        'net_price': FM_PRICE_SCALE,
+        'discount': FM_DISCOUNT_SCALE,
+        'weight': FM_PRICE_SCALE,
+        'gross_price': FM_PRICE_SCALE,
+        'tax': FM_PRICE_SCALE,
+        'amount_with_tax': FM_PRICE_SCALE,
+        'amount_without_tax': FM_PRICE_SCALE,
+        'net_price_with_discount': FM_DISCOUNTED_SCALE,
+        'amount_without_tax_with_discount': FM_DISCOUNTED_SCALE,
+    }
 
     bipad: str
     extension: str
@@ -46,30 +82,90 @@ class FranceMessagerieDetailLine:
     description: str
     chrono: str
     quantity: int
-    net_price: Decimal
+    net_price: int
     original_invoice: str
     correction_type: str
-    discount: Decimal
-    weight: Decimal
-    gross_price: Decimal
-    tax: Decimal
-    amount_with_tax: Decimal
-    amount_without_tax: Decimal
-    net_price_with_discount: Decimal
-    amount_without_tax_with_discount: Decimal
+    discount: int
+    weight: int
+    gross_price: int
+    tax: int
+    amount_with_tax: int
+    amount_without_tax: int
+    net_price_with_discount: int
+    amount_without_tax_with_discount: int
     edition_object: Optional['Edition'] = None
+    # Códigos da edição resolvida (ITMREF_0 e CODPUB_0), copiados do Edition enquanto a sessão está aberta:
+    # as linhas da fatura são escritas depois do commit, que expira os objetos da sessão
+    edition_code: str = ''
+    publication_code: str = ''
     action: str = field(default='ignore')  # e.g., 'insert', 'update', 'delete'
 
+    def decimal_amounts(self) -> dict[str, Decimal]:
+        """Os valores escalados convertidos para Decimal, para a escrita na base de dados."""
+        return {name: to_decimal(getattr(self, name), scale) for name, scale in self.SCALES.items()}
 
-@dataclass
-class FranceMessagerieTotals:
-    """Representa os totais do ficheiro da France Messagerie."""
-
-    total_amount_including_tax: Decimal
-    total_amount_excluding_tax: Decimal
 
-
-@dataclass
+@dataclass(slots=True)
+class FranceMessagerieTotals:
+    """Representa os totais do ficheiro da France Messagerie, em inteiros escalados (1/10000)."""
+
+    SCALES: ClassVar[dict[str, int]] = {
+        'total_amount_including_tax': FM_PRICE_SCALE,
+        'total_amount_excluding_tax': FM_PRICE_SCALE,
+    }
+
+    total_amount_including_tax: int
+    total_amount_excluding_tax: int
+
+    def decimal_amounts(self) -> dict[str, Decimal]:
+        """Os totais convertidos para Decimal, para a escrita na base de dados."""
+        return {name: to_decimal(getattr(self, name), scale) for name, scale in self.SCALES.items()}
+
+
+@dataclass(slots=True)
+class FranceMessagerieRunningTotals:
+    """
+    Somas dos montantes das linhas de detalhe, acumuladas à medida que as linhas são convertidas,
+    para conferir com as linhas de totais (tipo 3). Inteiros escalados na escala FM_RECONCILE_SCALE.
+
+    São somados os montantes que são gravados nas linhas da fatura (ZPINVOICED): com imposto e
+    sem imposto com desconto. As quantidades têm o sinal do ficheiro, pelo que as linhas de crédito
+    e de devolução são subtraídas.
+    """
+
+    total_amount_including_tax: int = 0
+    total_amount_excluding_tax: int = 0
+
+    def add(self, detail: FranceMessagerieDetailLine):
+        """Soma os montantes de uma linha de detalhe."""
+        self.total_amount_including_tax += rescale(detail.amount_with_tax, FM_PRICE_SCALE, FM_RECONCILE_SCALE)
+        self.total_amount_excluding_tax += rescale(
+            detail.amount_without_tax_with_discount, FM_DISCOUNTED_SCALE, FM_RECONCILE_SCALE
+        )
+
+    def mismatches(
+        self, totals: list[FranceMessagerieTotals], tolerance: Decimal
+    ) -> dict[str, tuple[Decimal, Decimal]]:
+        """
+        Os totais em que a soma das linhas de detalhe difere das linhas de totais mais do que `tolerance`.
+
+        Returns:
+            dict: {nome do total: (valor das linhas de totais, soma das linhas de detalhe)}.
+        """
+        max_difference = int(tolerance.scaleb(FM_RECONCILE_SCALE))
+        mismatches: dict[str, tuple[Decimal, Decimal]] = {}
+        for name, scale in FranceMessagerieTotals.SCALES.items():
+            expected = sum(rescale(getattr(total, name), scale, FM_RECONCILE_SCALE) for total in totals)
+            computed = getattr(self, name)
+            if abs(expected - computed) > max_difference:
+                mismatches[name] = (
+                    to_decimal(expected, FM_RECONCILE_SCALE),
+                    to_decimal(computed, FM_RECONCILE_SCALE),
+                )
+        return mismatches
+
+
+@dataclass(slots=True)
 class FranceMessagerieFooter:
     """Representa o rodapé do ficheiro da France Messagerie."""
 
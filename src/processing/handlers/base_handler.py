@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
+from src.models.data_models import TransferTask
 from src.models.edi_partner import EdiPartner
 from src.utils.generics import Generics
 
@@ -26,9 +27,11 @@ class BaseHandler(ABC):
     the business logic for processing the parsed data.
     """
 
-    def __init__(self, provider: EdiPartner):
+    def __init__(self, provider: EdiPartner, task: Optional[TransferTask] = None):
         self.provider = provider
         self.provider_id = provider.provider
+        # The transfer task that brought the files (its index selects the provider's per-task settings)
+        self.task = task
 
     def get_archive_path(self, original_file_path: Path) -> Path:
         """
@@ -53,6 +56,26 @@ class BaseHandler(ABC):
         error_dir.mkdir(parents=True, exist_ok=True)
         return error_dir / original_file_path.name
 
+    @staticmethod
+    def get_duplicate_path(original_file_path: Path) -> Path:
+        """
+        Determines the destination path for files rejected as duplicates (already ingested).
+        Subclasses can override this.
+
+        The default is: <original_path>/DUPLICATE/<filename>
+        """
+        duplicate_dir = original_file_path.parent / 'DUPLICATE'
+        duplicate_dir.mkdir(parents=True, exist_ok=True)
+        return duplicate_dir / original_file_path.name
+
+    def get_invoice_reference(self, file_path: Path) -> Optional[str]:  # noqa: PLR6301
+        """
+        Reads the supplier's invoice number from the file without parsing it (e.g. from the
+        header line), for the duplicate check done before parsing. Files of handlers that
+        return None are only recognized as duplicates by their checksum.
+        """
+        return None
+
     @abstractmethod
     def get_parser_config(self) -> Dict[str, Any]:
         """
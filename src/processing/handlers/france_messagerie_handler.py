@@ -1,25 +1,39 @@
 import logging
+from collections.abc import Mapping, Sequence
 from datetime import date
-from decimal import Decimal
-from typing import Any
+from operator import mul
+from pathlib import Path
+from typing import Any, Optional, Union
 
 from sqlalchemy.orm import Session
 
+from src.config.settings import TOTALS_RECONCILIATION
 from src.database.database import db
 from src.database.database_core import DatabaseCoreManager
 from src.models.data_models import (
+    FM_DISCOUNT_FACTOR_SCALE,
     FranceMessagerieDetailLine,
     FranceMessagerieFooter,
     FranceMessagerieHeader,
     FranceMessagerieInvoice,
+    FranceMessagerieRunningTotals,
     FranceMessagerieTotals,
 )
-from src.models.edition import Edition
 from src.processing.handlers.base_handler import BaseHandler, register_handler
-from src.processing.parsers.fixed_format_parser import ParsedDocumentRaw
-from src.repositories.edition_repository import EditionRepository
+from src.processing.parsers.columnar import ColumnarDetails
+from src.processing.parsers.fixed_format_parser import FixedFormatParser, ParsedDocumentRaw
+from src.repositories.edition_repository import (
+    MASTER_DATA_ATTRIBUTES,
+    EditionRepository,
+    EditionRow,
+    EditionsMap,
+    EditorKey,
+)
+from src.repositories.invoices.france_messagerie_invoice import FranceMessagerieInvoiceRepository
+from src.repositories.publication_repository import PublicationRepository
 from src.repositories.supplier_repository import SupplierRepository
-from src.utils.conversions import Conversions
+from src.services.counter_service import CounterService
+from src.services.invoice_writer import InvoiceWriter
 from src.utils.local_menus import YesNo
 
 logger = logging.getLogger(__name__)
@@ -34,6 +48,8 @@ class FranceMessagerieHandler(BaseHandler):
         return {
             'parser_type': 'FIXED_FORMAT',
             'encoding': 'cp1252',  # Specific encoding for this provider
+            'read_mode': 'mmap',  # Large files: read as bytes and decode only the fields that are used
+            'detail_layout': 'columnar',  # One sequence per field: the details are converted column by column
             'data_model': FranceMessagerieInvoice,
             'header_model': FranceMessagerieHeader,
             'detail_model': FranceMessagerieDetailLine,
@@ -42,7 +58,7 @@ class FranceMessagerieHandler(BaseHandler):
             'line_definitions': {
                 'header': (0, 1, '1'),
                 'detail': (0, 1, '2'),
-                'total': (0, 1, '3'),
+                'totals': (0, 1, '3'),
                 'footer': (0, 1, '4'),
             },
             'header_map': {
@@ -83,8 +99,38 @@ class FranceMessagerieHandler(BaseHandler):
             'footer_map': {
                 'footer_line': (1, 80),
             },
+            # Fast decoders for the typed fields. Amounts have an implied decimal point and are
+            # kept as scaled integers (see FranceMessagerieDetailLine.SCALES)
+            'header_decoders': {
+                'invoice_date': 'date_yyyymmdd',
+            },
+            'detail_decoders': {
+                'quantity': 'signed_int',
+                'net_price': 'scaled_int',
+                'discount': 'scaled_int',
+                'weight': 'scaled_int',
+                'gross_price': 'scaled_int',
+                'tax': 'scaled_int',
+            },
+            'totals_decoders': {
+                'total_amount_including_tax': 'scaled_int',
+                'total_amount_excluding_tax': 'scaled_int',
+            },
         }
 
+    def get_invoice_reference(self, file_path: Path) -> Optional[str]:
+        """The invoice number of the header line, from the parser's event stream: only the first lines are read."""
+        events = FixedFormatParser().iter_events(file_path, self.get_parser_config())
+        try:
+            header = next(events)
+        except ValueError:
+            # Not a France Messagerie invoice (the first line is not a header)
+            return None
+        finally:
+            events.close()
+
+        return header.data['invoice_number'].strip() or None
+
     def _get_header_data(
         self, db: DatabaseCoreManager, invoice_date: date, parsed_data: ParsedDocumentRaw
     ) -> FranceMessagerieHeader:
@@ -105,122 +151,183 @@ class FranceMessagerieHandler(BaseHandler):
         )
 
     @staticmethod
-    def _get_details_data(
-        converter: Conversions, parsed_data: dict[str, str], editions_map: dict[str, Edition]
-    ) -> FranceMessagerieDetailLine:
-        """Extracts detail lines from the parsed document."""
-
-        quantity = converter.to_int(parsed_data['quantity'].strip())
-
-        if quantity is None:
-            quantity = 0
-        elif quantity < 0:
-            quantity = abs(quantity)
-
-        original_invoice = parsed_data.get('original_invoice', '').strip()
-        if len(original_invoice) <= 0:
-            original_invoice = ''
-
-        net_price = Decimal(parsed_data.get('net_price', 0)) / 10000
-        discount = Decimal(parsed_data['discount'].strip()) / 1000
-        gross_price = Decimal(parsed_data.get('gross_price', 0)) / 10000
-        weight = Decimal(parsed_data.get('weight', 0)) / 10000
-        tax = Decimal(parsed_data.get('tax', 0)) / 10000
-
-        amount_with_tax = gross_price * quantity
-        amount_without_tax = net_price * quantity
-        net_price_with_discount = net_price - (1 - (discount / 100))
-        amount_without_tax_with_discount = net_price_with_discount * quantity
-
-        edition = editions_map.get(parsed_data.get('edition', '').strip())
-
-        return FranceMessagerieDetailLine(
-            bipad=parsed_data.get('bipad', '').strip(),
-            extension=parsed_data.get('extension', '').strip(),
-            label=parsed_data.get('label', '').strip(),
-            edition=parsed_data.get('edition', '').strip(),
-            suffix=parsed_data.get('suffix', '').strip(),
-            description=parsed_data.get('description', '').strip(),
-            chrono=parsed_data.get('chrono', '').strip(),
-            quantity=quantity,
-            net_price=net_price,
-            original_invoice=original_invoice,
-            correction_type=parsed_data.get('correction_type', '').strip(),
-            discount=discount,
-            weight=weight,
-            gross_price=gross_price,
-            tax=tax,
-            amount_with_tax=amount_with_tax,
-            amount_without_tax=amount_without_tax,
-            net_price_with_discount=net_price_with_discount,
-            amount_without_tax_with_discount=amount_without_tax_with_discount,
+    def _edition_reference(detail: FranceMessagerieDetailLine) -> tuple[str, EditorKey]:
+        """The edition code of a detail line and its editor key (the file has no cover date)."""
+        return detail.edition, EditorKey(bipad=detail.bipad, edition_number=detail.edition, suffix=detail.suffix)
+
+    def _resolve_editions(self, session: Session, details: list[FranceMessagerieDetailLine]) -> EditionsMap:
+        """Resolves the editions of all the detail lines at once, with a few set-based queries."""
+        references = [self._edition_reference(detail) for detail in details]
+        return EditionRepository(session).resolve_editions(references)
+
+    def _attach_editions(self, details: list[FranceMessagerieDetailLine], editions_map: EditionsMap):
+        for detail in details:
+            code, editor_key = self._edition_reference(detail)
+            edition = editions_map.get(code) or editions_map.get(editor_key)
+            detail.edition_object = edition
+            # The codes are read now: the invoice lines are built after the session is closed
+            detail.edition_code = edition.edition if edition is not None else ''
+            detail.publication_code = edition.publication if edition is not None else ''
+
+    @classmethod
+    def _get_details_data(cls, parsed_data: Mapping[str, Any]) -> FranceMessagerieDetailLine:
+        """Converts one detail line of the parsed document (row layout), as `_details_from_columns` does."""
+        return cls._details_from_columns({name: (value,) for name, value in parsed_data.items()}, 1)[0]
+
+    @staticmethod
+    def _details_from_columns(
+        columns: Union[Mapping[str, Sequence[Any]], ColumnarDetails], length: int
+    ) -> list[FranceMessagerieDetailLine]:
+        """
+        Converts the detail lines of the parsed document column by column (the recipe's columnar layout).
+        Numeric fields come decoded by the parser. The edition is attached later (`_attach_editions`),
+        once the file's amounts are reconciled.
+        """
+
+        def text(name: str) -> list[str]:
+            column = columns.get(name)
+            return [''] * length if column is None else [value.strip() for value in column]
+
+        chrono = text('chrono')
+        net_price, discount, gross_price, weight, tax = amounts = [
+            columns[name] for name in ('net_price', 'discount', 'gross_price', 'weight', 'tax')
+        ]
+        for column in amounts:
+            if None in column:
+                raise ValueError(f'Invalid amount in detail line (chrono {chrono[column.index(None)]}).')
+
+        # Signed: credit and return lines have negative quantities, and so negative amounts
+        quantity = [0 if value is None else value for value in columns['quantity']]
+
+        amount_with_tax = list(map(mul, gross_price, quantity))
+        amount_without_tax = list(map(mul, net_price, quantity))
+        # net_price * (1 - discount / 100), exact at FM_DISCOUNTED_SCALE: discount / 100 is on the factor's scale
+        discount_factor = 10**FM_DISCOUNT_FACTOR_SCALE
+        net_price_with_discount = [price * (discount_factor - rate) for price, rate in zip(net_price, discount)]
+        amount_without_tax_with_discount = list(map(mul, net_price_with_discount, quantity))
+
+        # In the order of the FranceMessagerieDetailLine fields
+        return list(
+            map(
+                FranceMessagerieDetailLine,
+                text('bipad'),
+                text('extension'),
+                text('label'),
+                text('edition'),
+                text('suffix'),
+                text('description'),
+                chrono,
+                quantity,
+                net_price,
+                text('original_invoice'),
+                text('correction_type'),
+                discount,
+                weight,
+                gross_price,
+                tax,
+                amount_with_tax,
+                amount_without_tax,
+                net_price_with_discount,
+                amount_without_tax_with_discount,
+            )
         )
 
     @staticmethod
-    def _get_totals_data(converter: Conversions, parsed_data: dict[str, str]) -> FranceMessagerieTotals:
+    def _get_totals_data(parsed_data: dict[str, Any]) -> FranceMessagerieTotals:
         """Extracts totals data from the parsed document."""
-        total_amount_including_tax = converter.to_decimal(
-            parsed_data.get('total_amount_including_tax', 0), default=Decimal('0')
-        )
-        if total_amount_including_tax is not None:
-            total_amount_including_tax /= Decimal('10000')
-        else:
-            total_amount_including_tax = Decimal('0')
+        total_amount_including_tax = parsed_data.get('total_amount_including_tax')
+        if total_amount_including_tax is None:
+            total_amount_including_tax = 0
 
-        total_amount_excluding_tax = converter.to_decimal(
-            parsed_data.get('total_amount_excluding_tax', 0), default=Decimal('0')
-        )
-        if total_amount_excluding_tax is not None:
-            total_amount_excluding_tax /= Decimal('10000')
-        else:
-            total_amount_excluding_tax = Decimal('0')
+        total_amount_excluding_tax = parsed_data.get('total_amount_excluding_tax')
+        if total_amount_excluding_tax is None:
+            total_amount_excluding_tax = 0
 
         return FranceMessagerieTotals(
             total_amount_including_tax=total_amount_including_tax,
             total_amount_excluding_tax=total_amount_excluding_tax,
         )
 
+    @classmethod
+    def _convert_details(
+        cls, parsed_data: ParsedDocumentRaw
+    ) -> tuple[list[FranceMessagerieDetailLine], FranceMessagerieRunningTotals]:
+        """Converts the detail lines (by column, or line by line in the row layout) and sums their amounts."""
+        if isinstance(parsed_data.details, ColumnarDetails):
+            details = cls._details_from_columns(parsed_data.details, len(parsed_data.details))
+        else:
+            details = [cls._get_details_data(raw_detail) for raw_detail in parsed_data.details]
+
+        running_totals = FranceMessagerieRunningTotals()
+        for detail in details:
+            running_totals.add(detail)
+        return details, running_totals
+
+    def _totals_match(
+        self, running_totals: FranceMessagerieRunningTotals, totals: list[FranceMessagerieTotals]
+    ) -> bool:
+        """Reconciles the sums of the detail lines with the totals lines of the file."""
+        if not TOTALS_RECONCILIATION['RECONCILE_ENABLED']:
+            return True
+
+        if not totals:
+            logger.warning(f'[{self.provider_id}] The file has no totals line. The amounts were not reconciled.')
+            return True
+
+        mismatches = running_totals.mismatches(totals, TOTALS_RECONCILIATION['RECONCILE_TOLERANCE'])
+        for name, (expected, computed) in mismatches.items():
+            logger.error(
+                f'[{self.provider_id}] {name} does not match: {expected:f} in the totals, {computed:f} in the lines.'
+            )
+        return not mismatches
+
     def post_process(self, parsed_data: ParsedDocumentRaw) -> bool:
         """
         Recebe os dados crus (strings) e converte-os para as dataclasses tipadas.
+        Os montantes das linhas são conferidos com as linhas de totais antes de qualquer acesso à base de dados.
         """
         logger.info(f'[{self.provider_id}] Converting raw data from parser...')
 
-        converter = Conversions()
+        invoice_date = parsed_data.header.get('invoice_date')
+
+        if invoice_date is None:
+            logger.error(f'[{self.provider_id}] Invalid invoice date format in header.')
+            return False
+
+        try:
+            details, running_totals = self._convert_details(parsed_data)
+            totals = [self._get_totals_data(raw_total) for raw_total in parsed_data.totals]
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'[{self.provider_id}] Failed to convert data: {e}', exc_info=True)
+            return False
+
+        # Validar os detalhes
+        if not details:
+            logger.error('No details found for invoice.')
+            return False
+
+        if not self._totals_match(running_totals, totals):
+            logger.error(f'[{self.provider_id}] The detail lines do not add up to the totals. File rejected.')
+            return False
+
+        counter = self._invoice_counter()
+        if not counter:
+            logger.error(f'[{self.provider_id}] No invoice counter configured for this transfer task.')
+            return False
 
         with db.get_db() as session:
             try:
                 # Instancia o core manager COM a sessão da transação atual
                 core_db = DatabaseCoreManager(session)
 
-                str_date = parsed_data.header.get('invoice_date', '')
-                invoice_date = converter.convert_to_date(str_date)
-
-                if invoice_date is None:
-                    logger.error(f'[{self.provider_id}] Invalid invoice date format: {str_date}')
-                    return False
-
                 header = self._get_header_data(core_db, invoice_date, parsed_data)
 
-                details = []
-                for raw_detail in parsed_data.details:
-                    detail = self._get_details_data(converter, raw_detail)
-                    details.append(detail)
-
-                totals = []
-                for raw_total in parsed_data.totals:
-                    total = self._get_totals_data(converter, raw_total)
-                    totals.append(total)
+                self._attach_editions(details, self._resolve_editions(session, details))
 
                 footer = FranceMessagerieFooter(footer_line=parsed_data.footer.get('footer_line', '').strip())
 
                 invoice = FranceMessagerieInvoice(header=header, details=details, totals=totals, footer=footer)
 
-                # Validar os detalhes
-                if not details:
-                    logger.error('No details found for invoice.')
-                    return False
-
                 if invoice.footer is None:
                     logger.error('Footer is missing!')
                     return False
@@ -233,10 +340,6 @@ class FranceMessagerieHandler(BaseHandler):
                 if not self.update_tables(session, invoice):
                     logger.error('Failed to update tables.')
                     return False
-
-                logger.info('Invoice persisted successfully.')
-
-                return True
             except (KeyError, ValueError, TypeError) as e:
                 logger.error(f'[{self.provider_id}] Failed to convert data: {e}', exc_info=True)
                 return False
@@ -246,11 +349,109 @@ class FranceMessagerieHandler(BaseHandler):
                 logger.error(f'[{self.provider_id}] Failed during post-processing: {e}', exc_info=True)
                 return False
 
-    def update_tables(self, session: Session, invoice: FranceMessagerieInvoice) -> bool:
-        edition_repository = EditionRepository(session)
+        # A transação dos dados mestre está fechada: a fatura é escrita nas suas próprias transações
+        return self._write_invoice(invoice, counter)
+
+    def _invoice_counter(self) -> str:
+        """O contador (ACODNUM) dos números de fatura da tarefa de transferência do parceiro."""
+        return self.provider.counter_files[self.task.index] if self.task is not None else ''
+
+    @staticmethod
+    def _new_invoice_number(session: Session, counter: str, invoice_date: date) -> str:
+        """Gera o número da fatura com o contador, na transação que insere o cabeçalho da fatura."""
+        invoice_number = CounterService(session).generate_number(counter, '', invoice_date)
+        if invoice_number is None:
+            raise RuntimeError(f"Could not generate an invoice number with counter '{counter}'.")
+        return invoice_number
+
+    def _write_invoice(self, invoice: FranceMessagerieInvoice, counter: str) -> bool:
+        """
+        Escreve a fatura (ZPINVOICEV e ZPINVOICED) com o InvoiceWriter: nunca fica visível uma fatura parcial.
+        O número é gerado na transação que publica o cabeçalho: se a escrita falhar, o número não é gasto.
+        """
+        header = invoice.header
+        try:
+            header_row, lines = FranceMessagerieInvoiceRepository.invoice_rows(invoice, '', self.provider_id)
+            InvoiceWriter().write(
+                header_row,
+                lines,
+                len(invoice.details),
+                numbering=lambda session: self._new_invoice_number(session, counter, header.invoice_date),
+            )
+        except Exception as e:
+            logger.error(f'[{self.provider_id}] Failed to write invoice {header.invoice_number}: {e}', exc_info=True)
+            return False
+
+        logger.info(f'[{self.provider_id}] Invoice {header.invoice_number} persisted successfully.')
+        return True
 
+    def _master_data_rows(self, session: Session, invoice: FranceMessagerieInvoice) -> list[EditionRow]:
+        """
+        The editions of the invoice to create or update in ZITMINP: editions that are not
+        found yet (when their publication is known) and found editions whose data differs.
+        """
+        header = invoice.header
+        rows: dict[str, EditionRow] = {}
+        new_editions: dict[str, FranceMessagerieDetailLine] = {}
+
+        for detail in invoice.details:
+            edition = detail.edition_object
+            code = edition.edition if edition is not None else detail.edition
+            if not code or code in rows or code in new_editions:
+                continue
+
+            row = {
+                'edition': code,
+                'description': detail.description,
+                'bipad': detail.bipad,
+                'edition_number': detail.edition,
+                'suffix': detail.suffix,
+                'extension': detail.extension,
+                'label': detail.label,
+                'nim_code': header.nim_code,
+                'chrono': detail.chrono,
+                'gex_code': header.gexpex_code,
+                # Only set on new editions (not in MASTER_DATA_ATTRIBUTES)
+                'publication': edition.publication if edition is not None else '',
+                '_supplier_0': edition._supplier_0 if edition is not None else self.provider_id,
+            }
+            if edition is None:
+                new_editions[code] = detail
+                rows[code] = row
+            elif any(getattr(edition, attribute) != row[attribute] for attribute in MASTER_DATA_ATTRIBUTES):
+                rows[code] = row
+
+        if new_editions:
+            publications = PublicationRepository(session).find_publication_codes(
+                self.provider_id, {(detail.bipad, detail.description) for detail in new_editions.values()}
+            )
+            skipped = 0
+            for code, detail in new_editions.items():
+                publication = publications.get((detail.bipad, detail.description))
+                if publication is None:
+                    # An edition is only created for a known publication
+                    del rows[code]
+                    skipped += 1
+                else:
+                    rows[code] = {**rows[code], 'publication': publication}
+
+            if skipped:
+                logger.warning(f'[{self.provider_id}] {skipped} new editions without a known publication were skipped.')
+
+        return list(rows.values())
+
+    def update_tables(self, session: Session, invoice: FranceMessagerieInvoice) -> bool:
         if self.provider.master_data == YesNo.YES:
-            edition = edition_repository.get_edition_by_code(invoice.details[0].edition)
+            # The new and changed editions of the whole file, in a few set-based statements
+            rows = self._master_data_rows(session, invoice)
+            upserted = EditionRepository(session).upsert_editions(rows)
+            logger.info(
+                f'[{self.provider_id}] Master data: {upserted.inserted} editions created, {upserted.updated} updated.'
+            )
+            if upserted.inserted:
+                # The editions just created go on the invoice lines too: resolve the lines that had none
+                unresolved = [detail for detail in invoice.details if detail.edition_object is None]
+                self._attach_editions(unresolved, self._resolve_editions(session, unresolved))
 
         liquidation_ok = invoice.header.is_liquidation if invoice.header else False
 
@@ -8,7 +8,7 @@ logger = logging.getLogger(__name__)
 
 
 # 1. PROVIDER-SPECIFIC DATA MODEL
-@dataclass
+@dataclass(slots=True)
 class MlpRow:
     product_id: str
     quantity: int
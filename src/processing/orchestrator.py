@@ -1,12 +1,20 @@
 import logging
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Optional
 
+from src.models.data_models import TransferTask
 from src.models.edi_partner import EdiPartner
 from src.processing.handlers import get_handler_for_provider
+from src.processing.handlers.base_handler import BaseHandler
 from src.processing.parsers.csv_format_parser import CsvParser
 from src.processing.parsers.fixed_format_parser import FixedFormatParser
-from src.services.strategies.base import TransferTask
+from src.processing.parsers.parallel import get_process_pool, parallel_workers, should_parse_files_in_pool
+from src.services.ingestion_ledger import ClaimResult, IngestionKey, file_checksum, ingestion_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +25,19 @@ PARSER_ENGINE_MAP = {
 }
 
 
+def parse_file(file_path: Path, parser_config: dict[str, Any]) -> Any:
+    """
+    Parses a file with the engine selected by the Handler's recipe.
+    Runs in the current process or in a worker of the process pool: it only
+    needs the path and the recipe, and returns the raw (picklable) parsed data.
+    """
+    parser_config = dict(parser_config)
+    parser_type = parser_config.pop('parser_type')
+    ParserEngineClass = PARSER_ENGINE_MAP[parser_type]
+    parser_engine = ParserEngineClass()
+    return parser_engine.parse(file_path, config=parser_config)
+
+
 class FileProcessingOrchestrator:
     """Orchestrates the Parser -> Handler pipeline."""
 
@@ -25,63 +46,197 @@ class FileProcessingOrchestrator:
         self.task = task
         self.provider_id = provider.provider
 
+    def _create_handler(self) -> BaseHandler:
+        HandlerClass = get_handler_for_provider(self.provider_id)
+        return HandlerClass(self.provider, self.task)
+
+    def _claim(self, handler: BaseHandler, file_path: Path) -> tuple[Optional[IngestionKey], bool]:
+        """
+        Checks the file against the ingestion ledger before it is parsed.
+
+        Returns:
+            The claimed key, or None if the file must not be ingested (it was moved aside) and then
+            its outcome: True only if the same content was already ingested. A file whose invoice
+            number was ingested from another file (e.g. a corrected resend) is not processed: it is
+            kept on the remote server until someone checks it.
+        """
+        key = IngestionKey(
+            supplier=self.provider_id,
+            invoice_number=handler.get_invoice_reference(file_path),
+            checksum=file_checksum(file_path),
+        )
+        result = ingestion_ledger.claim(key)
+        if result is ClaimResult.NEW:
+            return key, False
+
+        duplicate_path = handler.get_duplicate_path(file_path)
+        file_path.rename(duplicate_path)
+        if result is ClaimResult.ALREADY_INGESTED:
+            logger.warning(
+                f"[{self.provider_id}] '{file_path.name}' was already ingested (invoice {key.invoice_number}). "
+                f'Moved to: {duplicate_path}'
+            )
+            return None, True
+
+        logger.error(
+            f"[{self.provider_id}] Invoice {key.invoice_number} of '{file_path.name}' was already ingested from "
+            f'another file, or is being ingested. Not processed; moved to: {duplicate_path}'
+        )
+        return None, False
+
     def process(self, file_path: Path) -> bool:
+        """
+        Runs the pipeline for one file.
+
+        Returns:
+            bool: True if the file was ingested, or rejected as a copy of an ingested file.
+        """
         logger.info(f'[{self.provider_id}] Starting processing orchestration for: {file_path.name}')
 
-        handler = None
+        handler, key = None, None
 
         try:
             # 1. Decide which Handler to use
-            HandlerClass = get_handler_for_provider(self.provider_id)
-            handler = HandlerClass(self.provider)
+            handler = self._create_handler()
 
-            # 2. The Handler provides the recipe for parsing
-            parser_config = handler.get_parser_config()
+            # 2. Files already ingested are rejected before any parsing
+            key, outcome = self._claim(handler, file_path)
+            if key is None:
+                return outcome
 
-            # 3. The Orchestrator selects the correct Parser Engine
-            parser_type = parser_config.pop('parser_type')
-            ParserEngineClass = PARSER_ENGINE_MAP[parser_type]
-            parser_engine = ParserEngineClass()
+            # 3. The Handler provides the recipe for parsing
+            parser_config = handler.get_parser_config()
 
-            # 4. The Engine parses the file using the Handler's recipe
-            parsed_data = parser_engine.parse(file_path, config=parser_config)
+            # 4. The selected Parser Engine parses the file using the Handler's recipe
+            parsed_data = parse_file(file_path, parser_config)
 
             # 5. The Handler applies business logic to the structured data
-            success = handler.post_process(parsed_data)
-
-            if success:
-                logger.info(f"[{self.provider_id}] Processing of '{file_path.name}' completed successfully.")
-                archive_dir = handler.get_archive_path(file_path)
-                file_path.rename(archive_dir)
-                logger.info(f'File moved to: {archive_dir}')
-            else:
-                logger.error(
-                    f"[{self.provider_id}] Business logic failed for '{file_path.name}'. Moving to error folder."
-                )
-                error_dir = handler.get_error_path(file_path)
-                file_path.rename(error_dir)
-                logger.info(f'File moved to: {error_dir}')
-
-            return success
+            return self._finish(handler, file_path, parsed_data, key)
 
         except Exception:
-            logger.critical(
-                f'[{self.provider_id}] Critical failure in processing pipeline for {file_path.name}', exc_info=True
-            )
+            ingestion_ledger.release(key, ingested=False)
+            return self._handle_critical_failure(handler, file_path)
+
+    def process_many(self, file_paths: Iterable[Path], file_count: Optional[int] = None) -> dict[Path, bool]:
+        """
+        Processes several files of the same run.
+
+        The files are parsed side by side in the shared process pool: only the path, the
+        recipe and the raw parsed records cross the process boundary. The business logic
+        (database work) and the archive/error moves run here, one file at a time and in the
+        order of `file_paths`, while the following files are still being parsed.
+
+        `file_paths` is consumed lazily, one file each time a place frees up in the parse window:
+        when it downloads the files as they are requested, the downloads overlap the parsing of the
+        files before them and only the files of the window are waiting on disk.
+
+        Args:
+            file_paths: The files, in order. Any iterable (e.g. a generator that downloads them).
+            file_count: The number of files, if `file_paths` has no len() (at most that many).
+
+        Returns:
+            dict[Path, bool]: The outcome of each file, as returned by `process`.
+        """
+        if file_count is None:
+            file_count = len(file_paths)
+        if not should_parse_files_in_pool(file_count):
+            return {file_path: self.process(file_path) for file_path in file_paths}
+
+        logger.info(f'[{self.provider_id}] Parsing up to {file_count} files in the process pool.')
+
+        pool = get_process_pool()
+        # Limits the parsed documents waiting in memory for the (sequential) business logic
+        window = parallel_workers() * 2
+        pending: deque[tuple[Path, Optional[BaseHandler], Optional[Future], Optional[IngestionKey]]] = deque()
+        to_submit = iter(file_paths)
+        results: dict[Path, bool] = {}
+
+        def submit_next() -> bool:
+            for file_path in to_submit:
+                handler, future, key = None, None, None
+                try:
+                    handler = self._create_handler()
+                    key, outcome = self._claim(handler, file_path)
+                    future = None if key is None else pool.submit(parse_file, file_path, handler.get_parser_config())
+                except Exception:
+                    logger.error(f'[{self.provider_id}] Could not queue {file_path.name} for parsing.', exc_info=True)
+                    # The sequential pipeline claims the file again
+                    ingestion_ledger.release(key, ingested=False)
+                else:
+                    if key is None:
+                        # Duplicate: nothing to parse
+                        results[file_path] = outcome
+                        continue
+                pending.append((file_path, handler, future, key))
+                return True
+            return False
 
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            error_filename = f'{file_path.stem}_{timestamp}{file_path.suffix}'
+        while len(pending) < window and submit_next():
+            pass
 
-            if handler:
-                error_dir = handler.get_error_path(file_path).with_name(error_filename)
-            else:
-                # Fallback seguro
-                error_dir = file_path.parent / 'ERROR' / error_filename
-                error_dir.parent.mkdir(parents=True, exist_ok=True)
+        while pending:
+            file_path, handler, future, key = pending.popleft()
+            submit_next()
 
-            # Garante que não perdemos o ficheiro em caso de erro crítico
-            if file_path.exists():
-                file_path.rename(error_dir)
-                logger.info(f'File moved to fallback error path: {error_dir}')
+            if handler is None or future is None:
+                # The file was never queued: fall back to the sequential pipeline
+                results[file_path] = self.process(file_path)
+                continue
 
-            return False
+            logger.info(f'[{self.provider_id}] Starting processing orchestration for: {file_path.name}')
+            try:
+                parsed_data = self._pooled_result(future, file_path, handler)
+                results[file_path] = self._finish(handler, file_path, parsed_data, key)
+            except Exception:
+                ingestion_ledger.release(key, ingested=False)
+                results[file_path] = self._handle_critical_failure(handler, file_path)
+
+        return results
+
+    def _pooled_result(self, future: Future, file_path: Path, handler: BaseHandler) -> Any:
+        """Waits for a file parsed in the pool. If the pool itself broke, the file is parsed here."""
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            logger.warning(f'[{self.provider_id}] Process pool failed. Parsing {file_path.name} here.')
+            return parse_file(file_path, handler.get_parser_config())
+
+    def _finish(self, handler: BaseHandler, file_path: Path, parsed_data: Any, key: IngestionKey) -> bool:
+        """Applies the Handler's business logic and moves the file to the archive or error folder."""
+        success = handler.post_process(parsed_data)
+        ingestion_ledger.release(key, ingested=success)
+
+        if success:
+            logger.info(f"[{self.provider_id}] Processing of '{file_path.name}' completed successfully.")
+            archive_dir = handler.get_archive_path(file_path)
+            file_path.rename(archive_dir)
+            logger.info(f'File moved to: {archive_dir}')
+        else:
+            logger.error(f"[{self.provider_id}] Business logic failed for '{file_path.name}'. Moving to error folder.")
+            error_dir = handler.get_error_path(file_path)
+            file_path.rename(error_dir)
+            logger.info(f'File moved to: {error_dir}')
+
+        return success
+
+    def _handle_critical_failure(self, handler: Optional[BaseHandler], file_path: Path) -> bool:
+        logger.critical(
+            f'[{self.provider_id}] Critical failure in processing pipeline for {file_path.name}', exc_info=True
+        )
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        error_filename = f'{file_path.stem}_{timestamp}{file_path.suffix}'
+
+        if handler:
+            error_dir = handler.get_error_path(file_path).with_name(error_filename)
+        else:
+            # Fallback seguro
+            error_dir = file_path.parent / 'ERROR' / error_filename
+            error_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        # Garante que não perdemos o ficheiro em caso de erro crítico
+        if file_path.exists():
+            file_path.rename(error_dir)
+            logger.info(f'File moved to fallback error path: {error_dir}')
+
+        return False
@@ -0,0 +1,101 @@
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import batched
+from typing import Any, Union
+
+# Número de linhas transpostas de cada vez ao construir as colunas
+BATCH_SIZE = 65536
+
+# Inteiros em array('q') (8 bytes por valor, sem um objeto int por linha); os restantes valores em listas
+Column = Union[list, array]
+
+
+def _decode_column(values: tuple[bytes, ...], encoding: str) -> list[str]:
+    """
+    Descodifica uma coluna em bytes (modo 'mmap'). Os campos têm largura fixa e a codificação
+    é de um byte por carácter: a coluna é descodificada de uma vez e depois cortada.
+    """
+    width = len(values[0])
+    joined = b''.join(values)
+    if width and len(joined) == width * len(values):
+        text = joined.decode(encoding)
+        return [text[start : start + width] for start in range(0, len(text), width)]
+    return [value.decode(encoding) for value in values]
+
+
+def _extend_column(column: Column, values: Sequence[Any], encoding: str) -> Column:
+    """
+    Acrescenta os valores de um lote à coluna. Enquanto só tiver inteiros, a coluna é um array('q');
+    com outro valor (ex: None de um campo inválido) passa a ser uma lista.
+    """
+    if isinstance(values[0], bytes):
+        values = _decode_column(values, encoding)
+
+    if isinstance(column, array) and not isinstance(values[0], str):
+        try:
+            # Construído à parte: se falhar, a coluna fica como estava
+            column.extend(array('q', values))
+            return column
+        except (TypeError, OverflowError):
+            column = column.tolist()
+    elif isinstance(column, array):
+        column = column.tolist()
+
+    column.extend(values)
+    return column
+
+
+class ColumnarDetails:
+    """
+    Linhas de detalhe guardadas por coluna: uma sequência por campo em vez de um dict por linha.
+
+    Os campos inteiros (já convertidos pelos descodificadores da receita) ficam em array('q'),
+    os restantes em listas, para que o handler converta e some as colunas de uma vez.
+    Iterar devolve as linhas como dicts, como na disposição por linhas.
+    """
+
+    def __init__(self, field_names: Sequence[str], encoding: str = 'latin-1'):
+        self.field_names = tuple(field_names)
+        self.encoding = encoding
+        self.columns: dict[str, Column] = {name: array('q') for name in self.field_names}
+        self.length = 0
+
+    def extend(self, rows: Union[Iterable[Sequence[Any]], 'ColumnarDetails']):
+        """
+        Acrescenta linhas: os valores de cada linha pela ordem de `field_names` (str, bytes no modo
+        'mmap', ou já descodificados), transpostos por lotes; ou as colunas de outro ColumnarDetails.
+        """
+        if isinstance(rows, ColumnarDetails) and not self.length:
+            # Sem linhas ainda: as colunas do outro são usadas tal como estão, sem as copiar
+            self.columns = dict(rows.columns)
+            self.length = rows.length
+            return
+
+        if isinstance(rows, ColumnarDetails):
+            batches: Iterable[Iterable[Sequence[Any]]] = [rows.columns.values()] if len(rows) else []
+        else:
+            batches = (zip(*batch) for batch in batched(rows, BATCH_SIZE))
+
+        for columns in batches:
+            for name, values in zip(self.field_names, columns, strict=True):
+                self.columns[name] = _extend_column(self.columns[name], values, self.encoding)
+            self.length += len(values)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, field_name: str) -> Column:
+        return self.columns[field_name]
+
+    def get(self, field_name: str, default: Any = None) -> Any:
+        return self.columns.get(field_name, default)
+
+    def column_sum(self, field_name: str) -> int:
+        """Soma de uma coluna de inteiros."""
+        return sum(self.columns[field_name])
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Reconstrói as linhas de detalhe uma a uma, para o código que trabalha por linha."""
+        names = self.field_names
+        for values in zip(*self.columns.values()):
+            yield dict(zip(names, values))
@@ -1,38 +1,169 @@
 import csv
+import dataclasses
+import io
 import logging
+import typing
+from decimal import Decimal
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.utils.conversions import Conversions
 
 from .base_parser import BaseParser
+from .parallel import map_ranges, read_range, should_parse_in_parallel, split_line_aligned
 
 logger = logging.getLogger(__name__)
 
 
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        # Valores como ' 12.0 ' ou vazios seguem o caminho lento (vazio -> None)
+        return Conversions.to_int(value)
+
+
+def _to_decimal(value: Optional[str]) -> Optional[Decimal]:
+    return Conversions.to_decimal(value)
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+# Conversores por tipo de campo do modelo de dados (os restantes tipos ficam como str)
+TYPE_CONVERTERS: Dict[Any, Callable[[Optional[str]], Any]] = {
+    int: _to_int,
+    Decimal: _to_decimal,
+    float: _to_float,
+}
+
+
+class CsvColumnPlan:
+    """
+    The column mapping of a recipe compiled against the header of a file:
+    the position of each mapped column and the converter of each model field.
+    Rows are read with a positional `csv.reader` and the model is built positionally.
+    """
+
+    def __init__(self, header: List[str], config: Dict[str, Any]):
+        self.DataModelClass = config['data_model']
+        column_map = config.get('column_map', {})  # e.g., {'model_attr': 'CSV_COLUMN_NAME'}
+        column_types = config.get('column_types', {})  # e.g., {'model_attr': int}
+
+        model_fields = {field.name: field for field in dataclasses.fields(self.DataModelClass) if field.init}
+        type_hints = typing.get_type_hints(self.DataModelClass)
+
+        # Model fields follow the order of the dataclass, so the instance can be built positionally
+        self.field_names = [name for name in model_fields if name in column_map]
+        self.positional = self.field_names == list(model_fields)[: len(self.field_names)]
+
+        position = {column: index for index, column in enumerate(header)}
+        self.indexes: List[Optional[int]] = [position.get(column_map[name]) for name in self.field_names]
+        for name, index in zip(self.field_names, self.indexes):
+            if index is None:
+                logger.warning(f'Column "{column_map[name]}" not found in the CSV header. "{name}" will be None.')
+
+        self.converters = [
+            column_types.get(name) or TYPE_CONVERTERS.get(type_hints.get(name)) for name in self.field_names
+        ]
+
+        self.row_length = len(header)
+        self._getter: Optional[Callable[[List[str]], tuple]] = None
+        if self.indexes and None not in self.indexes:
+            getter = itemgetter(*self.indexes)
+            self._getter = getter if len(self.indexes) > 1 else (lambda row: (getter(row),))
+
+    def _values_slow(self, row: List[str]) -> list:
+        """Short rows and missing columns: absent values are None, as with csv.DictReader."""
+        return [row[index] if index is not None and index < len(row) else None for index in self.indexes]
+
+    def build(self, row: List[str]) -> Any:
+        if self._getter is not None and len(row) >= self.row_length:
+            values = self._getter(row)
+        else:
+            values = self._values_slow(row)
+
+        converted = [
+            value if converter is None else converter(value) for converter, value in zip(self.converters, values)
+        ]
+
+        if self.positional:
+            return self.DataModelClass(*converted)
+        return self.DataModelClass(**dict(zip(self.field_names, converted)))
+
+
+def _build_rows(reader: Iterable[List[str]], plan: CsvColumnPlan) -> List[Any]:
+    build = plan.build
+    # Linhas vazias são ignoradas, como no csv.DictReader
+    return [build(row) for row in reader if row]
+
+
+def _parse_range(
+    file_path: Path, start: int, end: int, header: List[str], config: Dict[str, Any]
+) -> Optional[List[Any]]:
+    """
+    Runs in a worker process: parses the data rows of one line-aligned byte range of the file.
+    Returns None if the range has quotes: quoted fields may hold line breaks, so the file cannot be split by lines.
+    """
+    data = read_range(file_path, start, end)
+    if b'"' in data:
+        return None
+    text = data.decode(config.get('encoding', 'latin-1'))
+    reader = csv.reader(io.StringIO(text, newline=''), delimiter=config.get('delimiter', ';'))
+    return _build_rows(reader, CsvColumnPlan(header, config))
+
+
 class CsvParser(BaseParser):
     """
     A generic parsing engine for CSV files.
     It is configured by a handler to map columns to a specific data model.
     """
 
+    @staticmethod
+    def _parse_parallel(file_path: Path, config: Dict[str, Any]) -> Optional[List[Any]]:
+        """
+        Parses the data rows in line-aligned chunks in the process pool. The header is read here.
+        Returns None if the file has quoted fields (found while the chunks are read): it must be parsed serially.
+        """
+        encoding = config.get('encoding', 'latin-1')
+        with open(file_path, 'rb') as f:
+            header_line = f.readline()
+            data_start = f.tell()
+
+        if b'"' in header_line:
+            return None
+        header = next(csv.reader([header_line.decode(encoding)], delimiter=config.get('delimiter', ';')), [])
+        if not header:
+            return []
+
+        ranges = split_line_aligned(file_path, start=data_start)
+        if not ranges:
+            return []
+
+        results = map_ranges(_parse_range, file_path, ranges, header=header, config=config)
+        if any(chunk_rows is None for chunk_rows in results):
+            logger.info(f"'{file_path.name}' has quoted fields: parsing it serially.")
+            return None
+        return [row for chunk_rows in results for row in chunk_rows]
+
     def parse(self, file_path: Path, config: Dict[str, Any]) -> List[Any]:
         logger.info(f"Parsing '{file_path.name}' with CsvParser engine.")
 
         DataModelClass = config['data_model']
-        column_map = config.get('column_map', {})  # e.g., {'model_attr': 'CSV_COLUMN_NAME'}
         delimiter = config.get('delimiter', ';')
         encoding = config.get('encoding', 'latin-1')
 
-        parsed_rows = []
-        with open(file_path, 'r', encoding=encoding, newline='') as f:
-            reader = csv.DictReader(f, delimiter=delimiter)
-            for row_dict in reader:
-                # Create a dictionary for the dataclass constructor
-                model_data = {}
-                for model_attr, csv_col in column_map.items():
-                    model_data[model_attr] = row_dict.get(csv_col)
-
-                # Create an instance of the specific data model and add to the list
-                parsed_rows.append(DataModelClass(**model_data))
+        parsed_rows = self._parse_parallel(file_path, config) if should_parse_in_parallel(file_path) else None
+        if parsed_rows is None:
+            with open(file_path, 'r', encoding=encoding, newline='') as f:
+                reader = csv.reader(f, delimiter=delimiter)
+                header = next(reader, None)
+                parsed_rows = _build_rows(reader, CsvColumnPlan(header, config)) if header else []
 
         logger.info(f"Successfully parsed {len(parsed_rows)} rows into '{DataModelClass.__name__}' objects.")
         return parsed_rows
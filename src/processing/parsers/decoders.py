@@ -0,0 +1,182 @@
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache, partial
+from typing import Any, AnyStr, Callable, Optional, Union
+
+from dateutil import parser
+
+from src.utils.conversions import Conversions
+
+# Um descodificador recebe o valor cru de um campo (str, ou bytes no modo 'mmap') e devolve o valor tipado
+Decoder = Callable[[AnyStr], Any]
+
+# Nome do descodificador, ou um tuplo (nome, *argumentos). Ex: 'date_yyyymmdd', ('scaled_int', 'trailing')
+DecoderSpec = Union[str, tuple]
+
+# Comprimento das datas AAAAMMDD / DDMMAAAA
+DATE_LENGTH = 8
+
+
+def _as_text(value: AnyStr) -> str:
+    # Os campos numéricos e de data são ASCII, por isso o latin-1 basta para os caminhos lentos
+    return value.decode('latin-1') if isinstance(value, bytes) else value
+
+
+# Posição do sinal nos campos numéricos: 'leading' ('-0012', o formato aceite por int() e Decimal)
+# ou 'trailing' ('0012-', habitual em ficheiros de largura fixa)
+SIGN_POSITIONS = ('leading', 'trailing')
+
+
+def _is_digits(value: AnyStr) -> bool:
+    """
+    Só dígitos ASCII: o caminho rápido, em que int() e Decimal() nunca falham. Sozinhos, int() e
+    Decimal() também aceitariam '1_000' e dígitos de outros alfabetos, que não são números válidos
+    num ficheiro de largura fixa.
+    """
+    return value.isascii() and value.isdigit()
+
+
+def _is_plain(text: str) -> bool:
+    """Texto normalizado que pode seguir o caminho lento: só ASCII e sem '_'."""
+    return text.isascii() and '_' not in text
+
+
+def _is_trailing(sign: str) -> bool:
+    if sign not in SIGN_POSITIONS:
+        raise ValueError(f'Unknown sign position "{sign}". Expected one of {SIGN_POSITIONS}.')
+    return sign == 'trailing'
+
+
+def _normalize(value: AnyStr, trailing_sign: bool) -> str:
+    """Texto do campo sem espaços; com sinal à direita, o sinal passa para a esquerda."""
+    text = _as_text(value).strip()
+    if trailing_sign and len(text) > 1 and text[-1] in '+-':
+        return text[-1] + text[:-1].strip()
+    return text
+
+
+def _decode_signed_int(trailing_sign: bool, value: AnyStr) -> Optional[int]:
+    if _is_digits(value):
+        # int() aceita str e bytes
+        return int(value)
+
+    text = _normalize(value, trailing_sign)
+    if not text or not _is_plain(text):
+        return None
+    return Conversions.to_int(text)
+
+
+def signed_int_decoder(sign: str = 'leading') -> Decoder:
+    """
+    Inteiros com sinal. Campos vazios, com caracteres não ASCII ou com '_' dão None; valores
+    com outro formato (ex: '12.0') seguem o caminho lento de `Conversions.to_int`, com o mesmo resultado.
+    """
+    # partial (e não uma closure) para que os registos possam atravessar o pool de processos
+    return partial(_decode_signed_int, _is_trailing(sign))
+
+
+def _decode_scaled_int(trailing_sign: bool, value: AnyStr) -> Optional[int]:
+    if _is_digits(value):
+        return int(value)
+
+    text = _normalize(value, trailing_sign)
+    if not _is_plain(text):
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def scaled_int_decoder(sign: str = 'leading') -> Decoder:
+    """
+    Montantes com vírgula implícita mantidos em inteiro escalado: '0012345' vale 12345
+    (na escala do campo, ex: 1/10000; ver `src.utils.money`). Campos vazios, ou que não
+    sejam um número inteiro de unidades em dígitos ASCII, dão None.
+    """
+    return partial(_decode_scaled_int, _is_trailing(sign))
+
+
+def _decode_scaled_decimal(divisor: Decimal, trailing_sign: bool, value: AnyStr) -> Optional[Decimal]:
+    if _is_digits(value):
+        return Decimal(_as_text(value)) / divisor
+
+    text = _normalize(value, trailing_sign)
+    if not _is_plain(text):
+        return None
+    number = Conversions.to_decimal(text)
+    # Decimal() também aceita 'NaN' e 'Infinity'
+    return number / divisor if number is not None and number.is_finite() else None
+
+
+def scaled_decimal_decoder(scale: int, sign: str = 'leading') -> Decoder:
+    """
+    Montantes em inteiro com vírgula implícita: '0012345' com escala 4 vale Decimal('1.2345').
+    O resultado é o mesmo de `Decimal(valor) / 10 ** escala`. Campos vazios, com caracteres
+    não ASCII ou com '_' dão None.
+    """
+    return partial(_decode_scaled_decimal, Decimal(10) ** scale, _is_trailing(sign))
+
+
+def decode_date_yyyymmdd(value: AnyStr) -> Optional[date]:
+    """
+    Data no formato AAAAMMDD, sem passar pelo dateutil. Outros formatos seguem
+    o caminho lento de `Conversions.convert_to_date`, com o mesmo resultado. Valores
+    com caracteres não ASCII dão None.
+    """
+    if not value.isascii():
+        return None
+    if len(value) == DATE_LENGTH and value.isdigit():
+        try:
+            # Desde o Python 3.11 o fromisoformat (em C) aceita o formato básico AAAAMMDD
+            return date.fromisoformat(_as_text(value))
+        except ValueError:
+            pass
+    return Conversions.convert_to_date(_as_text(value))
+
+
+def decode_date_ddmmyyyy(value: AnyStr) -> Optional[date]:
+    """
+    Data no formato DDMMAAAA. Outros formatos são lidos pelo dateutil, com o dia primeiro;
+    falhas e valores com caracteres não ASCII dão None.
+    """
+    if not value.isascii():
+        return None
+    if len(value) == DATE_LENGTH and value.isdigit():
+        try:
+            return date(int(value[4:]), int(value[2:4]), int(value[:2]))
+        except ValueError:
+            pass
+
+    text = _as_text(value).strip()
+    if not text:
+        return None
+    try:
+        return parser.parse(text, dayfirst=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+# Descodificadores disponíveis nas receitas: {nome: fábrica(*argumentos) -> Decoder}
+DECODER_FACTORIES: dict[str, Callable[..., Decoder]] = {
+    'signed_int': signed_int_decoder,
+    'scaled_int': scaled_int_decoder,
+    'scaled_decimal': scaled_decimal_decoder,
+    'date_yyyymmdd': lambda: decode_date_yyyymmdd,
+    'date_ddmmyyyy': lambda: decode_date_ddmmyyyy,
+}
+
+
+@lru_cache(maxsize=64)
+def get_decoder(spec: DecoderSpec) -> Decoder:
+    """Devolve o descodificador de uma especificação da receita. Levanta ValueError se o nome não existir."""
+    name, *args = (spec,) if isinstance(spec, str) else spec
+    factory = DECODER_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f'Unknown field decoder "{name}".')
+    return factory(*args)
+
+
+def compile_decoders(specs: dict[str, DecoderSpec]) -> dict[str, Decoder]:
+    """Compila os descodificadores de uma secção da receita ({campo: especificação})."""
+    return {field_name: get_decoder(spec) for field_name, spec in specs.items()}
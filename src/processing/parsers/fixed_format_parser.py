@@ -1,21 +1,528 @@
+import codecs
+import io
 import logging
+import mmap
+import os
+from collections.abc import Iterable, Mapping
+from contextlib import contextmanager
 from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AnyStr, Callable, Iterator, NamedTuple, Optional, Union
 
 from src.processing.parsers.base_parser import BaseParser
+from src.processing.parsers.columnar import ColumnarDetails
+from src.processing.parsers.decoders import Decoder, compile_decoders
+from src.processing.parsers.parallel import map_ranges, read_range, should_parse_in_parallel, split_line_aligned
 
 logger = logging.getLogger(__name__)
 
 
 @dataclass
 class ParsedDocumentRaw:
-    """Um contentor para os dados crus (strings) lidos do ficheiro."""
+    """
+    Um contentor para os dados crus (strings) lidos do ficheiro.
+    Os campos com um descodificador declarado na receita (`*_decoders`) já vêm tipados.
+    Com `'detail_layout': 'columnar'` na receita, os detalhes são um ColumnarDetails.
+    """
+
+    header: dict[str, Any] = field(default_factory=dict)
+    details: Union[list[Mapping[str, Any]], ColumnarDetails] = field(default_factory=list)
+    totals: list[dict[str, Any]] = field(default_factory=list)
+    footer: dict[str, Any] = field(default_factory=dict)
+
+
+# Transições permitidas da máquina de estados estrutural: {estado: {tipo de linha: próximo estado}}
+STATE_TRANSITIONS: dict[str, dict[str, str]] = {
+    'EXPECTING_HEADER': {'header': 'EXPECTING_DETAILS'},
+    'EXPECTING_DETAILS': {'detail': 'EXPECTING_DETAILS', 'totals': 'EXPECTING_TOTALS'},
+    'EXPECTING_TOTALS': {'totals': 'EXPECTING_TOTALS', 'footer': 'EXPECTING_EOF'},
+    'EXPECTING_EOF': {},
+}
+
+
+# Codificações de um byte por carácter: só nestas as posições em bytes coincidem com as posições em caracteres
+SINGLE_BYTE_ENCODINGS = frozenset({'ascii', 'iso8859-1', 'iso8859-15', 'cp1252', 'cp850'})
+
+
+def is_single_byte_encoding(encoding: str) -> bool:
+    try:
+        return codecs.lookup(encoding).name in SINGLE_BYTE_ENCODINGS
+    except LookupError:
+        return False
+
+
+class ParseEvent(NamedTuple):
+    """Um evento do modo streaming: o tipo ('header', 'details', 'totals', 'footer'), a linha e os dados."""
+
+    kind: str
+    line_num: int
+    data: Any
+
+
+def _build_getter(line_map: dict[str, tuple]) -> Callable[[AnyStr], tuple]:
+    """Devolve uma função que extrai todas as fatias do mapa de uma só vez, com um `operator.itemgetter`."""
+    slices = [slice(start, end) for start, end in line_map.values()]
+    if len(slices) > 1:
+        return itemgetter(*slices)
+    if slices:
+        single = slices[0]
+        return lambda line: (line[single],)
+    return lambda line: ()
+
+
+class SlicePlan:
+    """
+    Plano de corte pré-compilado para um mapa de campos ({nome: (início, fim)}).
+    Todas as fatias são extraídas de uma só vez com um `operator.itemgetter`;
+    os campos com descodificador são depois convertidos.
+    """
+
+    def __init__(self, line_map: dict[str, tuple], decoders: Optional[dict[str, Decoder]] = None):
+        self.line_map = line_map
+        self.field_names = tuple(line_map)
+        self.min_length = max((end for _, end in line_map.values()), default=0)
+        self.decoders = {name: decoder for name, decoder in (decoders or {}).items() if name in line_map}
+        self._indexed_decoders = [(self.field_names.index(name), decoder) for name, decoder in self.decoders.items()]
+        self._getter = _build_getter(line_map)
+
+    def slice(self, line: str) -> dict[str, Any]:
+        """Extrai os campos da linha. Linhas curtas seguem o caminho lento, campo a campo."""
+        if len(line) >= self.min_length:
+            record = dict(zip(self.field_names, self._getter(line)))
+        else:
+            record = FixedFormatParser._slice_line(line, self.line_map)
+
+        for name, decoder in self.decoders.items():
+            record[name] = decoder(record[name])
+        return record
+
+    def values(self, line: AnyStr) -> list[Any]:
+        """Como `slice`, mas devolve só os valores, pela ordem de `field_names` (disposição colunar)."""
+        if len(line) >= self.min_length:
+            values = list(self._getter(line))
+        else:
+            values = list(FixedFormatParser._slice_line(line, self.line_map).values())
+
+        for index, decoder in self._indexed_decoders:
+            values[index] = decoder(values[index])
+        return values
+
+
+class LazyFieldRecord(Mapping):
+    """
+    Uma linha de detalhe lida em bytes (modo 'mmap'). Cada campo só é descodificado
+    quando é acedido, por isso as colunas que o handler não lê nunca são descodificadas.
+    Comporta-se como o dict de strings devolvido pelo modo de texto. Os campos com
+    descodificador são convertidos diretamente a partir dos bytes.
+    """
+
+    __slots__ = ('_line', '_plan')
+
+    def __init__(self, line: bytes, plan: 'ByteSlicePlan'):
+        self._line = line
+        self._plan = plan
+
+    def _read(self, field_slice: slice, decoder: Optional[Decoder]) -> Any:
+        raw = self._line[field_slice]
+        if decoder is not None:
+            return decoder(raw)
+        # Todas as codificações suportadas estendem o ASCII, que tem o descodificador mais rápido
+        return raw.decode('latin-1') if raw.isascii() else raw.decode(self._plan.encoding)
+
+    def __getitem__(self, field_name: str) -> Any:
+        return self._read(*self._plan.fields[field_name])
+
+    def get(self, field_name: str, default: Any = None) -> Any:
+        field_plan = self._plan.fields.get(field_name)
+        if field_plan is None:
+            return default
+        return self._read(*field_plan)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._plan.fields)
+
+    def __len__(self) -> int:
+        return len(self._plan.fields)
+
+    def __repr__(self) -> str:
+        return f'LazyFieldRecord({dict(self)!r})'
+
+
+class ByteSlicePlan:
+    """Plano de corte de um mapa de campos para linhas em bytes, com descodificação preguiçosa."""
+
+    def __init__(self, line_map: dict[str, tuple], encoding: str, decoders: Optional[dict[str, Decoder]] = None):
+        self.line_map = line_map
+        self.encoding = encoding
+        decoders = decoders or {}
+        # {nome: (fatia, descodificador ou None)}
+        self.fields = {name: (slice(start, end), decoders.get(name)) for name, (start, end) in line_map.items()}
+        self.min_length = max((end for _, end in line_map.values()), default=0)
+        self._text_plan = SlicePlan(line_map, decoders)
+
+    def record(self, line: bytes) -> Mapping[str, Any]:
+        """Cria o registo preguiçoso da linha. Linhas curtas são descodificadas de imediato, como no modo de texto."""
+        if len(line) >= self.min_length:
+            return LazyFieldRecord(line, self)
+        return self._text_plan.slice(line.decode(self.encoding))
+
+    def decode(self, line: bytes) -> dict[str, Any]:
+        """Descodifica já todos os campos da linha, como o modo de texto (nos processos do pool)."""
+        return self._text_plan.slice(line.decode(self.encoding))
+
+    def values(self, line: bytes) -> list[Any]:
+        """
+        Os valores de todos os campos pela ordem do mapa (disposição colunar). Os campos sem
+        descodificador ficam em bytes: o ColumnarDetails descodifica cada coluna de uma vez.
+        """
+        if len(line) >= self.min_length:
+            return self._text_plan.values(line)
+        # Linhas curtas: cortadas como no modo de texto, com os textos de volta em bytes
+        values = self._text_plan.values(line.decode(self.encoding))
+        return [value.encode(self.encoding) if isinstance(value, str) else value for value in values]
+
+
+class LineTypeDispatcher:
+    """
+    Identifica o tipo de linha. Quando todas as definições usam a mesma posição
+    (ex: o primeiro carácter), o tipo é obtido com um único acesso a um dicionário.
+    """
+
+    def __init__(self, line_definitions: dict[str, tuple]):
+        self.line_definitions = line_definitions
+        positions = {(start, end) for start, end, _ in line_definitions.values()}
+
+        self._position: Optional[slice] = None
+        self._types_by_value: dict[str, str] = {}
+        if len(positions) == 1:
+            self._position = slice(*positions.pop())
+            # Em caso de valores repetidos, prevalece a primeira definição (como no ciclo original)
+            for type_name, (_, _, expected_value) in reversed(line_definitions.items()):
+                self._types_by_value[expected_value] = type_name
+
+    def get_line_type(self, line: str) -> Optional[str]:
+        if self._position is not None:
+            return self._types_by_value.get(line[self._position])
+        return FixedFormatParser._get_line_type(line, self.line_definitions)
+
+
+def _warn_unrecognized(line_num: int):
+    logger.warning(f'Ignoring unrecognized line format on line {line_num}.')
+
+
+class _TypedLineReader:
+    """
+    Iterador sobre as linhas reconhecidas de um ficheiro: (nº da linha, tipo, linha).
+    As linhas podem ser str (modo de texto) ou bytes (modo 'mmap'); `eol` tem o mesmo tipo.
+    Linhas vazias e não reconhecidas são ignoradas. Permite devolver uma linha ao fluxo.
+    """
+
+    def __init__(
+        self,
+        lines: Iterable[AnyStr],
+        dispatcher: LineTypeDispatcher,
+        eol: AnyStr,
+        on_unrecognized: Optional[Callable[[int], None]] = None,
+    ):
+        self._lines = enumerate(lines, 1)
+        self._get_line_type = dispatcher.get_line_type
+        self._eol = eol
+        self._on_unrecognized = on_unrecognized or _warn_unrecognized
+        self._pushed: Optional[tuple[int, str, AnyStr]] = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[int, str, AnyStr]:
+        if self._pushed is not None:
+            item, self._pushed = self._pushed, None
+            return item
+
+        get_line_type = self._get_line_type
+        eol = self._eol
+        for line_num, raw_line in self._lines:
+            line = raw_line.rstrip(eol)
+            if not line:
+                continue
+            line_type_id = get_line_type(line)
+            if not line_type_id:
+                self._on_unrecognized(line_num)
+                continue
+            return line_num, line_type_id, line
+
+        raise StopIteration
+
+    def push_back(self, line_num: int, line_type_id: str, line: AnyStr):
+        self._pushed = (line_num, line_type_id, line)
+
+    def iter_run(self, line_type_id: str, slice_line: Callable[[AnyStr], Mapping]) -> Iterator[Mapping[str, str]]:
+        """Produz as linhas consecutivas do tipo indicado; a primeira linha de outro tipo volta ao fluxo."""
+        for item in self:
+            if item[1] != line_type_id:
+                self._pushed = item
+                return
+            yield slice_line(item[2])
+
+
+@dataclass(frozen=True)
+class CompiledRecipe:
+    """A receita de um handler compilada: identificação dos tipos de linha e planos de corte."""
+
+    dispatcher: LineTypeDispatcher
+    header: SlicePlan
+    detail: SlicePlan
+    totals: SlicePlan
+    footer: SlicePlan
+
+
+def _freeze(mapping: dict[str, tuple]) -> tuple:
+    return tuple((name, tuple(value)) for name, value in mapping.items())
+
+
+def _freeze_decoders(config: dict[str, Any], section: str) -> tuple:
+    # As especificações ('date_yyyymmdd', ('scaled_decimal', 4)) já são imutáveis
+    return tuple(config.get(f'{section}_decoders', {}).items())
+
+
+# Secções da receita, cada uma com o seu mapa de campos (`<secção>_map`) e descodificadores (`<secção>_decoders`)
+RECIPE_SECTIONS = ('header', 'detail', 'totals', 'footer')
+
+
+@lru_cache(maxsize=32)
+def _compile_recipe(line_definitions: tuple, sections: tuple):
+    header, detail, totals, footer = (
+        SlicePlan(dict(line_map), compile_decoders(dict(decoders))) for line_map, decoders in sections
+    )
+    return CompiledRecipe(
+        dispatcher=LineTypeDispatcher(dict(line_definitions)),
+        header=header,
+        detail=detail,
+        totals=totals,
+        footer=footer,
+    )
+
+
+@dataclass(frozen=True)
+class CompiledByteRecipe:
+    """A parte da receita usada no modo 'mmap': tipos de linha em bytes e o plano preguiçoso dos detalhes."""
 
-    header: dict[str, str] = field(default_factory=dict)
-    details: list[dict[str, str]] = field(default_factory=list)
-    totals: list[dict[str, str]] = field(default_factory=list)
-    footer: dict[str, str] = field(default_factory=dict)
+    dispatcher: LineTypeDispatcher
+    detail: ByteSlicePlan
+
+
+@lru_cache(maxsize=32)
+def _compile_byte_recipe(line_definitions: tuple, detail: tuple, encoding: str, detail_decoders: tuple):
+    byte_definitions = {
+        type_name: (start, end, expected_value.encode(encoding))
+        for type_name, (start, end, expected_value) in line_definitions
+    }
+    return CompiledByteRecipe(
+        dispatcher=LineTypeDispatcher(byte_definitions),
+        detail=ByteSlicePlan(dict(detail), encoding, compile_decoders(dict(detail_decoders))),
+    )
+
+
+def compile_byte_recipe(config: dict[str, Any], encoding: str) -> CompiledByteRecipe:
+    return _compile_byte_recipe(
+        _freeze(config['line_definitions']),
+        _freeze(config.get('detail_map', {})),
+        encoding,
+        _freeze_decoders(config, 'detail'),
+    )
+
+
+def _iter_mapped_lines(mapped: Union[mmap.mmap, bytes]) -> Iterator[bytes]:
+    """
+    Percorre as linhas de um ficheiro mapeado (ou de um bloco de bytes). `find` procura o fim de linha com memchr.
+    Como no modo de texto (newlines universais), LF, CRLF e CR terminam uma linha; o CR de um CRLF fica
+    no fim da linha e sai com o rstrip de `eol`.
+    """
+    find = mapped.find
+    size = len(mapped)
+    pos = 0
+    while pos < size:
+        end = find(b'\n', pos)
+        if end < 0:
+            end = size
+        line = mapped[pos:end]
+        pos = end + 1
+        if line.find(b'\r', 0, len(line) - 1) < 0:
+            yield line
+            continue
+        # CR sozinhos dentro da linha: cada um termina uma linha
+        parts = line.split(b'\r')
+        if not parts[-1]:
+            parts.pop()
+        yield from parts
+
+
+def count_lines(data: bytes) -> int:
+    """O número de linhas de um bloco de bytes, com newlines universais (LF, CRLF e CR), como `_iter_mapped_lines`."""
+    line_ends = data.count(b'\n') + data.count(b'\r') - data.count(b'\r\n')
+    return line_ends + (1 if data and not data.endswith((b'\n', b'\r')) else 0)
+
+
+@contextmanager
+def _open_mapped_lines(file_path: Path) -> Iterator[Iterator[bytes]]:
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Não é possível mapear um ficheiro vazio
+            yield iter(())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield _iter_mapped_lines(mapped)
+
+
+def compile_recipe(config: dict[str, Any]) -> CompiledRecipe:
+    """
+    Compila (uma vez) a receita de um handler. O resultado fica em cache e é
+    reutilizado por todos os ficheiros processados com a mesma receita.
+    """
+    return _compile_recipe(
+        _freeze(config['line_definitions']),
+        tuple(
+            (_freeze(config.get(f'{section}_map', {})), _freeze_decoders(config, section))
+            for section in RECIPE_SECTIONS
+        ),
+    )
+
+
+# Chaves da receita usadas para ler e cortar as linhas
+WORKER_RECIPE_KEYS = (
+    'encoding',
+    'read_mode',
+    'detail_layout',
+    'line_definitions',
+    'header_map',
+    'detail_map',
+    'totals_map',
+    'footer_map',
+    'header_decoders',
+    'detail_decoders',
+    'totals_decoders',
+    'footer_decoders',
+)
+
+
+class _ReadPlan(NamedTuple):
+    """Como ler as linhas de um ficheiro com uma receita: modo (texto ou bytes) e funções de corte."""
+
+    use_mmap: bool
+    encoding: str
+    eol: AnyStr
+    columnar: bool
+    detail_fields: tuple[str, ...]
+    dispatcher: LineTypeDispatcher
+    slice_detail: Callable[[AnyStr], Any]
+    slice_plans: dict[str, Callable[[AnyStr], dict[str, str]]]
+
+
+def _build_read_plan(config: dict[str, Any]) -> _ReadPlan:
+    recipe = compile_recipe(config)
+    encoding = config.get('encoding', 'latin-1')
+    columnar = config.get('detail_layout', 'rows') == 'columnar'
+
+    use_mmap = config.get('read_mode', 'text') == 'mmap'
+    if use_mmap and not is_single_byte_encoding(encoding):
+        logger.warning(f"Encoding '{encoding}' is not single-byte. Falling back to text mode.")
+        use_mmap = False
+
+    if use_mmap:
+        byte_recipe = compile_byte_recipe(config, encoding)
+        return _ReadPlan(
+            use_mmap=True,
+            encoding=encoding,
+            eol=b'\n\r',
+            columnar=columnar,
+            detail_fields=recipe.detail.field_names,
+            dispatcher=byte_recipe.dispatcher,
+            slice_detail=byte_recipe.detail.values if columnar else byte_recipe.detail.record,
+            slice_plans={
+                'header': lambda line: recipe.header.slice(line.decode(encoding)),
+                'totals': lambda line: recipe.totals.slice(line.decode(encoding)),
+                'footer': lambda line: recipe.footer.slice(line.decode(encoding)),
+            },
+        )
+
+    return _ReadPlan(
+        use_mmap=False,
+        encoding=encoding,
+        eol='\n\r',
+        columnar=columnar,
+        detail_fields=recipe.detail.field_names,
+        dispatcher=recipe.dispatcher,
+        slice_detail=recipe.detail.values if columnar else recipe.detail.slice,
+        slice_plans={'header': recipe.header.slice, 'totals': recipe.totals.slice, 'footer': recipe.footer.slice},
+    )
+
+
+def _parse_range(file_path: Path, start: int, end: int, config: dict[str, Any]) -> tuple[int, list[tuple]]:
+    """
+    Corre num processo do pool: lê e corta as linhas de um intervalo de bytes do ficheiro.
+
+    Returns:
+        O número de linhas do intervalo e os segmentos encontrados, por ordem, como
+        (nº da linha no intervalo, tipo, dados): 'details' com as linhas de detalhe consecutivas
+        (uma lista, ou um ColumnarDetails na disposição colunar), os outros tipos com os dados
+        da linha, e None para linhas não reconhecidas.
+    """
+    plan = _build_read_plan(config)
+    data = read_range(file_path, start, end)
+    # Os intervalos terminam num LF: as linhas são divididas como na leitura sem o pool (newlines universais)
+    line_count = count_lines(data)
+
+    if plan.use_mmap:
+        lines = _iter_mapped_lines(data)
+    else:
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding=plan.encoding)
+
+    # Os registos são descodificados aqui, no processo do pool, e não preguiçosamente no processo principal
+    slice_detail = plan.slice_detail
+    if plan.use_mmap and not plan.columnar:
+        slice_detail = compile_byte_recipe(config, plan.encoding).detail.decode
+
+    segments: list[tuple] = []
+    reader = _TypedLineReader(
+        lines, plan.dispatcher, plan.eol, on_unrecognized=lambda line_num: segments.append((line_num, None, None))
+    )
+
+    run: Optional[list] = None
+    for line_num, line_type_id, line in reader:
+        if line_type_id == 'detail':
+            if run is None:
+                run = []
+                segments.append((line_num, 'details', run))
+            run.append(slice_detail(line))
+        else:
+            run = None
+            segments.append((line_num, line_type_id, plan.slice_plans[line_type_id](line)))
+
+    if plan.columnar:
+        # Os detalhes atravessam o pool por colunas (arrays e listas) em vez de uma lista por linha
+        segments = [
+            (line_num, kind, _detail_columns(plan, data) if kind == 'details' else data)
+            for line_num, kind, data in segments
+        ]
+    return line_count, segments
+
+
+def _detail_columns(plan: _ReadPlan, rows: Iterable[list[Any]]) -> ColumnarDetails:
+    columns = ColumnarDetails(plan.detail_fields, plan.encoding)
+    columns.extend(rows)
+    return columns
+
+
+def _join_runs(runs: list) -> Iterable:
+    """Junta os blocos de detalhes de vários intervalos, pela ordem do ficheiro."""
+    if isinstance(runs[0], ColumnarDetails):
+        joined = runs[0]
+        for run in runs[1:]:
+            joined.extend(run)
+        return joined
+    return chain.from_iterable(runs)
 
 
 class FixedFormatParser(BaseParser):
@@ -51,75 +558,141 @@ class FixedFormatParser(BaseParser):
                 return type_name
         return None
 
-    def parse(self, file_path: Path, config: dict[str, Any]) -> ParsedDocumentRaw:
-        logger.info(f"Extracting raw string data from '{file_path.name}' with FixedFormatParser.")
+    def iter_events(self, file_path: Path, config: dict[str, Any]) -> Iterator[ParseEvent]:
+        """
+        Lê o ficheiro em streaming, com memória constante, e produz os eventos pela ordem do ficheiro:
+        'header' (dict), 'details' (iterador preguiçoso de dicts), 'totals' (um dict por linha) e 'footer' (dict).
 
-        line_definitions = config['line_definitions']
-        header_map = config.get('header_map', {})
-        detail_map = config.get('detail_map', {})
-        totals_map = config.get('totals_map', {})
-        footer_map = config.get('footer_map', {})
-        encoding = config.get('encoding', 'latin-1')
+        O iterador de detalhes deve ser consumido antes de pedir o evento seguinte; as linhas
+        que ficarem por consumir são descartadas. A máquina de estados estrutural é a mesma de
+        `parse()`: os erros surgem como ValueError no momento em que a linha inválida é lida.
+
+        Com `'read_mode': 'mmap'` na receita, o ficheiro é mapeado em memória e lido em bytes:
+        os detalhes são LazyFieldRecord, descodificados campo a campo quando acedidos.
+        Só é possível com codificações de um byte; as linhas terminam em LF, CRLF ou CR, como no modo de texto.
+
+        Com `'detail_layout': 'columnar'`, cada detalhe é a lista dos seus valores pela ordem do
+        `detail_map` (os textos em bytes no modo 'mmap'), para ser acrescentado a um ColumnarDetails.
+
+        Os campos declarados em `header_decoders`, `detail_decoders`, `totals_decoders` ou
+        `footer_decoders` ({campo: especificação}, ver `decoders.DECODER_FACTORIES`) são
+        convertidos pelos descodificadores rápidos (datas, montantes com vírgula implícita, inteiros com sinal).
+        """
+        logger.info(f"Streaming raw string data from '{file_path.name}' with FixedFormatParser.")
+
+        plan = _build_read_plan(config)
+        if plan.use_mmap:
+            source = _open_mapped_lines(file_path)
+        else:
+            source = open(file_path, 'r', encoding=plan.encoding)
 
-        raw_document = ParsedDocumentRaw()
         state = 'EXPECTING_HEADER'
+        with source as lines:
+            reader = _TypedLineReader(lines, plan.dispatcher, plan.eol)
+            for line_num, line_type_id, line in reader:
+                state = self._next_state(state, line_num, line_type_id)
 
-        state_actions = {
-            'EXPECTING_HEADER': {
-                'header': lambda line: (
-                    setattr(raw_document, 'header', self._slice_line(line, header_map)),
-                    'EXPECTING_DETAILS',
-                ),
-            },
-            'EXPECTING_DETAILS': {
-                'detail': lambda line: (
-                    raw_document.details.append(self._slice_line(line, detail_map)),
-                    'EXPECTING_DETAILS',
-                ),
-                'totals': lambda line: (
-                    raw_document.totals.append(self._slice_line(line, totals_map)),
-                    'EXPECTING_TOTALS',
-                ),
-            },
-            'EXPECTING_TOTALS': {
-                'totals': lambda line: (
-                    raw_document.totals.append(self._slice_line(line, totals_map)),
-                    'EXPECTING_TOTALS',
-                ),
-                'footer': lambda line: (
-                    setattr(raw_document, 'footer', self._slice_line(line, footer_map)),
-                    'EXPECTING_EOF',
-                ),
-            },
-        }
+                if line_type_id == 'detail':
+                    # O bloco de detalhes é entregue como um iterador sobre o próprio ficheiro
+                    reader.push_back(line_num, line_type_id, line)
+                    details = reader.iter_run('detail', plan.slice_detail)
+                    yield ParseEvent('details', line_num, details)
+                    for _ in details:
+                        pass
+                else:
+                    yield ParseEvent(line_type_id, line_num, plan.slice_plans[line_type_id](line))
 
-        with open(file_path, 'r', encoding=encoding) as f:
-            for line_num, raw_line in enumerate(f, 1):
-                line = raw_line.rstrip('\n\r')
-                if not line:
-                    continue
+        self._check_end_state(state)
 
-                line_type_id = self._get_line_type(line, line_definitions)
+    @staticmethod
+    def _next_state(state: str, line_num: int, line_type_id: str) -> str:
+        """Aplica uma linha à máquina de estados estrutural e devolve o novo estado."""
+        if state == 'EXPECTING_EOF':
+            raise ValueError(f'Structural error on line {line_num}: Extra data found after footer.')
 
-                if not line_type_id:
-                    logger.warning(f'Ignoring unrecognized line format on line {line_num}.')
-                    continue
+        transitions = STATE_TRANSITIONS[state]
+        if line_type_id not in transitions:
+            expected_types = ' or '.join(transitions.keys())
+            raise ValueError(
+                f'Structural error on line {line_num}: Expected a "{expected_types}" line, found "{line_type_id}".'
+            )
+        return transitions[line_type_id]
 
-                if state == 'EXPECTING_EOF':
-                    raise ValueError(f'Structural error on line {line_num}: Extra data found after footer.')
+    @staticmethod
+    def _check_end_state(state: str):
+        if state != 'EXPECTING_EOF':
+            raise ValueError('Structural error: End of file reached but footer (type 3) was not found.')
 
-                actions = state_actions.get(state, {})
-                if line_type_id in actions:
-                    _, next_state = actions[line_type_id](line)
-                    state = next_state
+    def _iter_parallel_events(self, file_path: Path, config: dict[str, Any]) -> Iterator[ParseEvent]:
+        """
+        Como `iter_events`, mas as linhas são lidas e cortadas em paralelo, em blocos alinhados
+        às linhas, por um conjunto de processos. Os segmentos de cada bloco são depois
+        percorridos por ordem, com a mesma máquina de estados e os mesmos números de linha.
+        """
+        ranges = split_line_aligned(file_path)
+        # Os processos só recebem as chaves de que precisam (os modelos de dados não atravessam o pool)
+        worker_config = {key: config[key] for key in WORKER_RECIPE_KEYS if key in config}
+        results = map_ranges(_parse_range, file_path, ranges, config=worker_config)
+
+        segments = []
+        offset = 0
+        for line_count, chunk_segments in results:
+            segments.extend((offset + line_num, kind, data) for line_num, kind, data in chunk_segments)
+            offset += line_count
+
+        state = 'EXPECTING_HEADER'
+        index = 0
+        while index < len(segments):
+            line_num, kind, data = segments[index]
+            index += 1
+            if kind is None:
+                _warn_unrecognized(line_num)
+                continue
+
+            if kind != 'details':
+                state = self._next_state(state, line_num, kind)
+                yield ParseEvent(kind, line_num, data)
+                continue
+
+            # Junta os blocos de detalhes consecutivos (que só foram separados pela divisão do ficheiro)
+            state = self._next_state(state, line_num, 'detail')
+            runs = [data]
+            while index < len(segments) and segments[index][1] in {'details', None}:
+                next_line_num, next_kind, next_data = segments[index]
+                index += 1
+                if next_kind is None:
+                    _warn_unrecognized(next_line_num)
                 else:
-                    expected_types = ' or '.join(actions.keys())
-                    raise ValueError(
-                        f'Structural error on line {line_num}: Expected a "{expected_types}" line, '
-                        f'found "{line_type_id}".'
-                    )
+                    runs.append(next_data)
+            yield ParseEvent('details', line_num, _join_runs(runs))
 
-        if not raw_document.footer:
-            raise ValueError('Structural error: End of file reached but footer (type 3) was not found.')
+        self._check_end_state(state)
+
+    def parse(self, file_path: Path, config: dict[str, Any]) -> ParsedDocumentRaw:
+        """
+        Lê o documento inteiro a partir dos eventos de `iter_events` (ou dos blocos lidos em paralelo,
+        nos ficheiros grandes). Na disposição colunar, o iterador de detalhes é consumido por lotes
+        diretamente para as colunas: os registos de cada linha nunca ficam todos em memória.
+        """
+        logger.info(f"Extracting raw string data from '{file_path.name}' with FixedFormatParser.")
+
+        raw_document = ParsedDocumentRaw()
+        if config.get('detail_layout', 'rows') == 'columnar':
+            # Os detalhes lidos em streaming são transpostos para as colunas por lotes: nunca há um registo por linha
+            plan = _build_read_plan(config)
+            raw_document.details = ColumnarDetails(plan.detail_fields, plan.encoding)
+
+        if should_parse_in_parallel(file_path):
+            events = self._iter_parallel_events(file_path, config)
+        else:
+            events = self.iter_events(file_path, config)
+
+        for event in events:
+            if event.kind == 'details':
+                raw_document.details.extend(event.data)
+            elif event.kind == 'totals':
+                raw_document.totals.append(event.data)
+            else:
+                setattr(raw_document, event.kind, event.data)
 
         return raw_document
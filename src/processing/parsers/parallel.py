@@ -0,0 +1,137 @@
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from src.config.settings import PARALLEL_PARSING
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def parallel_workers() -> int:
+    """Number of worker processes used to parse one file (0 in the settings means one per CPU core)."""
+    workers = PARALLEL_PARSING['PARSE_WORKERS']
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def should_parse_in_parallel(file_path: Path) -> bool:
+    """Only large files are worth the cost of splitting them between the worker processes."""
+    if _PoolState.in_worker or parallel_workers() <= 1:
+        return False
+    return file_path.stat().st_size >= PARALLEL_PARSING['PARSE_PARALLEL_MIN_MB'] * MB
+
+
+def should_parse_files_in_pool(file_count: int) -> bool:
+    """Several files of the same run are parsed side by side in the worker processes."""
+    if _PoolState.in_worker or file_count <= 1 or parallel_workers() <= 1:
+        return False
+    return PARALLEL_PARSING['PARSE_FILES_IN_POOL']
+
+
+def split_line_aligned(file_path: Path, start: int = 0, chunk_size: int = 0) -> list[tuple[int, int]]:
+    """
+    Splits the file, from byte `start`, into ranges of about `chunk_size` bytes.
+    Every range ends right after a line feed, so no line is ever split between two ranges.
+    """
+    chunk_size = chunk_size or PARALLEL_PARSING['PARSE_CHUNK_MB'] * MB
+    size = file_path.stat().st_size
+
+    ranges = []
+    with open(file_path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()  # Advances to the end of the current line
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def read_range(file_path: Path, start: int, end: int) -> bytes:
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+class _PoolState:
+    pool: Optional[ProcessPoolExecutor] = None
+    log_listener: Optional[logging.handlers.QueueListener] = None
+    lock = threading.Lock()
+    # True inside the worker processes of the pool, which never start a pool of their own
+    in_worker = False
+
+
+def _init_worker(log_queue: Optional[multiprocessing.Queue], log_level: int):
+    _PoolState.in_worker = True
+    if log_queue is not None:
+        # The records go back to the main process, the only one writing to the log handlers
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(log_level)
+
+
+def _start_log_listener(context) -> Optional[multiprocessing.Queue]:
+    """Forwards the log records of the workers to the handlers of the main process (if logging is set up)."""
+    root = logging.getLogger()
+    if not root.handlers:
+        return None
+    log_queue = context.Queue()
+    _PoolState.log_listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    _PoolState.log_listener.start()
+    return log_queue
+
+
+def _mp_context():
+    # The scheduler runs threads: 'forkserver' avoids forking a multi-threaded process
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared process pool, creating it on first use.
+    The pool is kept alive between files so the worker start-up cost is only paid once.
+    """
+    with _PoolState.lock:
+        if _PoolState.pool is None:
+            context = _mp_context()
+            _PoolState.pool = ProcessPoolExecutor(
+                max_workers=parallel_workers(),
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_start_log_listener(context), logging.getLogger().level),
+            )
+        return _PoolState.pool
+
+
+def shutdown_process_pool():
+    """Stops the worker processes of the shared pool (if it was ever started)."""
+    with _PoolState.lock:
+        if _PoolState.pool is not None:
+            _PoolState.pool.shutdown(wait=True, cancel_futures=True)
+            _PoolState.pool = None
+        if _PoolState.log_listener is not None:
+            _PoolState.log_listener.stop()
+            _PoolState.log_listener = None
+
+
+def map_ranges(worker: Callable, file_path: Path, ranges: list[tuple[int, int]], **kwargs: Any) -> list:
+    """
+    Runs `worker(file_path, start, end, **kwargs)` for every range in the shared process pool.
+    The worker must be a module-level function; results are returned in the order of the ranges.
+    """
+    logger.info(f"Parsing '{file_path.name}' in {len(ranges)} chunks with {parallel_workers()} worker processes.")
+
+    task = partial(worker, file_path, **kwargs)
+    return list(get_process_pool().map(task, *zip(*ranges)))
@@ -0,0 +1,2 @@
+# Values per IN list in the set-based lookups. SQL Server accepts at most 2100 parameters per statement.
+IN_CLAUSE_CHUNK_SIZE = 1000
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.config.settings import REFERENCE_CACHE
+from src.models.publication import Publication
+
+logger = logging.getLogger(__name__)
+
+# The LIKE on ZPUBLIC.DESPUB_0 compares with the collation of the column: case-sensitive for a
+# binary (BIN/BIN2) or case-sensitive (CS) collation, case-insensitive otherwise
+_DESCRIPTION_COLLATION = Publication.description.type.collation or ''
+CASE_SENSITIVE_DESCRIPTIONS = any(flag in _DESCRIPTION_COLLATION for flag in ('_BIN', '_CS'))
+
+
+def clean_description(description: Optional[str]) -> str:
+    """
+    Normalizes a description for comparison: trimmed of spaces (as LTRIM/RTRIM, not of other
+    whitespace), without apostrophes, in upper case.
+    """
+    return (description or '').strip(' ').replace("'", '').upper()
+
+
+def description_starts_with(description: str, cleaned: str) -> bool:
+    """Whether `description LIKE 'cleaned%'` holds: the prefix test of the description tier 3."""
+    if not CASE_SENSITIVE_DESCRIPTIONS:
+        description = description.upper()
+    return description.startswith(cleaned)
+
+
+class IndexedPublication(NamedTuple):
+    code: str
+    description: str
+    supplier_reference: str
+    cleaned: str
+
+
+class DescriptionIndex:
+    """
+    In-memory index of the ZPUBLIC descriptions, for the description tiers of the publication
+    matching (see `PublicationRepository.find_publication_code`):
+
+    - by description: the lowest code whose cleaned description matches and whose raw
+      description starts with it (the LIKE prefix search, see `description_starts_with`);
+    - by (supplier, description): the lowest code of the supplier whose cleaned description matches.
+
+    Both are dict probes. The index is loaded in one query, then refreshed every
+    `CACHE_CHANGE_CHECK_SECONDS` with the rows updated since the last refresh (UPDDATTIM_0).
+    Deleted rows are caught by comparing the row count, and the index is rebuilt every
+    `CACHE_TTL_SECONDS` in any case. Disabled with the reference data cache (`CACHE_ENABLED`).
+    """
+
+    def __init__(self, settings: Optional[dict[str, Any]] = None):
+        settings = {**REFERENCE_CACHE, **(settings or {})}
+        self.enabled = settings['CACHE_ENABLED']
+        self.refresh_seconds = settings['CACHE_CHANGE_CHECK_SECONDS']
+        self.rebuild_seconds = settings['CACHE_TTL_SECONDS']
+
+        self._lock = threading.Lock()
+        self._publications: dict[str, IndexedPublication] = {}
+        self._codes_by_description: defaultdict[str, set[str]] = defaultdict(set)
+        self._by_description: dict[str, str] = {}
+        self._by_supplier: dict[tuple[str, str], str] = {}
+        self._watermark: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._next_rebuild = 0.0
+
+    def __len__(self) -> int:
+        return len(self._publications)
+
+    def refresh(self, session: Session) -> bool:
+        """
+        Brings the index up to date if a refresh is due.
+
+        Returns:
+            True if the database was read, False if the index is still valid.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_refresh:
+                return False
+            self._next_refresh = now + self.refresh_seconds
+
+            if now >= self._next_rebuild:
+                self._rebuild(session)
+                self._next_rebuild = now + self.rebuild_seconds
+            elif not self._update(session):
+                self._rebuild(session)
+            return True
+
+    @staticmethod
+    def _select_rows():
+        return select(
+            Publication.code, Publication.description, Publication.supplier_reference, Publication.updateDatetime
+        )
+
+    def _rebuild(self, session: Session):
+        self._publications.clear()
+        self._codes_by_description.clear()
+        self._by_description.clear()
+        self._by_supplier.clear()
+        self._watermark = None
+
+        self._apply(session.execute(self._select_rows()))
+        logger.info(f'Indexed the descriptions of {len(self._publications)} publications.')
+
+    def _update(self, session: Session) -> bool:
+        """Applies the rows updated since the last refresh. Returns False if rows were deleted meanwhile."""
+        if self._watermark is not None:
+            # >= because rows updated in the same tick as the watermark may not have been read yet
+            self._apply(session.execute(self._select_rows().where(Publication.updateDatetime >= self._watermark)))
+
+        count = session.scalar(select(func.count()).select_from(Publication))
+        return count == len(self._publications)
+
+    def _apply(self, rows: Iterable[Any]):
+        descriptions: set[str] = set()
+        supplier_keys: set[tuple[str, str]] = set()
+
+        for row in rows:
+            if self._watermark is None or (row.updateDatetime is not None and row.updateDatetime > self._watermark):
+                self._watermark = row.updateDatetime
+
+            previous = self._publications.pop(row.code, None)
+            if previous is not None:
+                codes = self._codes_by_description[previous.cleaned]
+                codes.discard(row.code)
+                if not codes:
+                    del self._codes_by_description[previous.cleaned]
+                descriptions.add(previous.cleaned)
+                supplier_keys.add((previous.supplier_reference, previous.cleaned))
+
+            if row.description is None:
+                # NULL never matches in SQL
+                continue
+
+            publication = IndexedPublication(
+                code=row.code,
+                description=row.description,
+                supplier_reference=row.supplier_reference,
+                cleaned=clean_description(row.description),
+            )
+            self._publications[row.code] = publication
+            self._codes_by_description[publication.cleaned].add(row.code)
+            descriptions.add(publication.cleaned)
+            supplier_keys.add((publication.supplier_reference, publication.cleaned))
+
+        for cleaned in descriptions:
+            codes = self._codes_by_description.get(cleaned, ())
+            self._set_best(
+                self._by_description,
+                cleaned,
+                [code for code in codes if description_starts_with(self._publications[code].description, cleaned)],
+            )
+        for supplier, cleaned in supplier_keys:
+            codes = self._codes_by_description.get(cleaned, ())
+            self._set_best(
+                self._by_supplier,
+                (supplier, cleaned),
+                [code for code in codes if self._publications[code].supplier_reference == supplier],
+            )
+
+    @staticmethod
+    def _set_best(best: dict, key: Any, codes: list[str]):
+        if codes:
+            best[key] = min(codes)
+        else:
+            best.pop(key, None)
+
+    def find_code(self, provider_id: str, cleaned_description: str) -> Optional[str]:
+        """The best publication code of a cleaned description: the prefix match first, then the supplier's."""
+        code = self._by_description.get(cleaned_description)
+        if code is None:
+            code = self._by_supplier.get((provider_id, cleaned_description))
+        return code
+
+
+# Shared by the repositories of the process
+description_index = DescriptionIndex()
@@ -1,30 +1,114 @@
 import logging
-from typing import Optional
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from datetime import date, datetime
+from itertools import batched
+from typing import Any, NamedTuple, Optional, Union
 
-from sqlalchemy import select
+from sqlalchemy import (
+    Table,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.orm import Session
 
 from src.models.data_models import EditorParameters
 from src.models.edition import Edition
+from src.repositories import IN_CLAUSE_CHUNK_SIZE
+from src.repositories.reference_cache import ReferenceCache
+from src.repositories.staging import from_select_defaults, stage_table
 
 logger = logging.getLogger(__name__)
 
 
+class EditorKey(NamedTuple):
+    """The editor's identification of an edition. Without a cover date, any cover date matches."""
+
+    bipad: str
+    edition_number: str
+    suffix: str
+    cover_date: Optional[date] = None
+
+
+# Editions resolved for a file: by edition code (ITMREF_0) and by editor key
+EditionsMap = dict[Union[str, EditorKey], Edition]
+
+
+# An edition to create or update from a supplier's file: {Edition attribute: value}. Must hold `edition`;
+# the rows of an upsert have the same attributes
+EditionRow = Mapping[str, Any]
+
+# The Edition attributes that the supplier's files update in existing editions (master data)
+MASTER_DATA_ATTRIBUTES = (
+    'description',
+    'bipad',
+    'edition_number',
+    'suffix',
+    'extension',
+    'label',
+    'nim_code',
+    'chrono',
+    'gex_code',
+)
+
+
+class EditionUpsert(NamedTuple):
+    """Outcome of an edition upsert."""
+
+    inserted: int
+    updated: int
+
+
+# Shared by the repositories of the process. Keys are edition codes and EditorKeys, as in EditionsMap
+edition_cache = ReferenceCache('editions')
+
+
+def _as_date(value: Union[date, datetime, None]) -> Optional[date]:
+    return value.date() if isinstance(value, datetime) else value
+
+
 class EditionRepository:
     """
     Handles all database operations for Editions.
+
+    Lookups by code and by editor key go through a ReferenceCache. Cached Editions are
+    detached from the session (so that its commit does not expire them) and must be
+    treated as read-only: use `session.merge(edition, load=False)` to change one.
     """
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, cache: Optional[ReferenceCache] = None):
         self.session = session
+        self.cache = edition_cache if cache is None else cache
+
+    def _validate_cache(self):
+        """Clears the cache when ZITMINP has changed since the last check."""
+        self.cache.validate(lambda: self.session.scalar(select(func.max(Edition.updateDatetime))))
+
+    def _detach(self, editions: Iterable[Edition]):
+        if self.cache.enabled:
+            for edition in editions:
+                # An Edition may be resolved by more than one key
+                if edition in self.session:
+                    self.session.expunge(edition)
 
     def get_edition_by_code(self, code: str) -> Optional[Edition]:
         """
         Fetches a Edition record by its code.
         Replaces your 'get_counter' method.
         """
+        self._validate_cache()
+        return self.cache.get_or_load(code, lambda: self._load_edition(code))
+
+    def _load_edition(self, code: str) -> Optional[Edition]:
         stmt = select(Edition).where(Edition.edition == code)
-        return self.session.scalars(stmt).one_or_none()
+        edition = self.session.scalars(stmt).one_or_none()
+        if edition is not None:
+            self._detach((edition,))
+        return edition
 
     def get_edition_by_editor_code(self, params: EditorParameters) -> Optional[Edition]:
         """
@@ -39,3 +123,155 @@ class EditionRepository:
             Edition.cover_date == params.cover_date,
         )
         return self.session.scalars(stmt).one_or_none()
+
+    def get_editions_by_codes(self, codes: Iterable[str]) -> dict[str, Edition]:
+        """
+        Fetches the Editions of many codes at once, with one IN query per chunk of distinct codes.
+        Codes without an Edition are left out of the result. Only the codes that are not
+        cached are queried.
+        """
+        self._validate_cache()
+        distinct_codes = sorted({code for code in codes if code})
+        editions = self.cache.get_many_or_load(distinct_codes, self._load_editions_by_codes)
+        return {code: edition for code, edition in editions.items() if edition is not None}
+
+    def _load_editions_by_codes(self, codes: list[str]) -> dict[str, Edition]:
+        editions: dict[str, Edition] = {}
+        for chunk in batched(codes, IN_CLAUSE_CHUNK_SIZE):
+            stmt = select(Edition).where(Edition.edition.in_(chunk))
+            editions.update((edition.edition, edition) for edition in self.session.scalars(stmt))
+
+        self._detach(editions.values())
+        return editions
+
+    def get_editions_by_editor_keys(self, keys: Iterable[EditorKey]) -> dict[EditorKey, Edition]:
+        """
+        Fetches the Editions of many editor keys at once. Each chunk of keys is one query
+        on its bipads and edition numbers (IN lists); the candidates are then matched to
+        the keys exactly. A key without a cover date only matches if a single Edition fits.
+        Only the keys that are not cached are queried.
+        """
+        self._validate_cache()
+        distinct_keys = sorted(set(keys), key=lambda key: (key.bipad, key.edition_number, key.suffix))
+        editions = self.cache.get_many_or_load(distinct_keys, self._load_editions_by_editor_keys)
+        return {key: edition for key, edition in editions.items() if edition is not None}
+
+    def _load_editions_by_editor_keys(self, keys: list[EditorKey]) -> dict[EditorKey, Edition]:
+        editions: dict[EditorKey, Edition] = {}
+
+        # Both IN lists share the statement's parameters, so each chunk gets half of them
+        for chunk in batched(keys, IN_CLAUSE_CHUNK_SIZE // 2):
+            stmt = select(Edition).where(
+                Edition.bipad.in_({key.bipad for key in chunk}),
+                Edition.edition_number.in_({key.edition_number for key in chunk}),
+            )
+
+            candidates: defaultdict[tuple, list[Edition]] = defaultdict(list)
+            for edition in self.session.scalars(stmt):
+                candidates[(edition.bipad, edition.edition_number, edition.suffix)].append(edition)
+
+            for key in chunk:
+                matches = [
+                    edition
+                    for edition in candidates.get((key.bipad, key.edition_number, key.suffix), ())
+                    if key.cover_date is None or _as_date(edition.cover_date) == key.cover_date
+                ]
+                if len(matches) == 1:
+                    editions[key] = matches[0]
+                elif matches:
+                    logger.warning(f'{len(matches)} editions match {key}. The edition was not resolved.')
+
+        self._detach(editions.values())
+        return editions
+
+    def resolve_editions(self, references: Iterable[tuple[str, EditorKey]]) -> EditionsMap:
+        """
+        Resolves all the editions referenced by a file in a few set-based queries.
+        Each reference is the edition code of a line and its editor key: the codes are
+        resolved first, then the editor keys of the lines whose code was not found.
+
+        Returns:
+            EditionsMap: Editions by code and by editor key.
+        """
+        references = list(references)
+        editions: EditionsMap = dict(self.get_editions_by_codes(code for code, _ in references))
+
+        missing_keys = {key for code, key in references if code not in editions}
+        if missing_keys:
+            editions.update(self.get_editions_by_editor_keys(missing_keys))
+
+        logger.info(f'Resolved the editions of {len(references)} lines.')
+        return editions
+
+    def upsert_editions(self, rows: Iterable[EditionRow]) -> EditionUpsert:
+        """
+        Creates or updates many editions (ZITMINP) at once, with set-based statements.
+
+        The rows are staged in a temporary table (#ZITMINP_STAGE, in batches); then one UPDATE
+        applies the MASTER_DATA_ATTRIBUTES of the editions that exist and differ, and one
+        INSERT ... SELECT creates the editions that do not exist, with the column defaults of
+        the model. The statements run in the session's transaction; the number of statements
+        does not depend on the number of lines of the file. Rows (all with the same attributes)
+        are matched on `edition` (ITMREF_0); the first row of a code wins.
+
+        Returns:
+            EditionUpsert: The number of editions inserted and updated.
+        """
+        distinct_rows: dict[str, EditionRow] = {}
+        for row in rows:
+            distinct_rows.setdefault(row['edition'], row)
+        if not distinct_rows:
+            return EditionUpsert(inserted=0, updated=0)
+
+        attributes = list(next(iter(distinct_rows.values())))
+        columns = [Edition.__mapper__.columns[attribute] for attribute in attributes]
+        stage = stage_table('#ZITMINP_STAGE', columns)
+
+        # A savepoint: either all the statements apply or none does, even if the caller commits after an error
+        with self.session.begin_nested():
+            connection = self.session.connection()
+            stage.create(connection)
+            for batch in batched(distinct_rows.values(), IN_CLAUSE_CHUNK_SIZE):
+                staged = [
+                    {column.name: row[attribute] for attribute, column in zip(attributes, columns)} for row in batch
+                ]
+                self.session.execute(insert(stage), staged)
+
+            updated = self._update_from_stage(stage)
+            inserted = self._insert_from_stage(stage)
+            stage.drop(connection)
+
+        if inserted or updated:
+            self.cache.invalidate()
+
+        logger.info(f'Editions upsert: {inserted} inserted, {updated} updated ({len(distinct_rows)} staged).')
+        return EditionUpsert(inserted=inserted, updated=updated)
+
+    def _update_from_stage(self, stage: Table) -> int:
+        """Applies the MASTER_DATA_ATTRIBUTES of the staged editions that exist and differ."""
+        target = Edition.__table__
+        names = [Edition.__mapper__.columns[attribute].name for attribute in MASTER_DATA_ATTRIBUTES]
+        names = [name for name in names if name in stage.c]
+        if not names:
+            return 0
+
+        stmt = (
+            update(target)
+            .where(
+                target.c.ITMREF_0 == stage.c.ITMREF_0,
+                or_(*(target.c[name] != stage.c[name] for name in names)),
+            )
+            .values({name: stage.c[name] for name in names})
+            .values(UPDTICK_0=target.c.UPDTICK_0 + 1)
+        )
+        return self.session.execute(stmt).rowcount
+
+    def _insert_from_stage(self, stage: Table) -> int:
+        """Creates the staged editions that do not exist."""
+        target = Edition.__table__
+        defaults = from_select_defaults(target, set(stage.c.keys()))
+        new_editions = select(*stage.c, *(expression.label(name) for name, expression in defaults.items())).where(
+            ~exists().where(target.c.ITMREF_0 == stage.c.ITMREF_0)
+        )
+        stmt = insert(target).from_select([*stage.c.keys(), *defaults], new_editions)
+        return self.session.execute(stmt).rowcount
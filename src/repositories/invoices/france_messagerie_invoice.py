@@ -1,8 +1,12 @@
 import logging
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any
 
 from sqlalchemy.orm import Session
 
-from src.models.data_models import FranceMessagerieInvoice
+from src.models.data_models import FranceMessagerieDetailLine, FranceMessagerieInvoice
+from src.repositories.invoices.purchase_invoice_repository import InvoiceRow, PurchaseInvoiceRepository
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +18,94 @@ class FranceMessagerieInvoiceRepository:
 
     def __init__(self, session: Session):
         self.session = session
+        self.writer = PurchaseInvoiceRepository(session)
 
-    def create_invoice(self, invoice: FranceMessagerieInvoice) -> None:
+    @staticmethod
+    def _header_row(invoice: FranceMessagerieInvoice, invoice_number: str, supplier: str, filename: str) -> InvoiceRow:
+        header = invoice.header
+        totals: dict[str, Any] = {'total_amount_including_tax': 0, 'total_amount_excluding_tax': 0}
+        for total in invoice.totals:
+            for name, amount in total.decimal_amounts().items():
+                totals[name] += amount
+
+        return {
+            'invoice_number': invoice_number,
+            'supplier': supplier,
+            'supplier_invoice_number': header.invoice_number,
+            'supplier_invoice_date': datetime.combine(header.invoice_date, datetime.min.time()),
+            'gex_code': header.gexpex_code,
+            'currency': header.currency,
+            'edi_invoice_type': header.invoice_or_credit_note,
+            'filename': filename,
+            'document_lines': len(invoice.details),
+            'quantity': sum(detail.quantity for detail in invoice.details),
+            'amount_including_tax': totals['total_amount_including_tax'],
+            'amount_excluding_tax': totals['total_amount_excluding_tax'],
+            # LQDNUM_0 has no default in ZPINVOICEV
+            'liquidation_number': '',
+        }
+
+    @staticmethod
+    def _line_row(
+        detail: FranceMessagerieDetailLine, line_number: int, invoice_number: str, supplier: str, nim_code: str
+    ) -> InvoiceRow:
+        # The amounts are scaled integers until here: Decimal only at the database boundary
+        amounts = detail.decimal_amounts()
+
+        return {
+            'invoice_number': invoice_number,
+            'line_number': line_number,
+            'supplier': supplier,
+            'publication': detail.publication_code,
+            'edition': detail.edition_code,
+            'description': detail.description,
+            'bipad': detail.bipad,
+            'edition_number': detail.edition,
+            'suffix': detail.suffix,
+            'extension': detail.extension,
+            'label': detail.label,
+            'nim_code': nim_code,
+            'chrono': detail.chrono,
+            'quantity': detail.quantity,
+            'gross_price': amounts['gross_price'],
+            'net_price': amounts['net_price_with_discount'],
+            'original_net_price': amounts['net_price'],
+            'discount_value_1': amounts['discount'],
+            'amount_excluding_tax': amounts['amount_without_tax_with_discount'],
+            'amount_including_tax': amounts['amount_with_tax'],
+            'tax': amounts['tax'],
+            'weight': amounts['weight'],
+            'original_invoice': detail.original_invoice,
+            'correction_type': detail.correction_type,
+        }
+
+    @classmethod
+    def _line_rows(cls, invoice: FranceMessagerieInvoice, invoice_number: str, supplier: str) -> Iterator[InvoiceRow]:
+        nim_code = invoice.header.nim_code
+        for line_number, detail in enumerate(invoice.details, start=1):
+            yield cls._line_row(detail, line_number, invoice_number, supplier, nim_code)
+
+    @classmethod
+    def invoice_rows(
+        cls, invoice: FranceMessagerieInvoice, invoice_number: str, supplier: str, filename: str = ''
+    ) -> tuple[InvoiceRow, Iterator[InvoiceRow]]:
         """
-        Creates a new France Messagerie invoice in the database.
+        The header row and the line rows of an invoice, for the bulk writers. The line rows
+        are built as they are consumed.
         """
+        if invoice.header is None:
+            raise ValueError('The invoice has no header.')
 
-        # Verifica se existe liquidação para a fatura
+        header = cls._header_row(invoice, invoice_number, supplier, filename)
+        return header, cls._line_rows(invoice, invoice_number, supplier)
 
-        self.session.add(invoice)
+    def create_invoice(
+        self, invoice: FranceMessagerieInvoice, invoice_number: str, supplier: str, filename: str = ''
+    ) -> int:
+        """
+        Creates a new France Messagerie invoice in the database (ZPINVOICEV and ZPINVOICED),
+        with bulk inserts in the session's transaction. Returns the number of lines inserted.
+        Large invoices can be written in bounded transactions with `InvoiceWriter` and `invoice_rows`.
+        """
+        header, lines = self.invoice_rows(invoice, invoice_number, supplier, filename)
+        return self.writer.insert_invoice(header, lines)
@@ -0,0 +1,107 @@
+import logging
+from collections.abc import Iterable, Mapping, Sequence
+from itertools import batched
+from typing import Any, Optional
+
+from sqlalchemy import Table, exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from src.config.settings import BULK_WRITE
+from src.database.base import Base
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+from src.repositories.staging import from_select_defaults, stage_table
+
+logger = logging.getLogger(__name__)
+
+# A row to insert: {model attribute: value}. Columns left out get their defaults.
+InvoiceRow = Mapping[str, Any]
+
+
+class PurchaseInvoiceRepository:
+    """
+    Bulk writes of EDI purchase invoices (ZPINVOICEV headers and ZPINVOICED lines).
+
+    Rows are inserted with Core INSERT statements, executemany in batches of
+    `batch_size` rows: no ORM objects, identity map or unit of work. With the
+    pyodbc backend (BULK_WRITE_FAST_EXECUTEMANY) each batch is sent as one
+    parameter array. The inserts run in the session's transaction.
+    """
+
+    def __init__(self, session: Session, batch_size: Optional[int] = None):
+        self.session = session
+        self.batch_size = batch_size or BULK_WRITE['WRITE_BATCH_SIZE']
+
+    def supplier_invoice_exists(self, supplier: str, supplier_invoice_number: str) -> bool:
+        """Whether a supplier's invoice is already in ZPINVOICEV (seek on the ZPINVOICEV_ZPIV1 index)."""
+        stmt = select(
+            exists().where(
+                PurchaseInvoiceHeader.supplier == supplier,
+                PurchaseInvoiceHeader.supplier_invoice_number == supplier_invoice_number,
+            )
+        )
+        return bool(self.session.scalar(stmt))
+
+    def _insert(self, model: type[Base], rows: Iterable[InvoiceRow]) -> int:
+        stmt = insert(model)
+        inserted = 0
+        for batch in batched(rows, self.batch_size):
+            self.session.execute(stmt, list(batch))
+            inserted += len(batch)
+        return inserted
+
+    def insert_headers(self, headers: Iterable[InvoiceRow]) -> int:
+        """Inserts invoice headers (ZPINVOICEV). Returns the number of rows inserted."""
+        return self._insert(PurchaseInvoiceHeader, headers)
+
+    def insert_lines(self, lines: Iterable[InvoiceRow]) -> int:
+        """Inserts invoice lines (ZPINVOICED), batch by batch as `lines` is consumed. Returns the number of rows."""
+        return self._insert(PurchaseInvoiceLines, lines)
+
+    def insert_invoice(self, header: InvoiceRow, lines: Iterable[InvoiceRow]) -> int:
+        """Inserts one invoice: its header, then its lines. Returns the number of lines inserted."""
+        self.insert_headers((header,))
+        inserted = self.insert_lines(lines)
+        logger.info(f"Inserted invoice '{header.get('invoice_number')}' with {inserted} lines.")
+        return inserted
+
+    def create_line_stage(self, attributes: Sequence[str]) -> Table:
+        """
+        Creates the temporary table (#ZPINVOICED_STAGE) where a chunked write stages the lines of an
+        invoice, with the ZPINVOICED columns of the given model attributes. The table lives on the
+        session's connection: the caller keeps that connection until `drop_line_stage`.
+        """
+        columns = [PurchaseInvoiceLines.__mapper__.columns[attribute] for attribute in attributes]
+        stage = stage_table('#ZPINVOICED_STAGE', columns)
+        stage.create(self.session.connection())
+        return stage
+
+    def stage_lines(self, stage: Table, lines: Iterable[InvoiceRow]) -> int:
+        """Inserts invoice lines into the stage table, in batches. Returns the number of rows."""
+        columns = PurchaseInvoiceLines.__mapper__.columns
+        rows = ({columns[attribute].name: value for attribute, value in row.items()} for row in lines)
+        stmt = insert(stage)
+        staged = 0
+        for batch in batched(rows, self.batch_size):
+            self.session.execute(stmt, list(batch))
+            staged += len(batch)
+        return staged
+
+    def publish_lines(self, stage: Table, values: Optional[InvoiceRow] = None) -> int:
+        """
+        Copies the staged lines into ZPINVOICED with one INSERT ... SELECT, with the given
+        {attribute: value} in place of the staged values (e.g. the invoice number). Returns the number of rows.
+        """
+        target = PurchaseInvoiceLines.__table__
+        columns = PurchaseInvoiceLines.__mapper__.columns
+        replaced = {
+            columns[attribute].name: literal(value, columns[attribute].type)
+            for attribute, value in (values or {}).items()
+        }
+        selected = {name: column for name, column in stage.c.items() if name not in replaced} | replaced
+        selected |= from_select_defaults(target, set(selected))
+        staged_lines = select(*(expression.label(name) for name, expression in selected.items()))
+        stmt = insert(target).from_select(list(selected), staged_lines)
+        return self.session.execute(stmt).rowcount
+
+    def drop_line_stage(self, stage: Table):
+        stage.drop(self.session.connection())
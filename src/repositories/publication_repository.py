@@ -1,37 +1,159 @@
 import logging
+from collections.abc import Iterable
+from itertools import batched
 from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, Unicode, and_, case, column, func, null, or_, select, table, union_all
 from sqlalchemy.orm import Session
 
 from src.config.settings import SCHEMA
 from src.database.database_core import DatabaseCoreManager
 from src.models.publication import Publication
+from src.repositories import IN_CLAUSE_CHUNK_SIZE
+from src.repositories.description_index import (
+    DescriptionIndex,
+    clean_description,
+    description_index,
+    description_starts_with,
+)
+from src.repositories.reference_cache import ReferenceCache
+from src.utils.local_menus import YesNo
 
 logger = logging.getLogger(__name__)
 
+# Publication references of the suppliers (no ORM model: only the columns used here)
+ZREFPUB = table(
+    'ZREFPUB',
+    column('CODPUB_0'),
+    column('BPSREF_0'),
+    column('REFEDI_0'),
+    column('DIADIS_0'),
+    column('ENAFLG_0'),
+    column('UPDDATTIM_0'),
+    schema=SCHEMA or None,
+)
+
+# Ranking of the matches, best first. Tiers 1 and 2 (ZREFPUB by bipad) rank by the day of
+# the week (1-7), any other day comes after them. Tier 3 is a description match found by
+# the LIKE prefix search, tier 4 a description match among the supplier's publications.
+# The description tiers are decided in Python (`_description_rank`), with the same rules as
+# the DescriptionIndex: the queries only fetch the candidates.
+RANK_OTHER_DAY = 8
+RANK_DESCRIPTION_PREFIX = 9
+RANK_SUPPLIER_DESCRIPTION = 10
+
+# Shared by the repositories of the process. Keys are ('code', code) for publications and
+# (supplier, bipad, cleaned description) for the publication codes found
+publication_cache = ReferenceCache('publications')
+
+# (supplier, bipad, cleaned description)
+PublicationKey = tuple[str, str, str]
+
 
 class PublicationRepository:
     """
     Handles all database operations for publications.
+
+    Lookups go through a ReferenceCache. Cached Publications are detached from the session
+    (so that its commit does not expire them) and must be treated as read-only.
+    Description matches are probed in a DescriptionIndex instead of querying ZPUBLIC.
     """
 
-    def __init__(self, session: Session):
+    def __init__(
+        self,
+        session: Session,
+        cache: Optional[ReferenceCache] = None,
+        descriptions: Optional[DescriptionIndex] = None,
+    ):
         self.session = session
         self.db_core = DatabaseCoreManager(session)
         self.schema = SCHEMA
+        self.cache = publication_cache if cache is None else cache
+        self.descriptions = description_index if descriptions is None else descriptions
+
+    def _validate_cache(self):
+        """Clears the cache when ZREFPUB or ZPUBLIC have changed since the last check (one query for both)."""
+        stmt = select(
+            select(func.max(ZREFPUB.c.UPDDATTIM_0)).scalar_subquery(),
+            select(func.max(Publication.updateDatetime)).scalar_subquery(),
+        )
+        self.cache.validate(lambda: tuple(self.session.execute(stmt).one()))
 
     def get_publication_by_code(self, code: str) -> Optional[Publication]:
         """
         Fetches a publication record by its code.
         Replaces your 'get_counter' method.
         """
+        self._validate_cache()
+        return self.cache.get_or_load(('code', code), lambda: self._load_publication(code))
+
+    def _load_publication(self, code: str) -> Optional[Publication]:
         stmt = select(Publication).where(Publication.code == code)
-        return self.session.scalars(stmt).one_or_none()
+        publication = self.session.scalars(stmt).one_or_none()
+        if publication is not None and self.cache.enabled:
+            self.session.expunge(publication)
+        return publication
+
+    @staticmethod
+    def clean_description(description: Optional[str]) -> str:
+        """Normalizes a description for comparison: trimmed, without apostrophes, in upper case."""
+        return clean_description(description)
+
+    @staticmethod
+    def _cleaned_description_sql() -> ColumnElement:
+        """`clean_description` in SQL, for ZPUBLIC.DESPUB_0."""
+        return func.upper(func.replace(func.ltrim(func.rtrim(Publication.description)), "'", ''))
+
+    @staticmethod
+    def _description_prefix(cleaned: str) -> ColumnElement:
+        """`DESPUB_0 LIKE 'cleaned%'`, with the wildcards of the description escaped (an index seek)."""
+        escaped = cleaned.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('[', '\\[')
+        return Publication.description.like(f'{escaped}%', escape='\\')
+
+    def _description_candidates(self, provider_id: str, cleaned_descriptions: set[str]) -> ColumnElement:
+        """
+        The ZPUBLIC rows that can match one of the cleaned descriptions: those found by the LIKE
+        prefix search, and the supplier's own publications (BPSREF_0) with the same cleaned description.
+        Each branch starts from an indexable predicate; `_description_rank` makes the decision.
+        """
+        return or_(
+            *(self._description_prefix(cleaned) for cleaned in cleaned_descriptions),
+            and_(
+                Publication.supplier_reference == provider_id,
+                self._cleaned_description_sql().in_(cleaned_descriptions),
+            ),
+        )
+
+    @staticmethod
+    def _description_rank(row, provider_id: str, cleaned: str) -> Optional[int]:
+        """The description tier (3 or 4) of a ZPUBLIC row for a cleaned description, None if it does not match."""
+        if clean_description(row.description) != cleaned:
+            return None
+        if description_starts_with(row.description, cleaned):
+            return RANK_DESCRIPTION_PREFIX
+        if row.supplier_reference == provider_id:
+            return RANK_SUPPLIER_DESCRIPTION
+        return None
+
+    @staticmethod
+    def _reference_rank(day: ColumnElement) -> ColumnElement:
+        return case((day.between(1, 7), day), else_=RANK_OTHER_DAY)
 
     def find_publication_code(self, bipad: str, provider_id: str, description: str) -> Optional[str]:
         """
-        Tenta encontrar um código de publicação através de várias lógicas em cascata.
+        Tenta encontrar um código de publicação através de várias lógicas em cascata,
+        numa única consulta: as quatro tentativas são unidas e ordenadas pela prioridade.
+
+        1. ZREFPUB do fornecedor e bipad, pelo dia da semana (1 a 7).
+        2. ZREFPUB do fornecedor e bipad, com qualquer outro dia.
+        3. ZPUBLIC com a descrição (limpa) igual, encontrada pelo prefixo (LIKE).
+        4. ZPUBLIC do fornecedor com a descrição (limpa) igual.
+
+        As tentativas 1 e 2 são ordenadas na consulta; as linhas do ZPUBLIC candidatas às
+        tentativas 3 e 4 vêm na mesma consulta e são avaliadas em Python (`_description_rank`).
+
+        Com o índice de descrições ativo (DescriptionIndex), as tentativas 3 e 4 são
+        procuradas em memória e só o ZREFPUB é consultado.
 
         Args:
             bipad: Número do BIPAD da publicação.
@@ -41,74 +163,137 @@ class PublicationRepository:
         Returns:
             O código da publicação (CODPUB_0) como string, ou None se não for encontrado.
         """
+        self._validate_cache()
+        key = (provider_id, bipad, self.clean_description(description))
+        return self.cache.get_or_load(key, lambda: self._query_publication_code(bipad, provider_id, description))
+
+    def _query_publication_code(self, bipad: str, provider_id: str, description: str) -> Optional[str]:
         logger.info(f"Searching for publication code for supplier '{provider_id}' and bipad '{bipad}'.")
 
-        # Tentativa 1: Busca por dia da semana
-        for day in range(1, 8):
-            logger.info(f'Attempt 1: Searching by actual day of week ({day})...')
-            result = self.db_core.execute_query(
-                table=f'{self.schema}.ZREFPUB',
-                columns=['CODPUB_0'],
-                where_clauses={
-                    'BPSREF_0': ('=', provider_id),
-                    'REFEDI_0': ('=', bipad),
-                    'DIADIS_0': ('=', day),
-                    'ENAFLG_0': ('=', 2),
-                },
-                limit=1,
-            )
-
-            if result['status'] == 'success' and result['records'] > 0:
-                pub_code = result['data'][0]['CODPUB_0']
-                logger.info(f"Found publication code '{pub_code}' via day of week match.")
-                return pub_code
-
-        # Tentativa 2: Busca por bipad
-        logger.info(f'Attempt 2: Searching by bipad ({bipad})...')
-        result = self.db_core.execute_query(
-            table=f'{self.schema}.ZREFPUB',
-            columns=['CODPUB_0'],
-            where_clauses={
-                'BPSREF_0': ('=', provider_id),
-                'REFEDI_0': ('=', bipad),
-                'ENAFLG_0': ('=', 2),
-            },
-            limit=1,
+        cleaned_input_desc = self.clean_description(description)
+        if self.descriptions.enabled:
+            code = self._best_references(provider_id, {bipad}).get(bipad)
+            if code is None:
+                code = self._description_matches(provider_id, {cleaned_input_desc}).get(cleaned_input_desc)
+            if code is not None:
+                logger.info(f"Found publication code '{code}'.")
+            return code
+
+        by_reference = select(
+            ZREFPUB.c.CODPUB_0.label('code'),
+            self._reference_rank(ZREFPUB.c.DIADIS_0).label('match_rank'),
+            null().cast(Unicode).label('description'),
+            null().cast(Unicode).label('supplier_reference'),
+        ).where(
+            ZREFPUB.c.BPSREF_0 == provider_id,
+            ZREFPUB.c.REFEDI_0 == bipad,
+            ZREFPUB.c.ENAFLG_0 == YesNo.YES,
         )
+        by_description = select(
+            Publication.code.label('code'),
+            null().label('match_rank'),
+            Publication.description.label('description'),
+            Publication.supplier_reference.label('supplier_reference'),
+        ).where(self._description_candidates(provider_id, {cleaned_input_desc}))
 
-        if result['status'] == 'success' and result['records'] > 0:
-            pub_code = result['data'][0]['CODPUB_0']
-            logger.info(f"Found publication code '{pub_code}' by bipad.")
-            return pub_code
+        matches: list[tuple[int, str]] = []
+        for row in self.session.execute(union_all(by_reference, by_description)):
+            match_rank = row.match_rank
+            if match_rank is None:
+                match_rank = self._description_rank(row, provider_id, cleaned_input_desc)
+            if match_rank is not None:
+                matches.append((match_rank, row.code))
+        if not matches:
+            return None
 
-        # Limpa os dados da descrição
-        cleaned_input_desc = description.strip().replace("'", '').upper()
-        if not cleaned_input_desc:
-            cleaned_input_desc = ''
+        match_rank, code = min(matches)
+        logger.info(f"Found publication code '{code}' (match rank {match_rank}).")
+        return code
 
-        # Tentativa 3: Busca por descrição
-        pattern = f'{cleaned_input_desc}%'
-        stmt = select(Publication.code, Publication.description, Publication.supplier_reference).where(
-            Publication.description.like(pattern)
+    def find_publication_codes(
+        self, provider_id: str, items: Iterable[tuple[str, str]]
+    ) -> dict[tuple[str, str], Optional[str]]:
+        """
+        Batch variant of `find_publication_code`: resolves many (bipad, description) pairs
+        of a supplier with the same priorities, in two set-based queries per chunk of pairs
+        (ZREFPUB by the bipads, ZPUBLIC by the cleaned descriptions, unless the description index is used).
+
+        Returns:
+            dict: The publication code (or None) of each (bipad, description) pair.
+        """
+        self._validate_cache()
+        keys = {
+            (bipad, description): (provider_id, bipad, self.clean_description(description))
+            for bipad, description in items
+        }
+        found = self.cache.get_many_or_load(
+            keys.values(), lambda missing: self._query_publication_codes(provider_id, missing)
         )
+        codes = {pair: found[key] for pair, key in keys.items()}
 
-        results = self.session.execute(stmt)
+        logger.info(f'Resolved {sum(code is not None for code in codes.values())}/{len(codes)} publication codes.')
+        return codes
 
-        for row in results:
-            cleaned_desc = row.description.strip().replace("'", '').upper()
-            if cleaned_desc == cleaned_input_desc:
-                logger.info(f"Found publication code '{row.code}' via description match.")
-                return row.code
+    def _query_publication_codes(self, provider_id: str, keys: list[PublicationKey]) -> dict[PublicationKey, str]:
+        codes: dict[PublicationKey, str] = {}
+        for chunk in batched(keys, IN_CLAUSE_CHUNK_SIZE):
+            by_bipad = self._best_references(provider_id, {bipad for _, bipad, _ in chunk})
+            by_description = self._description_matches(provider_id, {cleaned for _, _, cleaned in chunk})
+            for key in chunk:
+                _, bipad, cleaned = key
+                code = by_bipad.get(bipad)
+                if code is None:
+                    code = by_description.get(cleaned)
+                if code is not None:
+                    codes[key] = code
+        return codes
 
-        # Tentativa 4: Busca pelo código do fornecedor somente
-        stmt = select(Publication.code, Publication.description).where(Publication.supplier_reference == provider_id)
+    def _best_references(self, provider_id: str, bipads: set[str]) -> dict[str, str]:
+        """Tiers 1 and 2 for many bipads: the best ZREFPUB code of each bipad."""
+        stmt = select(
+            ZREFPUB.c.REFEDI_0.label('bipad'),
+            ZREFPUB.c.CODPUB_0.label('code'),
+            self._reference_rank(ZREFPUB.c.DIADIS_0).label('match_rank'),
+        ).where(
+            ZREFPUB.c.BPSREF_0 == provider_id,
+            ZREFPUB.c.REFEDI_0.in_(bipads),
+            ZREFPUB.c.ENAFLG_0 == YesNo.YES,
+        )
 
-        results = self.session.execute(stmt)
+        best: dict[str, tuple[int, str]] = {}
+        for row in self.session.execute(stmt):
+            candidate = (row.match_rank, row.code)
+            if row.bipad not in best or candidate < best[row.bipad]:
+                best[row.bipad] = candidate
+        return {bipad: code for bipad, (_, code) in best.items()}
 
-        for row in results:
-            cleaned_desc = row.description.strip().replace("'", '').upper()
-            if cleaned_desc == cleaned_input_desc:
-                logger.info(f"Found publication code '{row.code}' via description match.")
-                return row.code
+    def _description_matches(self, provider_id: str, cleaned_descriptions: set[str]) -> dict[str, str]:
+        """Tiers 3 and 4 for many descriptions: probed in the description index, or queried if it is disabled."""
+        if not self.descriptions.enabled:
+            return self._best_descriptions(provider_id, cleaned_descriptions)
 
-        return None
+        self.descriptions.refresh(self.session)
+        matches = {cleaned: self.descriptions.find_code(provider_id, cleaned) for cleaned in cleaned_descriptions}
+        return {cleaned: code for cleaned, code in matches.items() if code is not None}
+
+    def _best_descriptions(self, provider_id: str, cleaned_descriptions: set[str]) -> dict[str, str]:
+        """
+        Tiers 3 and 4 for many descriptions: the best ZPUBLIC code of each cleaned description.
+        Two parameters per description: a chunk of IN_CLAUSE_CHUNK_SIZE stays under the SQL Server limit.
+        """
+        stmt = select(Publication.code, Publication.description, Publication.supplier_reference).where(
+            self._description_candidates(provider_id, cleaned_descriptions)
+        )
+
+        best: dict[str, tuple[int, str]] = {}
+        for row in self.session.execute(stmt):
+            cleaned = self.clean_description(row.description)
+            if cleaned not in cleaned_descriptions:
+                continue
+            match_rank = self._description_rank(row, provider_id, cleaned)
+            if match_rank is None:
+                continue
+            candidate = (match_rank, row.code)
+            if cleaned not in best or candidate < best[cleaned]:
+                best[cleaned] = candidate
+        return {cleaned: code for cleaned, (_, code) in best.items()}
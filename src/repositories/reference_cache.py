@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from src.config.settings import REFERENCE_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Returned by `get` when the key is not cached (a cached miss is stored as None)
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    """Counters of a ReferenceCache since it was created."""
+
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / lookups if lookups else 0.0
+
+
+class ReferenceCache:
+    """
+    A bounded, thread-safe LRU cache with expiry, for reference data that rarely changes
+    (publications, editions). `settings` overrides the REFERENCE_CACHE settings.
+
+    - Entries expire `ttl_seconds` after they are stored; lookups that found nothing are
+      cached as None (negative caching) for `negative_ttl_seconds`.
+    - At most `max_entries` are kept; the least recently used entry is evicted first.
+    - `validate` compares a data version read from the database (the latest UPDDATTIM_0 of
+      the source tables) at most every `change_check_seconds`, and clears the cache when it
+      changes, so updates made in Sage X3 are picked up without waiting for the TTL.
+    """
+
+    def __init__(self, name: str, settings: Optional[dict[str, Any]] = None):
+        settings = {**REFERENCE_CACHE, **(settings or {})}
+        self.name = name
+        self.max_entries = settings['CACHE_MAX_ENTRIES']
+        self.ttl_seconds = settings['CACHE_TTL_SECONDS']
+        self.negative_ttl_seconds = settings['CACHE_NEGATIVE_TTL_SECONDS']
+        self.change_check_seconds = settings['CACHE_CHANGE_CHECK_SECONDS']
+        self.enabled = settings['CACHE_ENABLED'] and self.max_entries > 0
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._data_version: Any = MISSING
+        self._next_check = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value (None for a cached miss), or MISSING if the key is not cached."""
+        if not self.enabled:
+            return MISSING
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return MISSING
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            if value is None:
+                self.stats.negative_hits += 1
+            else:
+                self.stats.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Stores a value; None records that the lookup found nothing."""
+        if not self.enabled:
+            return
+
+        ttl = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Returns the cached value of `key`, or calls `loader` and caches its result."""
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def get_many_or_load(self, keys: Iterable[Hashable], loader: Callable[[list], dict]) -> dict[Hashable, Any]:
+        """
+        Batch variant of `get_or_load`. `loader` receives the keys that are not cached and returns
+        the values it found; the keys it did not return are cached as misses.
+
+        Returns:
+            dict: The value of every key (None when nothing was found).
+        """
+        values: dict[Hashable, Any] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            value = self.get(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+
+        if missing:
+            loaded = loader(missing)
+            for key in missing:
+                value = loaded.get(key)
+                self.put(key, value)
+                values[key] = value
+
+        return values
+
+    def invalidate(self, key: Hashable = MISSING):
+        """Drops one key, or every entry when no key is given."""
+        with self._lock:
+            if key is MISSING:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.stats.invalidations += 1
+
+    def validate(self, read_data_version: Callable[[], Any]):
+        """
+        Clears the cache if the data version of its source tables changed. The version is only
+        read (`read_data_version`, usually a MAX(UPDDATTIM_0) query) every `change_check_seconds`.
+        """
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.change_check_seconds
+
+        data_version = read_data_version()
+        with self._lock:
+            changed = self._data_version is not MISSING and data_version != self._data_version
+            self._data_version = data_version
+            if changed:
+                self._entries.clear()
+                self.stats.invalidations += 1
+
+        if changed:
+            logger.info(f"Reference data of the '{self.name}' cache changed ({data_version}). Cache cleared.")
+
+    def log_stats(self):
+        logger.info(
+            f"Cache '{self.name}': {len(self)} entries, hit ratio {self.stats.hit_ratio:.1%}, {asdict(self.stats)}"
+        )
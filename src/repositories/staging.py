@@ -0,0 +1,29 @@
+from collections.abc import Iterable
+
+from sqlalchemy import Column, ColumnElement, MetaData, Table, func, literal
+
+
+def stage_table(name: str, columns: Iterable[Column]) -> Table:
+    """
+    A temporary table (`name` starts with '#') with the given columns of a model. The staged
+    columns keep the types (and collations) of the model, so that the joins compare alike.
+    """
+    return Table(name, MetaData(), *(Column(column.name, column.type) for column in columns))
+
+
+def from_select_defaults(target: Table, staged_columns: set[str]) -> dict[str, ColumnElement]:
+    """
+    Values for the `target` columns that are not staged and that INSERT ... SELECT cannot take
+    from the model (its SQL expression defaults are rendered by SQLAlchemy itself).
+    """
+    defaults: dict[str, ColumnElement] = {}
+    for column in target.c:
+        if column.name in staged_columns or column.primary_key:
+            continue
+
+        if column.default is None and not column.nullable:
+            defaults[column.name] = literal('', column.type)
+        elif column.default is not None and column.default.is_callable:
+            # AUUID_0 (uuid4 in the model, which would be called once per statement): one per row
+            defaults[column.name] = func.newid(type_=column.type)
+    return defaults
@@ -1,45 +1,81 @@
 import logging
-from datetime import date
-from typing import Optional
+from collections.abc import Iterable
+from datetime import date, datetime
+from itertools import batched
+from typing import Any, Optional
 
 from src.config.settings import DEFAULT_LEGACY_DATE, SCHEMA
 from src.database.database_core import DatabaseCoreManager
+from src.repositories import IN_CLAUSE_CHUNK_SIZE
+from src.repositories.reference_cache import ReferenceCache
 
 logger = logging.getLogger(__name__)
 
+# Datas de arranque da liquidação (ZARRLQD_0) por fornecedor, partilhadas pelo processo.
+# Mudam muito raramente: expiram com o TTL da cache de dados de referência.
+supplier_cache = ReferenceCache('suppliers')
+
 
 class SupplierRepository:
-    def __init__(self, core_db: DatabaseCoreManager):
+    def __init__(self, core_db: DatabaseCoreManager, cache: Optional[ReferenceCache] = None):
         self.core_db = core_db
         self.schema = SCHEMA
+        self.cache = supplier_cache if cache is None else cache
 
-    def get_start_liquidation_date(self, supplier_id: str) -> Optional[date]:
+    @staticmethod
+    def _as_liquidation_date(supplier_id: str, value: Any) -> Optional[date]:
+        # O driver pode retornar a data como um objeto datetime ou date, ou None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+
+        logger.warning(f'O campo ZARRLQD_0 para o fornecedor {supplier_id} não é um objeto de data válido: {value}')
+        return None
+
+    def _query_start_liquidation_dates(self, supplier_ids: list[str]) -> dict[str, Optional[date]]:
         """
-        Busca a data de arranque da liquidação (ZARRLQD) para um fornecedor usando uma raw query.
+        Busca a data de arranque da liquidação de vários fornecedores, com uma query IN por bloco.
+        Levanta RuntimeError se uma query falhar: os fornecedores em falta seriam guardados
+        na cache como inexistentes.
         """
-        query_result = self.core_db.execute_query(
-            table=f'{self.schema}.BPSUPPLIER',
-            columns=['ZARRLQD_0'],
-            where_clauses={'BPRNUM_0': ('=', supplier_id)},
-        )
-
-        if query_result['status'] == 'success' and query_result['records'] > 0:
-            # O resultado é uma lista de dicionários. Pegamos no primeiro.
-            arrival_date = query_result['data'][0].get('ZARRLQD_0')
+        dates: dict[str, Optional[date]] = {}
+        for chunk in batched(supplier_ids, IN_CLAUSE_CHUNK_SIZE):
+            query_result = self.core_db.execute_query(
+                table=f'{self.schema}.BPSUPPLIER',
+                columns=['BPRNUM_0', 'ZARRLQD_0'],
+                where_clauses={'BPRNUM_0': ('IN', list(chunk))},
+            )
+            if query_result['status'] != 'success':
+                logger.error(f'Erro ao buscar a data de arranque da liquidação: {query_result.get("message")}')
+                raise RuntimeError('Falha ao consultar a BPSUPPLIER. Verifique os logs.')
 
-            # O driver pode retornar a data como um objeto datetime ou date, ou None
-            if isinstance(arrival_date, date):
-                return arrival_date
+            for row in query_result['data']:
+                dates[row['BPRNUM_0']] = self._as_liquidation_date(row['BPRNUM_0'], row.get('ZARRLQD_0'))
+        return dates
 
-            logger.warning(
-                f'O campo ZARRLQD_0 para o fornecedor {supplier_id} não é um objeto de data válido: {arrival_date}'
-            )
+    def load_suppliers(self, supplier_ids: Iterable[str]) -> dict[str, Optional[date]]:
+        """
+        Carrega para a cache, de uma só vez, as datas de arranque da liquidação dos fornecedores
+        (ex: todos os fornecedores ativos, no arranque). Só os que não estão em cache são consultados.
+        """
+        distinct_ids = sorted({supplier_id for supplier_id in supplier_ids if supplier_id})
+        dates = self.cache.get_many_or_load(distinct_ids, self._query_start_liquidation_dates)
+        logger.info(f'Loaded the liquidation dates of {len(dates)} suppliers.')
+        return dates
 
-        return None  # Retorna None se não encontrar ou se o campo for nulo
+    def get_start_liquidation_date(self, supplier_id: str) -> Optional[date]:
+        """
+        Busca a data de arranque da liquidação (ZARRLQD) para um fornecedor, da cache ou com uma raw query.
+        """
+        return self.cache.get_or_load(
+            supplier_id, lambda: self._query_start_liquidation_dates([supplier_id]).get(supplier_id)
+        )
 
     def use_liquidation(self, supplier_id: str) -> bool:
         """
         Executa a lógica de negócio completa: busca a data e a compara.
+        A comparação com a data de hoje é feita em cada chamada; a data vem da cache.
         """
         try:
             start_date = self.get_start_liquidation_date(supplier_id)
@@ -0,0 +1,305 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from typing import Callable, Optional
+
+from src.config.settings import OUTBOX_WATCHER
+from src.models.edi_partner import EdiPartner
+from src.services.strategies import BaseTransferStrategy, get_strategy_for_provider
+from src.utils.directory_index import IndexedFile, get_directory_index
+
+logger = logging.getLogger(__name__)
+
+# Constantes do inotify (ver <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+@dataclass
+class WatchedOutbox:
+    """Uma pasta de output local e os fornecedores/padrões de upload que a usam."""
+
+    folder: str
+    providers: list[tuple[EdiPartner, list[str]]] = field(default_factory=list)
+
+
+class InotifyBackend:
+    """
+    Observa as pastas através do inotify do kernel Linux (via ctypes, sem dependências).
+    Apenas são reportados ficheiros completamente escritos ou movidos para a pasta.
+    """
+
+    def __init__(self, folders: list[str]):
+        libc_name = ctypes.util.find_library('c')
+        if sys.platform != 'linux' or not libc_name:
+            raise OSError('inotify não está disponível neste sistema.')
+
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou.')
+
+        self._folders: dict[int, str] = {}
+        for folder in folders:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                logger.warning(f'[OutboxWatcher] Não foi possível observar {folder} (errno {ctypes.get_errno()}).')
+                continue
+            self._folders[wd] = folder
+
+    def poll(self, timeout: float) -> list[tuple[str, str]]:
+        """Espera até `timeout` segundos e devolve os eventos (pasta, nome do ficheiro)."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(buffer):
+            wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = buffer[offset : offset + name_len].rstrip(b'\0')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # Eventos perdidos: assinala todas as pastas para forçar o upload
+                events.extend((folder, '') for folder in self._folders.values())
+                continue
+
+            folder = self._folders.get(wd)
+            if folder and name:
+                events.append((folder, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+class ScandirBackend:
+    """
+    Alternativa portátil ao inotify: usa o índice scandir de cada pasta (que só
+    é relido quando o mtime da pasta muda) e reporta os ficheiros novos ou alterados.
+
+    Sem o equivalente ao IN_CLOSE_WRITE, um ficheiro só é reportado quando o seu tamanho
+    e mtime não mudam entre duas leituras: um ficheiro ainda a ser escrito não é enviado.
+    """
+
+    def __init__(self, folders: list[str], poll_seconds: float):
+        self._poll_seconds = poll_seconds
+        self._snapshots: dict[str, dict[str, IndexedFile]] = {}
+        # (pasta, nome) -> (mtime, tamanho) da última leitura, até o ficheiro estabilizar
+        self._unsettled: dict[tuple[str, str], tuple[int, int]] = {}
+        # (pasta, nome) -> (mtime, tamanho) com que o ficheiro foi reportado
+        self._reported: dict[tuple[str, str], tuple[int, int]] = {}
+        for folder in folders:
+            self._scan(folder)
+
+    def _scan(self, folder: str) -> list[str]:
+        try:
+            current = get_directory_index(folder).files()
+        except OSError:
+            return []
+
+        previous = self._snapshots.get(folder)
+        if current is previous:
+            return []
+        self._snapshots[folder] = current
+
+        previous = previous or {}
+        return [name for name, indexed in current.items() if previous.get(name) != indexed]
+
+    @staticmethod
+    def _signature(folder: str, name: str) -> Optional[tuple[int, int]]:
+        # Lido do disco: o índice da pasta não muda enquanto um ficheiro cresce
+        try:
+            stat = os.stat(os.path.join(folder, name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _settled(self) -> list[tuple[str, str]]:
+        """Os ficheiros cujo tamanho e mtime não mudaram desde a leitura anterior."""
+        settled = []
+        for key, signature in list(self._unsettled.items()):
+            current = self._signature(*key)
+            if current is None or current == signature:
+                del self._unsettled[key]
+                if current is not None:
+                    settled.append(key)
+                    self._reported[key] = current
+            else:
+                self._unsettled[key] = current
+        return settled
+
+    def poll(self, timeout: float) -> list[tuple[str, str]]:
+        """
+        Relê as pastas a cada `poll_seconds` (o `timeout` do loop não se aplica) e devolve os
+        ficheiros (pasta, nome) que estabilizaram desde a leitura anterior.
+        """
+        time.sleep(self._poll_seconds)
+        settled = self._settled()
+        for folder in list(self._snapshots):
+            for name in self._scan(folder):
+                signature = self._signature(folder, name)
+                # O índice pode ter lido o ficheiro a meio da escrita: só conta se mudou desde que foi reportado
+                if signature is not None and self._reported.get((folder, name)) != signature:
+                    self._unsettled[(folder, name)] = signature
+
+        # Esquece os ficheiros reportados que já saíram da pasta (ex: enviados)
+        self._reported = {
+            key: signature for key, signature in self._reported.items() if key[1] in self._snapshots.get(key[0], {})
+        }
+        return settled
+
+    def close(self):
+        pass
+
+
+class OutboxWatcher:
+    """
+    Observa as pastas de output locais dos fornecedores e dispara o upload
+    assim que aparecem ficheiros que correspondem aos padrões das tarefas de upload.
+
+    Os eventos são agrupados por fornecedor: o upload é disparado quando a pasta
+    fica `debounce_seconds` sem novidades, ou ao fim de `max_delay_seconds`.
+    """
+
+    def __init__(
+        self,
+        outboxes: list[WatchedOutbox],
+        trigger: Callable[[EdiPartner], None],
+        stop_event: threading.Event,
+    ):
+        self.outboxes = {outbox.folder: outbox for outbox in outboxes}
+        self.trigger = trigger
+        self.stop_event = stop_event
+        self.debounce_seconds = OUTBOX_WATCHER['WATCHER_DEBOUNCE_SECONDS']
+        self.max_delay_seconds = OUTBOX_WATCHER['WATCHER_MAX_DELAY_SECONDS']
+        self.poll_seconds = OUTBOX_WATCHER['WATCHER_POLL_SECONDS']
+
+        # provider -> (primeiro evento, último evento, ficheiros)
+        self._pending: dict[str, tuple[float, float, set[str]]] = {}
+        self._providers: dict[str, EdiPartner] = {}
+
+    def _create_backend(self):
+        folders = list(self.outboxes)
+        try:
+            backend = InotifyBackend(folders)
+            logger.info(f'[OutboxWatcher] A observar {len(folders)} pastas com inotify.')
+            return backend
+        except (OSError, AttributeError) as e:
+            logger.info(f'[OutboxWatcher] inotify indisponível ({e}). A usar scandir a cada {self.poll_seconds}s.')
+            return ScandirBackend(folders, self.poll_seconds)
+
+    def _register_event(self, folder: str, filename: str, now: float):
+        outbox = self.outboxes.get(folder)
+        if not outbox:
+            return
+
+        for provider, patterns in outbox.providers:
+            # Um nome vazio indica eventos perdidos: dispara todos os fornecedores da pasta
+            if filename and not any(fnmatch(filename, pattern) for pattern in patterns):
+                continue
+
+            provider_id = str(provider.provider)
+            first_seen, _, files = self._pending.get(provider_id, (now, now, set()))
+            if filename:
+                files.add(filename)
+            self._pending[provider_id] = (first_seen, now, files)
+            self._providers[provider_id] = provider
+
+    def _due_providers(self, now: float) -> list[str]:
+        return [
+            provider_id
+            for provider_id, (first_seen, last_seen, _) in self._pending.items()
+            if now - last_seen >= self.debounce_seconds or now - first_seen >= self.max_delay_seconds
+        ]
+
+    def _fire(self, provider_id: str):
+        _, _, files = self._pending.pop(provider_id)
+        provider = self._providers[provider_id]
+        logger.info(f'[OutboxWatcher] {len(files)} ficheiro(s) novo(s) para o fornecedor {provider_id}. A enviar.')
+
+        # O upload corre noutra thread para não bloquear a leitura de eventos
+        threading.Thread(
+            target=self.trigger, args=(provider,), name=f'outbox-upload-{provider_id}', daemon=True
+        ).start()
+
+    def run(self):
+        """Loop principal do observador. Corre até `stop_event` ser sinalizado."""
+        if not self.outboxes:
+            logger.info('[OutboxWatcher] Nenhuma pasta de output para observar.')
+            return
+
+        backend = self._create_backend()
+        try:
+            while not self.stop_event.is_set():
+                timeout = self.debounce_seconds if self._pending else 1.0
+                now = time.monotonic()
+
+                for folder, filename in backend.poll(timeout):
+                    self._register_event(folder, filename, now)
+
+                for provider_id in self._due_providers(time.monotonic()):
+                    self._fire(provider_id)
+        finally:
+            backend.close()
+
+        logger.info('[OutboxWatcher] Observador do outbox terminado.')
+
+
+def build_outboxes(providers: list[EdiPartner]) -> list[WatchedOutbox]:
+    """Agrupa os fornecedores pela pasta de output local e calcula os padrões de upload."""
+    outboxes: dict[str, WatchedOutbox] = {}
+    for provider in providers:
+        folder = provider.local_output_folder
+        if not folder or not os.path.isdir(folder):
+            continue
+
+        StrategyClass = get_strategy_for_provider(provider)
+        if StrategyClass is BaseTransferStrategy:
+            # O transfer_service não processa fornecedores com a estratégia genérica
+            continue
+
+        patterns = StrategyClass(None, provider).get_upload_patterns()
+        if not patterns:
+            continue
+
+        folder = os.path.abspath(folder)
+        outbox = outboxes.setdefault(folder, WatchedOutbox(folder=folder))
+        outbox.providers.append((provider, patterns))
+
+    return list(outboxes.values())
+
+
+def start_outbox_watcher(
+    providers: list[EdiPartner], trigger: Callable[[EdiPartner], None], stop_event: threading.Event
+) -> Optional[threading.Thread]:
+    """Cria e inicia a thread do observador do outbox, se estiver ativo nas configurações."""
+    if not OUTBOX_WATCHER['WATCHER_ENABLED']:
+        logger.info('[OutboxWatcher] Desativado nas configurações.')
+        return None
+
+    watcher = OutboxWatcher(build_outboxes(providers), trigger, stop_event)
+    thread = threading.Thread(target=watcher.run, name='outbox-watcher', daemon=True)
+    thread.start()
+    return thread
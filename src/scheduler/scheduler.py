@@ -9,6 +9,7 @@ import schedule
 
 from src.models.edi_partner import EdiPartner
 from src.services.transfer_service import process_provider_transfer
+from src.utils.local_menus import ImportExport
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,20 @@ def run_provider_job(provider: EdiPartner):
         )
 
 
+def run_provider_upload_job(provider: EdiPartner):
+    """
+    Função chamada pelo observador do outbox quando surgem ficheiros para enviar.
+    Executa apenas as tarefas de upload do fornecedor.
+    """
+    provider_id = provider.provider_id
+    logger.info(f'[Outbox] A iniciar upload imediato para o fornecedor {provider_id}...')
+    try:
+        process_provider_transfer(provider, direction=ImportExport.EXPORT)
+        logger.info(f'[Outbox] Upload imediato para o fornecedor {provider_id} concluído.')
+    except Exception:
+        logger.critical(f'[Outbox] O upload imediato para o fornecedor {provider_id} falhou.', exc_info=True)
+
+
 def setup_schedules(providers: List[EdiPartner]):
     """
     Configura todas as tarefas no 'schedule' com base na lista de fornecedores.
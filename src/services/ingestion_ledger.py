@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from enum import Enum
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+from src.config.settings import INGESTION_LEDGER
+from src.database.database import db
+from src.repositories.invoices.purchase_invoice_repository import PurchaseInvoiceRepository
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionKey(NamedTuple):
+    """Identifies an ingested file: the supplier, its invoice number (when the handler can read it) and the checksum."""
+
+    supplier: str
+    invoice_number: Optional[str]
+    checksum: str
+
+
+class ClaimResult(Enum):
+    """Outcome of `IngestionLedger.claim`."""
+
+    # The file may be ingested
+    NEW = 'new'
+    # A file with the same content was already ingested: there is nothing left to do with it
+    ALREADY_INGESTED = 'already_ingested'
+    # Its invoice number was already ingested from another file (e.g. a corrected resend), or the
+    # same file is being ingested right now: it must not be ingested, nor reported as processed
+    CONFLICT = 'conflict'
+
+
+def file_checksum(file_path: Path) -> str:
+    """SHA-256 of the file content, read in blocks."""
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def supplier_invoice_exists(supplier: str, invoice_number: str) -> bool:
+    """Looks the supplier's invoice up in ZPINVOICEV, in its own short session."""
+    with db.get_db() as session:
+        return PurchaseInvoiceRepository(session).supplier_invoice_exists(supplier, invoice_number)
+
+
+class IngestionLedger:
+    """
+    Rejects files whose invoice was already ingested, before they are parsed.
+
+    Every ingested file is recorded as (supplier, invoice number, checksum) in a JSON lines
+    file, appended to on each ingestion and read back on first use, so the ledger survives
+    restarts. The newest `max_keys` records are kept (in memory and, after compaction, in the file).
+    An invoice number that is not in the ledger is also looked up once in ZPINVOICEV, through
+    its (BPR_0, BPRVCR_0) index, for invoices written before the ledger existed.
+
+    Usage: `claim` a file before parsing it, then `release` it with the outcome.
+    """
+
+    def __init__(
+        self,
+        file_path: Union[str, Path] = INGESTION_LEDGER['LEDGER_FILE'],
+        max_keys: int = INGESTION_LEDGER['LEDGER_MAX_KEYS'],
+        enabled: bool = INGESTION_LEDGER['LEDGER_ENABLED'],
+        lookup: Callable[[str, str], bool] = supplier_invoice_exists,
+    ):
+        self.file_path = Path(file_path)
+        self.max_keys = max_keys
+        self.enabled = enabled
+        self.lookup = lookup
+        self._lock = threading.Lock()
+        self._records: Optional[OrderedDict[IngestionKey, None]] = None
+        self._checksums: dict[tuple[str, str], IngestionKey] = {}
+        self._invoices: dict[tuple[str, str], IngestionKey] = {}
+        self._in_progress: set[tuple] = set()
+        self._lines_on_disk = 0
+
+    @staticmethod
+    def _entries(key: IngestionKey) -> list[tuple]:
+        entries = [('file', key.supplier, key.checksum)]
+        if key.invoice_number:
+            entries.append(('invoice', key.supplier, key.invoice_number))
+        return entries
+
+    def _read_records(self) -> Iterator[IngestionKey]:
+        with open(self.file_path, encoding='utf-8') as f:
+            for line in f:
+                self._lines_on_disk += 1
+                try:
+                    yield IngestionKey(**json.loads(line))
+                except (ValueError, TypeError):
+                    # A line cut short by a crash during an append
+                    logger.warning(f'Invalid line in the ingestion ledger ({self.file_path}). Skipped.')
+
+    def _load(self) -> OrderedDict[IngestionKey, None]:
+        if self._records is None:
+            self._records = OrderedDict()
+            if self.file_path.is_file():
+                try:
+                    for key in self._read_records():
+                        self._remember(key)
+                except OSError as e:
+                    logger.error(f'Unreadable ingestion ledger ({self.file_path}): {e}. Ignored.')
+        return self._records
+
+    def _remember(self, key: IngestionKey):
+        records = self._records
+        records[key] = None
+        records.move_to_end(key)
+        self._checksums[key.supplier, key.checksum] = key
+        if key.invoice_number:
+            self._invoices[key.supplier, key.invoice_number] = key
+
+        while len(records) > self.max_keys:
+            oldest, _ = records.popitem(last=False)
+            if self._checksums.get((oldest.supplier, oldest.checksum)) == oldest:
+                del self._checksums[oldest.supplier, oldest.checksum]
+            if oldest.invoice_number and self._invoices.get((oldest.supplier, oldest.invoice_number)) == oldest:
+                del self._invoices[oldest.supplier, oldest.invoice_number]
+
+    def _append(self, key: IngestionKey):
+        """Records an ingested file in the ledger file; rewrites it when it holds twice the kept records."""
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._lines_on_disk >= 2 * self.max_keys:
+            tmp_path = self.file_path.with_suffix(f'{self.file_path.suffix}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(record._asdict()) + '\n' for record in self._records)
+            os.replace(tmp_path, self.file_path)
+            self._lines_on_disk = len(self._records)
+            return
+
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(key._asdict()) + '\n')
+        self._lines_on_disk += 1
+
+    def _check(self, key: IngestionKey) -> Optional[ClaimResult]:
+        """The verdict from the ledger and the files in flight, or None if nothing is known about the file."""
+        if (key.supplier, key.checksum) in self._checksums:
+            return ClaimResult.ALREADY_INGESTED
+        if key.invoice_number and (key.supplier, key.invoice_number) in self._invoices:
+            return ClaimResult.CONFLICT
+        if any(entry in self._in_progress for entry in self._entries(key)):
+            return ClaimResult.CONFLICT
+        return None
+
+    def claim(self, key: IngestionKey) -> ClaimResult:
+        """
+        Reserves a file for ingestion (only when the result is `ClaimResult.NEW`).
+
+        Raises:
+            Exception: If the database lookup fails (the file must not be ingested blindly).
+        """
+        if not self.enabled:
+            return ClaimResult.NEW
+
+        with self._lock:
+            self._load()
+            result = self._check(key)
+        if result is not None:
+            return result
+
+        if key.invoice_number and self.lookup(key.supplier, key.invoice_number):
+            return ClaimResult.CONFLICT
+
+        with self._lock:
+            # Another thread may have claimed the same file during the lookup
+            result = self._check(key)
+            if result is not None:
+                return result
+            self._in_progress.update(self._entries(key))
+        return ClaimResult.NEW
+
+    def release(self, key: Optional[IngestionKey], ingested: bool):
+        """Ends the claim of a file. Ingested files are recorded in the ledger; the others can be retried."""
+        if not self.enabled or key is None:
+            return
+
+        with self._lock:
+            self._in_progress.difference_update(self._entries(key))
+            if ingested:
+                self._load()
+                self._remember(key)
+                try:
+                    self._append(key)
+                except OSError:
+                    logger.error(f'Could not write the ingestion ledger ({self.file_path}).', exc_info=True)
+
+
+# Shared ledger used by the processing orchestrator
+ingestion_ledger = IngestionLedger()
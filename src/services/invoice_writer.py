@@ -0,0 +1,120 @@
+import logging
+from collections.abc import Callable, Iterable
+from itertools import batched, chain
+from typing import Optional
+
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+
+from src.config.settings import BULK_WRITE
+from src.database.database import db
+from src.repositories.invoices.purchase_invoice_repository import InvoiceRow, PurchaseInvoiceRepository
+
+logger = logging.getLogger(__name__)
+
+# Takes the number of an invoice, in the session of the transaction that inserts its header
+Numbering = Callable[[Session], str]
+
+
+class InvoiceWriter:
+    """
+    Writes purchase invoices (ZPINVOICEV header and ZPINVOICED lines) in short transactions,
+    without ever showing a partial invoice to the readers of ZPINVOICED.
+
+    An invoice with up to `chunk_lines` lines is written in one transaction. Larger invoices
+    are written in chunked mode: the lines are staged in a temporary table (#ZPINVOICED_STAGE),
+    committed chunk by chunk on one connection, so the transaction size stays bounded by the
+    chunk whatever the size of the file, and no lock is taken on ZPINVOICED meanwhile. Then one
+    short transaction inserts the header and copies the staged lines with one INSERT ... SELECT.
+    If anything fails, nothing of the invoice is in ZPINVOICEV or ZPINVOICED.
+
+    The invoice number can be taken by `numbering` in the transaction that inserts the header
+    (e.g. from an ACODNUM counter): a failed write does not use up a number.
+    """
+
+    def __init__(self, chunk_lines: int = BULK_WRITE['WRITE_CHUNK_LINES']):
+        self.chunk_lines = chunk_lines
+
+    def write(
+        self,
+        header: InvoiceRow,
+        lines: Iterable[InvoiceRow],
+        line_count: int,
+        numbering: Optional[Numbering] = None,
+    ) -> int:
+        """
+        Writes one invoice. `lines` may be a generator: it is consumed chunk by chunk.
+        With `numbering`, the number it returns is set as the `invoice_number` of the header
+        and of the lines.
+
+        Returns:
+            The number of lines inserted.
+        """
+        if self.chunk_lines <= 0 or line_count <= self.chunk_lines:
+            with db.get_db() as session:
+                if numbering is not None:
+                    header, lines = self._numbered(header, lines, numbering(session))
+                return PurchaseInvoiceRepository(session).insert_invoice(header, lines)
+
+        return self._write_chunked(header, lines, numbering)
+
+    @staticmethod
+    def _numbered(
+        header: InvoiceRow, lines: Iterable[InvoiceRow], invoice_number: str
+    ) -> tuple[InvoiceRow, Iterable[InvoiceRow]]:
+        numbered_lines = ({**line, 'invoice_number': invoice_number} for line in lines)
+        return {**header, 'invoice_number': invoice_number}, numbered_lines
+
+    def _write_chunked(self, header: InvoiceRow, lines: Iterable[InvoiceRow], numbering: Optional[Numbering]) -> int:
+        supplier_invoice = header.get('supplier_invoice_number') or header.get('invoice_number')
+        logger.info(f"Writing invoice '{supplier_invoice}' in chunks of {self.chunk_lines} lines.")
+
+        chunks = batched(lines, self.chunk_lines)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return self.write(header, (), 0, numbering)
+
+        # The temporary table belongs to the connection: every transaction of the write uses this one
+        with db.engine.connect() as connection, Session(bind=connection) as session:
+            repository = PurchaseInvoiceRepository(session)
+            stage = repository.create_line_stage(list(first_chunk[0]))
+            session.commit()
+            try:
+                for chunk in chain((first_chunk,), chunks):
+                    repository.stage_lines(stage, chunk)
+                    session.commit()
+                inserted, invoice_number = self._publish(repository, stage, header, numbering)
+            except Exception:
+                logger.error(f"Chunked write of invoice '{supplier_invoice}' failed. Nothing was published.")
+                session.rollback()
+                raise
+            finally:
+                self._drop_stage(repository, stage)
+
+        logger.info(f"Inserted invoice '{invoice_number}' with {inserted} lines.")
+        return inserted
+
+    @staticmethod
+    def _publish(
+        repository: PurchaseInvoiceRepository, stage: Table, header: InvoiceRow, numbering: Optional[Numbering]
+    ) -> tuple[int, str]:
+        """
+        Inserts the header and copies the staged lines in one transaction, with the invoice number
+        taken in it. Returns the number of lines and the invoice number.
+        """
+        numbered = {} if numbering is None else {'invoice_number': numbering(repository.session)}
+        repository.insert_headers(({**header, **numbered},))
+        inserted = repository.publish_lines(stage, numbered)
+        repository.session.commit()
+        return inserted, numbered.get('invoice_number', header.get('invoice_number'))
+
+    @staticmethod
+    def _drop_stage(repository: PurchaseInvoiceRepository, stage: Table):
+        session = repository.session
+        try:
+            repository.drop_line_stage(stage)
+            session.commit()
+        except Exception:
+            # The pooled connection would keep the temporary table: it is discarded instead
+            logger.warning('Could not drop the stage table of the chunked write.', exc_info=True)
+            session.connection().invalidate()
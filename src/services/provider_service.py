@@ -1,7 +1,9 @@
 import logging
 
 from src.database.database import db
+from src.database.database_core import DatabaseCoreManager
 from src.models.edi_partner import EdiPartner
+from src.repositories.supplier_repository import SupplierRepository
 from src.utils.local_menus import YesNo
 
 logger = logging.getLogger(__name__)
@@ -36,6 +38,19 @@ def get_active_providers() -> list[EdiPartner]:
         return []
 
 
+def preload_supplier_data(providers: list[EdiPartner]):
+    """
+    Carrega de uma só vez, para a cache do SupplierRepository, os dados dos fornecedores
+    ativos (BPSUPPLIER), para que o processamento de cada ficheiro não os volte a consultar.
+    """
+    try:
+        with db.get_db() as session:
+            SupplierRepository(DatabaseCoreManager(session)).load_suppliers(p.provider for p in providers)
+    except Exception:
+        # Sem a cache, os dados são consultados fornecedor a fornecedor
+        logger.error('Falha ao carregar os dados dos fornecedores ativos.', exc_info=True)
+
+
 # def get_active_providers_raw() -> list[dict[str, Any]]:
 #     """
 #     Busca no banco de dados a lista de fornecedores ativos para troca de ficheiros.
@@ -1,10 +1,14 @@
 import logging
+from collections.abc import Iterable, Iterator
 from fnmatch import fnmatch
 from pathlib import Path
+from typing import Optional
 
-from src.models.data_models import TransferTask
+from src.models.data_models import RemoteFileInfo, TransferTask
 from src.models.edi_partner import EdiPartner
 from src.processing.orchestrator import FileProcessingOrchestrator
+from src.services.watermark_service import sort_key, watermark_store
+from src.utils.directory_index import get_directory_index
 from src.utils.local_menus import ImportExport, YesNo
 
 logger = logging.getLogger(__name__)
@@ -23,6 +27,9 @@ class BaseTransferStrategy:
         self.provider = provider
         self.provider_id = self.provider.provider
         self.tasks: list[TransferTask] = []
+        self.pending_remote_deletes: list[str] = []
+        # Ficheiros da última listagem incremental: nome base -> (pasta remota, metadados)
+        self.watermark_candidates: dict[str, tuple[str, RemoteFileInfo]] = {}
         self._build_tasks()
 
     def _build_tasks(self):
@@ -68,8 +75,24 @@ class BaseTransferStrategy:
         logger.info(f"[{self.provider_id}] Tarefa {task.index} usará o padrão de ficheiro: '{task.filename}'")
         return task
 
-    def execute(self):
-        """Main entry point to execute the transfer strategy."""
+    def get_upload_patterns(self) -> list[str]:
+        """Returns the filename patterns of the active upload (EXPORT) tasks."""
+        patterns = []
+        for task in self.tasks:
+            if task.direction != ImportExport.EXPORT:
+                continue
+
+            prepared_task = self._prepare_task(task)
+            if prepared_task.is_active and prepared_task.filename:
+                patterns.append(prepared_task.filename)
+
+        return patterns
+
+    def execute(self, direction: Optional[ImportExport] = None):
+        """
+        Main entry point to execute the transfer strategy.
+        If `direction` is given, only the tasks with that direction are executed.
+        """
         class_name = self.__class__.__name__
         logger.info(f'[{self.provider_id}] A executar a estratégia: {class_name}')
 
@@ -77,33 +100,43 @@ class BaseTransferStrategy:
             logger.warning(f'[{self.provider_id}] Nenhuma tarefa válida foi construída. Nada a fazer.')
             return
 
-        for task in self.tasks:
-            # Prepara a tarefa para execução
-            execute_task = self._prepare_task(task)
-
-            # Verifica se a tarefa está ativa antes de processar
-            if not execute_task.is_active:
-                logger.info(
-                    f'[{self.provider_id}] Tarefa {execute_task.index} (prefixo "{execute_task.prefix}") está inativa.'
-                )
-                continue
-
-            # Log de início de processamento da tarefa
-            log_direction = 'IMPORT/DOWNLOAD' if execute_task.direction == ImportExport.IMPORT else 'EXPORT/UPLOAD'
+        try:
+            for task in self.tasks:
+                if direction is not None and task.direction != direction:
+                    continue
+                self._execute_task(task)
+        finally:
+            # As remoções remotas são feitas em lote no fim da execução
+            self.flush_remote_deletes()
+
+    def _execute_task(self, task: TransferTask):
+        """Prepares and dispatches a single task to the download/upload flow."""
+        # Prepara a tarefa para execução
+        execute_task = self._prepare_task(task)
+
+        # Verifica se a tarefa está ativa antes de processar
+        if not execute_task.is_active:
             logger.info(
-                f'[{self.provider_id}] A processar Tarefa {task.index}: Direção={log_direction}, '
-                f'Prefixo="{execute_task.prefix}"'
+                f'[{self.provider_id}] Tarefa {execute_task.index} (prefixo "{execute_task.prefix}") está inativa.'
             )
+            return
 
-            if execute_task.direction == ImportExport.IMPORT:
-                self.process_download(execute_task)
-            elif execute_task.direction == ImportExport.EXPORT:
-                self.process_upload(execute_task)
-            else:
-                logger.warning(
-                    f'[{self.provider_id}] Tarefa {execute_task.index} tem uma direção desconhecida: '
-                    f'"{execute_task.direction}".'
-                )
+        # Log de início de processamento da tarefa
+        log_direction = 'IMPORT/DOWNLOAD' if execute_task.direction == ImportExport.IMPORT else 'EXPORT/UPLOAD'
+        logger.info(
+            f'[{self.provider_id}] A processar Tarefa {task.index}: Direção={log_direction}, '
+            f'Prefixo="{execute_task.prefix}"'
+        )
+
+        if execute_task.direction == ImportExport.IMPORT:
+            self.process_download(execute_task)
+        elif execute_task.direction == ImportExport.EXPORT:
+            self.process_upload(execute_task)
+        else:
+            logger.warning(
+                f'[{self.provider_id}] Tarefa {execute_task.index} tem uma direção desconhecida: '
+                f'"{execute_task.direction}".'
+            )
 
     # Lógica de Upload
     def get_files_to_upload(self, task: TransferTask) -> list[Path]:
@@ -113,13 +146,8 @@ class BaseTransferStrategy:
             logger.warning(f'[{self.provider_id}] Local output directory not found: {local_path}')
             return []
 
-        local_path.mkdir(parents=True, exist_ok=True)  # Garante que o diretório existe
-
-        # Uso de iterdir() e is_file() para uma abordagem mais limpa
-        files = [file for file in local_path.iterdir() if file.is_file()]
-
-        # Filter using the pattern prepared in _prepare_task
-        to_upload = [f for f in files if fnmatch(f.name, task.filename)]
+        # Índice da pasta (scandir) partilhado por todas as tarefas; só é relido se a pasta mudar
+        to_upload = get_directory_index(local_path).match(task.filename)
 
         if to_upload:
             logger.info(f'[{self.provider_id}] Encontrados {len(to_upload)} ficheiros para upload em {local_path}.')
@@ -167,13 +195,39 @@ class BaseTransferStrategy:
                 logger.error(f'[{self.provider_id}] Falha no upload de {local_file.name}.')
 
     # Lógica de Download
+    def list_remote_files(self, remote_path: str, task: TransferTask) -> list[str]:
+        """
+        Lists the remote folder of a download task, narrowed to the task pattern
+        (on the server when it supports it, otherwise on the client).
+
+        Tasks that delete the remote files get the full listing. Tasks that keep them
+        (the folder only grows) get the files past the folder watermark, oldest first.
+        """
+        self.watermark_candidates = {}
+
+        if task.delete:
+            return self.manager.list_files(remote_path, task.filename)
+
+        listing = sorted(self.manager.list_files_with_attributes(remote_path, task.filename), key=sort_key)
+
+        watermark = watermark_store.get(self.provider_id, remote_path, task.prefix)
+        if watermark:
+            total = len(listing)
+            listing = [remote_file for remote_file in listing if watermark.is_past(remote_file)]
+            logger.info(
+                f'[{self.provider_id}] Watermark de {remote_path}: {len(listing)} de {total} ficheiros por processar.'
+            )
+
+        self.watermark_candidates = {Path(remote_file.name).name: (remote_path, remote_file) for remote_file in listing}
+        return [remote_file.name for remote_file in listing]
+
     def get_files_to_download(self, task: TransferTask) -> list[str]:
         """Retorna uma lista de objetos Path para os ficheiros a serem baixados."""
         remote_path = self.provider.remote_input_folder
         if not remote_path:
             return []
 
-        files = self.manager.list_files(remote_path)
+        files = self.list_remote_files(remote_path, task)
 
         # Filter the list on the client side
         to_download = [f for f in files if fnmatch(Path(f).name, task.filename)]
@@ -184,22 +238,79 @@ class BaseTransferStrategy:
             )
         return to_download
 
-    def after_download_success(self, remote_file: str, local_file: Path, task: TransferTask):
+    def process_downloaded_files(
+        self, downloads: Iterable[tuple[str, Path]], task: TransferTask, file_count: int
+    ) -> dict[str, bool]:
         """
-        Hook called after a successful download. This is the integration point
-        with the processing layer.
+        Integration point with the processing layer: runs the orchestrator over the files
+        downloaded by a task (parsed side by side in the process pool when there are several).
+
+        `downloads` may download the files as it is iterated: the orchestrator asks for the next
+        file when there is room in its parse window, so the downloads overlap the parsing.
+
+        Args:
+            downloads: The (remote file, local file) pairs downloaded, in order.
+            task: The download task.
+            file_count: The number of files to download (`downloads` yields at most that many).
+
+        Returns:
+            dict[str, bool]: remote file -> True if its content was processed successfully.
         """
-        logger.debug(
-            f'[{self.provider_id}] Download de {remote_file} para {local_file} bem-sucedido. Iniciar processamento.'
-        )
+        if not file_count:
+            return {}
+
+        downloaded: list[tuple[str, Path]] = []
+
+        def local_files() -> Iterator[Path]:
+            for remote_file, local_file in downloads:
+                downloaded.append((remote_file, local_file))
+                yield local_file
 
         orchestrator = FileProcessingOrchestrator(provider=self.provider, task=task)
-        orchestrator.process(local_file)
+        outcomes = orchestrator.process_many(local_files(), file_count)
+        logger.debug(f'[{self.provider_id}] {len(downloaded)} ficheiros recebidos e processados.')
+
+        processed = {}
+        for remote_file, local_file in downloaded:
+            processed[remote_file] = outcomes.get(local_file, False)
+            self.after_download_success(remote_file, local_file, task, processed[remote_file])
+
+        return processed
+
+    def _download_files(self, remote_files: list[tuple[str, str]], local_path: Path) -> Iterator[tuple[str, Path]]:
+        """Recebe os ficheiros um a um, à medida que são pedidos. Os que falham não são devolvidos."""
+        for base_filename, remote_file in remote_files:
+            local_file = local_path / base_filename
+            logger.info(f'[{self.provider_id}] A receber: {remote_file} -> {local_file}')
+
+            if self.manager.download_file(remote_file, str(local_file)):
+                yield remote_file, local_file
+            else:
+                logger.error(f'[{self.provider_id}] Falha no download de {base_filename}.')
 
-        # After processing, we might still want to delete the remote file
+    def after_download_success(self, remote_file: str, local_file: Path, task: TransferTask, processed: bool):
+        """Hook called after a downloaded file went through the processing orchestrator."""
+        # The remote file is only deleted once its content was ingested successfully.
+        # Deletes are deferred and flushed as a batch at the end of the run.
         if task.delete:
-            logger.info(f'[{self.provider_id}] Deleting remote file after processing: {remote_file}')
-            if not self.manager.delete_file(remote_file):
+            if processed:
+                logger.debug(f'[{self.provider_id}] Remote file queued for deletion: {remote_file}')
+                self.pending_remote_deletes.append(remote_file)
+            else:
+                logger.warning(f'[{self.provider_id}] Processing failed, keeping remote file: {remote_file}')
+
+    def flush_remote_deletes(self):
+        """Deletes, in a single batch, every remote file queued during this run."""
+        if not self.pending_remote_deletes:
+            return
+
+        remote_files, self.pending_remote_deletes = self.pending_remote_deletes, []
+        logger.info(f'[{self.provider_id}] Deleting {len(remote_files)} remote files after processing.')
+
+        results = self.manager.delete_files(remote_files)
+
+        for remote_file in remote_files:
+            if not results.get(remote_file, False):
                 logger.error(f'[{self.provider_id}] Failed to delete remote file: {remote_file}')
 
     def process_download(self, task: TransferTask):
@@ -227,14 +338,27 @@ class BaseTransferStrategy:
             f'[{self.provider_id}] Tarefa {task.index}: Encontrados {len(files_to_download)} ficheiros para download.'
         )
 
-        for remote_filename in files_to_download:
-            base_filename = Path(remote_filename).name
-            remote_file = f'{remote_path.rstrip("/")}/{base_filename}'
-            local_file = local_path / base_filename
+        remote_files: list[tuple[str, str]] = [
+            (Path(remote_filename).name, f'{remote_path.rstrip("/")}/{Path(remote_filename).name}')
+            for remote_filename in files_to_download
+        ]
 
-            logger.info(f'[{self.provider_id}] A receber: {remote_file} -> {local_file}')
+        # 1 e 2. Receber os ficheiros à medida que o orquestrador os pede e processá-los
+        # (parsing em paralelo com os downloads seguintes, lógica de negócio por ordem)
+        processed = self.process_downloaded_files(
+            self._download_files(remote_files, local_path), task, len(remote_files)
+        )
 
-            if self.manager.download_file(remote_file, str(local_file)):
-                self.after_download_success(remote_file, local_file, task)
+        # 3. O watermark só avança enquanto todos os ficheiros anteriores foram processados com sucesso
+        watermark_blocked = False
+
+        for base_filename, remote_file in remote_files:
+            candidate = self.watermark_candidates.get(base_filename)
+            if candidate is None:
+                continue
+
+            if processed.get(remote_file, False) and not watermark_blocked:
+                listed_path, remote_file_info = candidate
+                watermark_store.advance(self.provider_id, listed_path, task.prefix, remote_file_info)
             else:
-                logger.error(f'[{self.provider_id}] Falha no download de {base_filename}.')
+                watermark_blocked = True
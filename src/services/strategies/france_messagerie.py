@@ -3,6 +3,8 @@ import posixpath
 from fnmatch import fnmatch
 from pathlib import Path
 
+from src.utils.directory_index import get_directory_index
+
 from .base import BaseTransferStrategy, TransferTask
 
 logger = logging.getLogger(__name__)
@@ -41,7 +43,7 @@ class FranceMessagerieStrategy(BaseTransferStrategy):
             return []
 
         # 1. Obter a lista "crua" do servidor
-        raw_file_list = self.manager.list_files(remote_path)
+        raw_file_list = self.list_remote_files(remote_path, task)
         logger.debug(f'[{self.provider_id}] Lista de ficheiros recebida do servidor: {raw_file_list}')
 
         # 2. Filtrar as entradas especiais '.' e '..'
@@ -80,10 +82,8 @@ class FranceMessagerieStrategy(BaseTransferStrategy):
             logger.warning(f'[{self.provider_id}] Diretório de output local não encontrado: {local_path}')
             return []
 
-        all_local_files = [f for f in local_path.iterdir() if f.is_file()]
-
         # O padrão para upload que definimos era 'I' + username
-        files_to_upload = [f for f in all_local_files if fnmatch(f.name, task.filename)]
+        files_to_upload = get_directory_index(local_path).match(task.filename)
 
         if files_to_upload:
             logger.info(
@@ -1,20 +1,38 @@
 import logging
+import threading
+from typing import Optional
 
 from src.config.connection_ftp import FtpConfig
 from src.models.edi_partner import EdiPartner
 from src.services.strategies import get_strategy_for_provider
 from src.transfer.ftp_manager import FtpManager
 from src.transfer.sftp_manager import SftpManager
-from src.utils.local_menus import FtpProtocol
+from src.utils.local_menus import FtpProtocol, ImportExport
 
 logger = logging.getLogger(__name__)
 
+# Um lock por fornecedor: o agendador e o observador do outbox nunca
+# executam transferências do mesmo fornecedor em simultâneo.
+_provider_locks: dict[str, threading.Lock] = {}
+_provider_locks_guard = threading.Lock()
 
-def process_provider_transfer(provider: EdiPartner):
+
+def _get_provider_lock(provider_id: str) -> threading.Lock:
+    with _provider_locks_guard:
+        return _provider_locks.setdefault(provider_id, threading.Lock())
+
+
+def process_provider_transfer(provider: EdiPartner, direction: Optional[ImportExport] = None):
     """
     Orquestra a transferência de ficheiros para um único fornecedor,
     selecionando o manager de conexão e a estratégia de transferência apropriados.
+    Se `direction` for indicado, só são executadas as tarefas nessa direção.
     """
+    with _get_provider_lock(str(provider.provider)):
+        _process_provider_transfer(provider, direction)
+
+
+def _process_provider_transfer(provider: EdiPartner, direction: Optional[ImportExport]):
     provider_id = provider.provider
 
     try:
@@ -67,7 +85,7 @@ def process_provider_transfer(provider: EdiPartner):
 
             # 4. Mandar a estratégia executar o seu fluxo de trabalho.
             #    Toda a lógica de upload/download está encapsulada aqui.
-            strategy_instance.execute()
+            strategy_instance.execute(direction=direction)
 
         logger.info(f'Processamento para o fornecedor {provider_id} concluído com sucesso.')
 
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional, Union
+
+from src.config.settings import WATERMARK_FILE
+from src.models.data_models import RemoteFileInfo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Watermark:
+    """
+    High-water mark of a remote folder.
+
+    kind:
+        'mtime' when the server provides modification times, 'name' when only
+        the filename sequence can be used to order the files.
+    value:
+        The last processed mtime (epoch seconds) or filename.
+    names:
+        Files already processed that share exactly the `value` mtime (ties).
+    """
+
+    kind: str
+    value: Union[float, str]
+    names: list[str] = field(default_factory=list)
+
+    def is_past(self, remote_file: RemoteFileInfo) -> bool:
+        """Returns True if the file is newer than the watermark (i.e. still to process)."""
+        if self.kind == 'mtime' and remote_file.mtime is not None:
+            if remote_file.mtime != self.value:
+                return remote_file.mtime > self.value
+            return remote_file.name not in self.names
+
+        if self.kind == 'name':
+            return remote_file.name > self.value
+
+        # The listing no longer matches the kind of mark stored: process everything
+        return True
+
+
+def sort_key(remote_file: RemoteFileInfo) -> tuple:
+    """Orders a listing by mtime (when known) and then by filename."""
+    return (remote_file.mtime if remote_file.mtime is not None else float('-inf'), remote_file.name)
+
+
+class WatermarkStore:
+    """
+    Durable per-provider, per-folder high-water marks, kept in a JSON file.
+    Marks are also scoped by task prefix, since several tasks can share a remote folder.
+    Writes are atomic (temporary file + os.replace) so a crash never leaves a truncated file.
+    """
+
+    def __init__(self, file_path: Union[str, Path] = WATERMARK_FILE):
+        self.file_path = Path(file_path)
+        self._lock = threading.Lock()
+        self._marks: Optional[dict[str, Watermark]] = None
+
+    @staticmethod
+    def _key(provider_id: str, remote_path: str, prefix: str) -> str:
+        return f'{provider_id}|{remote_path.rstrip("/")}|{prefix}'
+
+    def _load(self) -> dict[str, Watermark]:
+        if self._marks is None:
+            self._marks = {}
+            if self.file_path.is_file():
+                try:
+                    raw = json.loads(self.file_path.read_text(encoding='utf-8'))
+                    self._marks = {key: Watermark(**mark) for key, mark in raw.items()}
+                except (OSError, ValueError, TypeError) as e:
+                    logger.error(f'Ficheiro de watermarks inválido ({self.file_path}): {e}. A ignorar.')
+        return self._marks
+
+    def _save(self):
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.file_path.with_suffix(f'{self.file_path.suffix}.tmp')
+        payload = {key: asdict(mark) for key, mark in (self._marks or {}).items()}
+        tmp_path.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding='utf-8')
+        os.replace(tmp_path, self.file_path)
+
+    def get(self, provider_id: str, remote_path: str, prefix: str) -> Optional[Watermark]:
+        with self._lock:
+            return self._load().get(self._key(provider_id, remote_path, prefix))
+
+    def advance(self, provider_id: str, remote_path: str, prefix: str, remote_file: RemoteFileInfo):
+        """Moves the watermark forward to `remote_file` (never backwards) and persists it."""
+        with self._lock:
+            marks = self._load()
+            key = self._key(provider_id, remote_path, prefix)
+            current = marks.get(key)
+
+            if remote_file.mtime is not None:
+                if current and current.kind == 'mtime' and current.value == remote_file.mtime:
+                    if remote_file.name not in current.names:
+                        current.names.append(remote_file.name)
+                elif not current or current.kind != 'mtime' or remote_file.mtime > current.value:
+                    marks[key] = Watermark(kind='mtime', value=remote_file.mtime, names=[remote_file.name])
+                else:
+                    return
+            elif not current or current.kind != 'name' or remote_file.name > current.value:
+                marks[key] = Watermark(kind='name', value=remote_file.name)
+            else:
+                return
+
+            self._save()
+
+
+# Shared store used by the transfer strategies
+watermark_store = WatermarkStore()
@@ -1,9 +1,12 @@
 import logging
-from ftplib import FTP, error_perm
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from ftplib import FTP, Error, error_perm, error_proto
 from pathlib import Path
 from typing import Optional
 
 from src.config.connection_ftp import FtpConfig
+from src.models.data_models import RemoteFileInfo
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +16,18 @@ class FtpManager:
     Gerencia a conexão e as operações com um servidor FTP específico.
     """
 
+    # Número máximo de comandos DELE enviados antes de ler as respostas.
+    DELETE_PIPELINE_WINDOW = 32
+
+    # Servidores (host) que já mostraram não suportar comandos em pipeline.
+    _no_pipelining_hosts: set[str] = set()
+
+    # Servidores (host) que não suportam o comando MLSD (listagem com metadados).
+    _no_mlsd_hosts: set[str] = set()
+
+    # Suporte de padrões (globbing) no NLST por servidor: True/False, ou ausente se desconhecido.
+    _glob_support: dict[str, bool] = {}
+
     def __init__(self, config: FtpConfig):
         """
         Inicializa o gerenciador.
@@ -33,17 +48,19 @@ class FtpManager:
         mode_str = 'BINÁRIO' if self.binary_mode else f'ASCII (encoding: {self.encoding})'
         logger.debug(f'FtpManager para {self.hostname} configurado para usar o modo {mode_str}.')
 
-    def __enter__(self):
-        try:
-            logger.info(f'A conectar ao servidor FTP em {self.hostname}:{self.port}...')
-            # Usamos FTP() para a conexão padrão, com um timeout
-            self.ftp = FTP(encoding=self.encoding)
-            self.ftp.connect(self.hostname, self.port, timeout=15)
-            self.ftp.login(self.username, self.password)
+    def _connect(self):
+        logger.info(f'A conectar ao servidor FTP em {self.hostname}:{self.port}...')
+        # Usamos FTP() para a conexão padrão, com um timeout
+        self.ftp = FTP(encoding=self.encoding)
+        self.ftp.connect(self.hostname, self.port, timeout=15)
+        self.ftp.login(self.username, self.password)
 
-            # Entrar em modo passivo é quase sempre necessário e mais seguro através de firewalls.
-            self.ftp.set_pasv(True)
+        # Entrar em modo passivo é quase sempre necessário e mais seguro através de firewalls.
+        self.ftp.set_pasv(True)
 
+    def __enter__(self):
+        try:
+            self._connect()
             logger.info(f"Conexão FTP com '{self.hostname}' estabelecida com sucesso.")
             return self
         except Exception as e:
@@ -61,10 +78,7 @@ class FtpManager:
                 self.ftp = None
         logger.info(f"Conexão FTP com '{self.hostname}' fechada.")
 
-    def list_files(self, remote_path: str) -> list[str]:
-        if not self.ftp:
-            logger.error('Cliente FTP não conectado.')
-            return []
+    def _nlst(self, remote_path: str) -> list[str]:
         try:
             logger.info(f"Listar ficheiros em '{remote_path}'...")
             return self.ftp.nlst(remote_path)
@@ -78,6 +92,119 @@ class FtpManager:
             logger.error(f"Falha inesperada ao listar ficheiros em '{remote_path}': {e}", exc_info=True)
             return []
 
+    def _nlst_glob(self, remote_path: str, pattern: str) -> Optional[list[str]]:
+        """
+        Pede ao servidor apenas os ficheiros que correspondem ao padrão (NLST <pasta>/<padrão>).
+        Devolve None quando a resposta não permite concluir nada (ex: 550 sem correspondências
+        num servidor cujo suporte de globbing ainda é desconhecido).
+        """
+        glob_path = f'{remote_path.rstrip("/")}/{pattern}'
+        supported = self._glob_support.get(self.hostname)
+
+        try:
+            logger.info(f"Listar ficheiros em '{glob_path}' (filtro no servidor)...")
+            names = self.ftp.nlst(glob_path)
+        except error_perm as e:
+            if str(e)[:3] != '550':
+                logger.info(f"Servidor FTP '{self.hostname}' recusou o NLST com padrão: {e}")
+                self._glob_support[self.hostname] = False
+                return None
+            # 550: nenhum ficheiro corresponde (ou o servidor não suporta padrões)
+            return [] if supported else None
+
+        if all(fnmatch(Path(name).name, pattern) for name in names):
+            if names and supported is None:
+                logger.info(f"Servidor FTP '{self.hostname}' suporta filtros no NLST.")
+                self._glob_support[self.hostname] = True
+            return names if names or supported else None
+
+        logger.info(f"Servidor FTP '{self.hostname}' ignora filtros no NLST. A filtrar no cliente.")
+        self._glob_support[self.hostname] = False
+        return [name for name in names if fnmatch(Path(name).name, pattern)]
+
+    def list_files(self, remote_path: str, pattern: Optional[str] = None) -> list[str]:
+        """
+        Lista os ficheiros de um diretório remoto.
+        Se `pattern` for indicado, o filtro é enviado ao servidor quando este o suporta;
+        caso contrário a pasta é listada por inteiro e filtrada no cliente.
+        """
+        if not self.ftp:
+            logger.error('Cliente FTP não conectado.')
+            return []
+
+        tried_glob = False
+        if pattern and self._glob_support.get(self.hostname) is not False:
+            tried_glob = True
+            try:
+                names = self._nlst_glob(remote_path, pattern)
+            except Exception as e:
+                logger.warning(f"Falha no NLST com padrão em '{remote_path}': {e}. A listar a pasta inteira.")
+                names = None
+
+            if names is not None:
+                return names
+
+        names = self._nlst(remote_path)
+        if pattern:
+            names = [name for name in names if fnmatch(Path(name).name, pattern)]
+
+            # O NLST com padrão não devolveu nada, mas existem ficheiros correspondentes
+            if tried_glob and names and self.hostname not in self._glob_support:
+                logger.info(f"Servidor FTP '{self.hostname}' não suporta filtros no NLST. A filtrar no cliente.")
+                self._glob_support[self.hostname] = False
+        return names
+
+    @staticmethod
+    def _parse_mlsd_time(value: Optional[str]) -> Optional[float]:
+        """Converte o facto 'modify' do MLSD (YYYYMMDDHHMMSS[.sss], em UTC) para epoch."""
+        if not value:
+            return None
+        try:
+            parsed = datetime.strptime(value[:14], '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+        return parsed.timestamp()
+
+    def list_files_with_attributes(self, remote_path: str, pattern: Optional[str] = None) -> list[RemoteFileInfo]:
+        """
+        Lista os ficheiros de um diretório remoto com data de modificação e tamanho (MLSD).
+        Se o servidor não suportar MLSD, devolve apenas os nomes (sem metadados), usando o
+        filtro no servidor quando disponível. O MLSD não aceita padrões: filtra-se no cliente.
+        """
+        if not self.ftp:
+            logger.error('Cliente FTP não conectado.')
+            return []
+
+        if self.hostname not in self._no_mlsd_hosts:
+            try:
+                logger.info(f"Listar ficheiros (MLSD) em '{remote_path}'...")
+                files = []
+                for name, facts in self.ftp.mlsd(remote_path, facts=['type', 'modify', 'size']):
+                    if facts.get('type', 'file') != 'file':
+                        continue
+                    if pattern and not fnmatch(name, pattern):
+                        continue
+                    size = facts.get('size')
+                    files.append(
+                        RemoteFileInfo(
+                            name=name,
+                            mtime=self._parse_mlsd_time(facts.get('modify')),
+                            size=int(size) if size and size.isdigit() else None,
+                        )
+                    )
+                return files
+            except error_perm as e:
+                if str(e)[:3] not in {'500', '501', '502', '504'}:
+                    logger.warning(f"Falha ao listar ficheiros (MLSD) em '{remote_path}': {e}")
+                    return []
+                logger.info(f"Servidor FTP '{self.hostname}' não suporta MLSD. A usar NLST.")
+                self._no_mlsd_hosts.add(self.hostname)
+            except Exception as e:
+                logger.error(f"Falha inesperada ao listar ficheiros em '{remote_path}': {e}", exc_info=True)
+                return []
+
+        return [RemoteFileInfo(name=Path(name).name) for name in self.list_files(remote_path, pattern)]
+
     def upload_file(self, local_path: str, remote_path: str) -> bool:
         if not self.ftp:
             logger.error('Cliente FTP não conectado.')
@@ -137,3 +264,88 @@ class FtpManager:
         except Exception as e:
             logger.error(f"Falha ao remover ficheiro remoto '{remote_path}': {e}", exc_info=True)
             return False
+
+    def delete_files(self, remote_paths: list[str]) -> dict[str, bool]:
+        """
+        Remove vários ficheiros remotos de uma vez.
+
+        Os comandos DELE são enviados em pipeline (em janelas de DELETE_PIPELINE_WINDOW)
+        e só depois são lidas as respostas, evitando uma ida e volta por ficheiro.
+        Se o servidor não aceitar pipelining, é registado e os ficheiros que faltam são
+        removidos um a um, numa nova conexão.
+
+        Returns:
+            Um dicionário {caminho_remoto: True/False} com o resultado de cada remoção.
+        """
+        if not remote_paths:
+            return {}
+
+        if not self.ftp:
+            logger.error('Cliente FTP não conectado.')
+            return dict.fromkeys(remote_paths, False)
+
+        if self.hostname in self._no_pipelining_hosts:
+            return {remote_path: self.delete_file(remote_path) for remote_path in remote_paths}
+
+        logger.info(f'A remover {len(remote_paths)} ficheiros remotos em pipeline...')
+
+        results: dict[str, bool] = {}
+        for start in range(0, len(remote_paths), self.DELETE_PIPELINE_WINDOW):
+            window = remote_paths[start : start + self.DELETE_PIPELINE_WINDOW]
+            try:
+                self._delete_window(window, results)
+            except (error_proto, EOFError, OSError) as e:
+                # O servidor perdeu a sincronia das respostas: não suporta pipelining.
+                logger.warning(
+                    f"Servidor FTP '{self.hostname}' não suporta comandos em pipeline: {e}. "
+                    'A remover os ficheiros pendentes um a um.'
+                )
+                self._no_pipelining_hosts.add(self.hostname)
+                self._delete_remaining(
+                    [remote_path for remote_path in remote_paths if remote_path not in results], results
+                )
+                break
+
+        removed = sum(results.values())
+        logger.info(f'Removidos {removed} de {len(remote_paths)} ficheiros remotos.')
+        return results
+
+    def _delete_window(self, window: list[str], results: dict[str, bool]):
+        """
+        Envia os DELE de uma janela e lê as respostas, registando o resultado de cada ficheiro em `results`.
+
+        Raises:
+            error_proto, EOFError, OSError: Se as respostas não puderem ser lidas (sem pipelining).
+        """
+        for remote_path in window:
+            self.ftp.putcmd(f'DELE {remote_path}')
+
+        for remote_path in window:
+            try:
+                self.ftp.voidresp()
+                results[remote_path] = True
+            except error_proto:
+                raise
+            except Error as e:
+                # Resposta 4xx/5xx: falha apenas deste ficheiro
+                logger.error(f"Falha ao remover ficheiro remoto '{remote_path}': {e}")
+                results[remote_path] = False
+
+    def _delete_remaining(self, remote_paths: list[str], results: dict[str, bool]):
+        """
+        Remove um a um os ficheiros que ficaram por confirmar depois de uma falha do pipeline.
+
+        As respostas em falta podem ainda chegar pela conexão atual: é fechada e aberta outra,
+        para que cada resposta corresponda ao seu comando.
+        """
+        try:
+            self.ftp.close()
+            self._connect()
+        except Exception as e:
+            logger.error(f"Falha ao restabelecer a conexão FTP com '{self.hostname}': {e}", exc_info=True)
+            self.ftp = None
+            results.update(dict.fromkeys(remote_paths, False))
+            return
+
+        for remote_path in remote_paths:
+            results[remote_path] = self.delete_file(remote_path)
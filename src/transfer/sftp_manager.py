@@ -1,15 +1,39 @@
 import logging
+import stat
+from fnmatch import fnmatch
 from pathlib import Path
 from typing import Optional
 
 import paramiko
+from paramiko.sftp import CMD_REMOVE, CMD_STATUS, SFTP_OK
 from paramiko.ssh_exception import AuthenticationException, BadHostKeyException, SSHException
 
+from src.models.data_models import RemoteFileInfo
+
 # Desativando o logging excessivo do paramiko
 logging.getLogger('paramiko').setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+class _PipelinedStatus:
+    """
+    Recolhe as respostas de pedidos SFTP enviados em pipeline.
+    O paramiko entrega aqui (via `_async_response`) cada resposta que chega ao cliente.
+    """
+
+    def __init__(self):
+        self.responses: dict[int, tuple[bool, str]] = {}
+
+    def _async_response(self, t, msg, num):
+        if t != CMD_STATUS:
+            self.responses[num] = (False, f'Resposta inesperada do servidor (tipo {t}).')
+            return
+
+        code = msg.get_int()
+        text = msg.get_text()
+        self.responses[num] = (code == SFTP_OK, text)
+
+
 class SftpManager:
     """
     Gerencia a conexão e as operações com um servidor SFTP específico.
@@ -116,9 +140,10 @@ class SftpManager:
             logging.error(f'Falha no download do ficheiro: {e}')
             return False
 
-    def list_files(self, remote_path: str) -> list[str]:
+    def list_files(self, remote_path: str, pattern: Optional[str] = None) -> list[str]:
         """
         Lista os nomes dos ficheiros em um diretório remoto.
+        O protocolo SFTP não tem filtros no servidor: `pattern` é aplicado no cliente.
         Retorna uma lista vazia se o diretório não existir ou em caso de erro.
         """
         if not self.sftp_client:
@@ -127,7 +152,10 @@ class SftpManager:
 
         try:
             logging.info(f"Listar ficheiros em '{remote_path}'...")
-            return self.sftp_client.listdir(remote_path)
+            names = self.sftp_client.listdir(remote_path)
+            if pattern:
+                names = [name for name in names if fnmatch(name, pattern)]
+            return names
         except FileNotFoundError:
             logging.warning(f'Diretório remoto não encontrado: {remote_path}')
             return []
@@ -135,6 +163,31 @@ class SftpManager:
             logging.error(f"Falha ao listar ficheiros em '{remote_path}': {e}")
             return []
 
+    def list_files_with_attributes(self, remote_path: str, pattern: Optional[str] = None) -> list[RemoteFileInfo]:
+        """
+        Lista os ficheiros regulares de um diretório remoto com data de modificação e tamanho,
+        opcionalmente filtrados pelo padrão `pattern` (no cliente).
+        Retorna uma lista vazia se o diretório não existir ou em caso de erro.
+        """
+        if not self.sftp_client:
+            logger.error('Cliente SFTP não conectado.')
+            return []
+
+        try:
+            logger.info(f"Listar ficheiros (com atributos) em '{remote_path}'...")
+            return [
+                RemoteFileInfo(name=attr.filename, mtime=attr.st_mtime, size=attr.st_size)
+                for attr in self.sftp_client.listdir_attr(remote_path)
+                if (attr.st_mode is None or stat.S_ISREG(attr.st_mode))
+                and (not pattern or fnmatch(attr.filename, pattern))
+            ]
+        except FileNotFoundError:
+            logger.warning(f'Diretório remoto não encontrado: {remote_path}')
+            return []
+        except Exception as e:
+            logger.error(f"Falha ao listar ficheiros em '{remote_path}': {e}")
+            return []
+
     def delete_file(self, remote_path: str) -> bool:
         """
         Remove um ficheiro no servidor SFTP.
@@ -152,3 +205,49 @@ class SftpManager:
         except Exception as e:
             logging.error(f"Falha ao remover ficheiro remoto '{remote_path}': {e}")
             return False
+
+    def delete_files(self, remote_paths: list[str]) -> dict[str, bool]:
+        """
+        Remove vários ficheiros no servidor SFTP enviando todos os pedidos
+        antes de esperar pelas respostas (pipelining).
+
+        Returns:
+            Um dicionário {caminho_remoto: True/False} com o resultado de cada remoção.
+        """
+        if not remote_paths:
+            return {}
+
+        if not self.sftp_client:
+            logger.error('Cliente SFTP não conectado.')
+            return dict.fromkeys(remote_paths, False)
+
+        logger.info(f'A remover {len(remote_paths)} ficheiros remotos em pipeline...')
+
+        collector = _PipelinedStatus()
+        requests: dict[int, str] = {}
+
+        try:
+            for remote_path in remote_paths:
+                path = self.sftp_client._adjust_cwd(remote_path)  # noqa: SLF001
+                num = self.sftp_client._async_request(collector, CMD_REMOVE, path)  # noqa: SLF001
+                requests[num] = remote_path
+
+            # Lê respostas até que todos os pedidos deste lote estejam respondidos
+            while collector in self.sftp_client._expecting.values():  # noqa: SLF001
+                self.sftp_client._read_response()  # noqa: SLF001
+        except Exception as e:
+            logger.error(f'Falha na remoção em pipeline de ficheiros remotos: {e}')
+
+        results: dict[str, bool] = {}
+        for num, remote_path in requests.items():
+            ok, text = collector.responses.get(num, (False, 'Sem resposta do servidor.'))
+            if not ok:
+                logger.error(f"Falha ao remover ficheiro remoto '{remote_path}': {text}")
+            results[remote_path] = ok
+
+        for remote_path in remote_paths:
+            results.setdefault(remote_path, False)
+
+        removed = sum(results.values())
+        logger.info(f'Removidos {removed} de {len(remote_paths)} ficheiros remotos.')
+        return results
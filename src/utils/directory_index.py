@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Union
+
+# Filesystems with coarse timestamps can change a folder twice inside the same mtime tick.
+# A folder modified less than this many seconds ago is always rescanned.
+MTIME_SAFETY_WINDOW_SECONDS = 2.0
+
+
+@dataclass(frozen=True)
+class IndexedFile:
+    """Stat data of a regular file, taken from the `os.DirEntry` of the scan."""
+
+    name: str
+    path: str
+    mtime_ns: int
+    size: int
+
+
+class DirectoryIndex:
+    """
+    A cached, scandir-based listing of the regular files of a local folder.
+
+    The folder is only scanned again when its own mtime changes, so repeated
+    pattern lookups (one per task) cost a single `stat` of the folder.
+    """
+
+    def __init__(self, folder: Union[str, Path]):
+        self.folder = str(folder)
+        self._lock = threading.Lock()
+        self._dir_mtime_ns: int = -1
+        self._files: dict[str, IndexedFile] = {}
+        self._matches: dict[str, list[IndexedFile]] = {}
+
+    def _is_stale(self, dir_mtime_ns: int) -> bool:
+        if dir_mtime_ns != self._dir_mtime_ns:
+            return True
+        return time.time() - dir_mtime_ns / 1e9 < MTIME_SAFETY_WINDOW_SECONDS
+
+    def _scan(self, dir_mtime_ns: int):
+        files: dict[str, IndexedFile] = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                # is_file() uses the d_type of the directory entry (no syscall on most systems)
+                if not entry.is_file():
+                    continue
+                # stat() is one syscall per file on Linux (only cached on Windows). The mtime and size let
+                # the scandir fallback of the outbox watcher see a file replaced under the same name.
+                stat = entry.stat()
+                files[entry.name] = IndexedFile(
+                    name=entry.name, path=entry.path, mtime_ns=stat.st_mtime_ns, size=stat.st_size
+                )
+
+        self._files = files
+        self._matches = {}
+        self._dir_mtime_ns = dir_mtime_ns
+
+    def refresh(self) -> bool:
+        """
+        Rescans the folder if it changed since the last scan.
+
+        Returns:
+            True if the folder was rescanned, False if the cached data is still valid.
+
+        Raises:
+            OSError: If the folder does not exist or cannot be read.
+        """
+        dir_mtime_ns = os.stat(self.folder).st_mtime_ns
+        with self._lock:
+            if not self._is_stale(dir_mtime_ns):
+                return False
+            self._scan(dir_mtime_ns)
+            return True
+
+    def files(self) -> dict[str, IndexedFile]:
+        """Returns the indexed files of the folder, keyed by name."""
+        self.refresh()
+        return self._files
+
+    def match(self, pattern: str) -> list[Path]:
+        """Returns the paths of the files whose name matches the `fnmatch` pattern."""
+        self.refresh()
+        with self._lock:
+            matches = self._matches.get(pattern)
+            if matches is None:
+                matches = [indexed for name, indexed in self._files.items() if fnmatch(name, pattern)]
+                self._matches[pattern] = matches
+
+        return [Path(indexed.path) for indexed in matches]
+
+
+_indexes: dict[str, DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_directory_index(folder: Union[str, Path]) -> DirectoryIndex:
+    """Returns the shared DirectoryIndex of a folder, creating it on first use."""
+    key = os.path.abspath(folder)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = DirectoryIndex(key)
+        return index
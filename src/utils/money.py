@@ -0,0 +1,26 @@
+from decimal import MAX_PREC, Context, Decimal
+from typing import Optional
+
+# O scaleb arredonda à precisão do contexto (28 dígitos por omissão): com esta precisão é exato
+_EXACT = Context(prec=MAX_PREC)
+
+
+def rescale(units: int, scale: int, new_scale: int) -> int:
+    """
+    Muda a escala de um inteiro escalado (vírgula fixa) para uma escala maior, sem perdas.
+    Ex: rescale(12345, 4, 5) -> 123450 (1.2345 nas duas escalas).
+    """
+    if new_scale < scale:
+        raise ValueError(f'Cannot rescale from {scale} to {new_scale} decimal places without rounding.')
+    return units * 10 ** (new_scale - scale)
+
+
+def to_decimal(units: Optional[int], scale: int) -> Optional[Decimal]:
+    """
+    Converte um inteiro escalado para Decimal, com `scale` casas decimais: to_decimal(12345, 4) -> Decimal('1.2345').
+    Os valores são mantidos em inteiros durante a conversão e os cálculos; o Decimal só é criado
+    na fronteira com a base de dados. A conversão é exata, qualquer que seja o número de dígitos.
+    """
+    if units is None:
+        return None
+    return Decimal(units).scaleb(-scale, _EXACT)
@@ -0,0 +1,24 @@
+"""Shared fixtures."""
+
+from collections.abc import Iterator
+
+import pytest
+
+from benchmarks.sqlite_invoices import X3_TABLES, invoice_database
+from src.database.database import DatabaseManager
+
+
+@pytest.fixture
+def invoice_db(tmp_path) -> Iterator[DatabaseManager]:
+    """A database manager on a SQLite file with the (empty) invoice tables, ZPINVOICEV and ZPINVOICED."""
+    manager = invoice_database(f'sqlite:///{tmp_path / "invoices.db"}')
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def x3_db(tmp_path) -> Iterator[DatabaseManager]:
+    """A database manager on a SQLite file with every (empty) table of the models, and ZREFPUB."""
+    manager = invoice_database(f'sqlite:///{tmp_path / "x3.db"}', X3_TABLES)
+    yield manager
+    manager.close()
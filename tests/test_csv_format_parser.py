@@ -0,0 +1,75 @@
+"""
+CsvParser in the process pool (line-aligned chunks) against the parse in the current process, and
+the files that cannot be split by lines.
+"""
+
+from dataclasses import astuple, dataclass
+from functools import partial
+
+import pytest
+
+from src.config.settings import PARALLEL_PARSING
+from src.processing.parsers import csv_format_parser, parallel
+from src.processing.parsers.csv_format_parser import CsvParser
+
+LINE_COUNT = 200
+
+
+@dataclass
+class Row:
+    code: str
+    quantity: int
+    label: str
+
+
+def values(rows: list[Row]) -> list[tuple]:
+    # The rows built in the worker processes are instances of the test module imported there
+    return [astuple(row) for row in rows]
+
+
+CONFIG = {
+    'data_model': Row,
+    'column_map': {'code': 'CODE', 'quantity': 'QTY', 'label': 'LABEL'},
+    'delimiter': ';',
+}
+
+
+@pytest.fixture
+def in_parallel(monkeypatch):
+    """Every file is parsed in the process pool, in chunks of about 1 KB."""
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_WORKERS', 2)
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_PARALLEL_MIN_MB', 0)
+    monkeypatch.setattr(csv_format_parser, 'split_line_aligned', partial(parallel.split_line_aligned, chunk_size=1024))
+    yield
+    parallel.shutdown_process_pool()
+
+
+def write_csv(path, last_label: str = 'LAST'):
+    lines = ['CODE;QTY;LABEL', *(f'C{i:04d};{i};LABEL {i}' for i in range(LINE_COUNT - 1)), f'CEND;0;{last_label}']
+    path.write_text('\r\n'.join(lines) + '\r\n', encoding='latin-1')
+    return path
+
+
+def test_parallel_parse_matches_the_serial_parse(tmp_path, in_parallel):
+    csv_file = write_csv(tmp_path / 'rows.csv')
+    parallel_rows = CsvParser().parse(csv_file, CONFIG)
+
+    PARALLEL_PARSING['PARSE_WORKERS'] = 1
+    assert values(parallel_rows) == values(CsvParser().parse(csv_file, CONFIG))
+    assert len(parallel_rows) == LINE_COUNT
+    assert astuple(parallel_rows[1]) == ('C0001', 1, 'LABEL 1')
+
+
+def test_quoted_line_break_is_parsed_serially(tmp_path, in_parallel):
+    # Found in the last chunk only: the rows of the other chunks are not used
+    csv_file = write_csv(tmp_path / 'rows.csv', last_label='"TWO\r\nLINES"')
+
+    rows = CsvParser().parse(csv_file, CONFIG)
+    assert len(rows) == LINE_COUNT
+    assert astuple(rows[-1]) == ('CEND', 0, 'TWO\r\nLINES')
+
+
+def test_empty_file(tmp_path, in_parallel):
+    csv_file = tmp_path / 'empty.csv'
+    csv_file.write_bytes(b'')
+    assert CsvParser().parse(csv_file, CONFIG) == []
@@ -0,0 +1,77 @@
+"""
+EditionRepository.upsert_editions on the SQLite X3 tables: the editions of a file that are
+created and updated in ZITMINP, and what is left as it was.
+"""
+
+import pytest
+from sqlalchemy import select
+
+from src.models.edition import Edition
+from src.repositories.edition_repository import EditionRepository, EditionUpsert
+from src.repositories.reference_cache import MISSING, ReferenceCache
+
+
+def edition_row(code: str, description: str, publication: str = 'P001') -> dict:
+    return {
+        'edition': code,
+        'description': description,
+        'bipad': '1234',
+        'edition_number': code,
+        'suffix': 'A',
+        'publication': publication,
+        '_supplier_0': '1526',
+    }
+
+
+@pytest.fixture
+def editions_db(x3_db):
+    with x3_db.get_db() as session:
+        session.add_all(
+            Edition(**edition_row(code, description), vasp_code='', vasp_description='')
+            for code, description in (('000001', 'UNCHANGED'), ('000002', 'OLD DESCRIPTION'))
+        )
+    return x3_db
+
+
+def stored_editions(db) -> dict[str, Edition]:
+    with db.get_db() as session:
+        editions = session.scalars(select(Edition)).all()
+        session.expunge_all()
+    return {edition.edition: edition for edition in editions}
+
+
+def test_upsert_creates_and_updates_the_editions(editions_db):
+    rows = [
+        edition_row('000001', 'UNCHANGED'),
+        edition_row('000002', 'NEW DESCRIPTION', publication='P002'),
+        edition_row('000003', 'NEW EDITION', publication='P003'),
+        # The first row of a code wins
+        edition_row('000003', 'SAME CODE AGAIN'),
+    ]
+    cache = ReferenceCache('editions', {'CACHE_ENABLED': True})
+    cache.put('000003', None)
+    with editions_db.get_db() as session:
+        assert EditionRepository(session, cache).upsert_editions(rows) == EditionUpsert(inserted=1, updated=1)
+    # The cached miss of the new edition is gone
+    assert cache.get('000003') is MISSING
+
+    editions = stored_editions(editions_db)
+    assert sorted(editions) == ['000001', '000002', '000003']
+    # The edition that differs gets the next UPDTICK_0, the unchanged one keeps its own
+    assert editions['000002'].updateChanges == editions['000001'].updateChanges + 1
+    # Only the master data of an existing edition is updated, not its publication
+    assert (editions['000002'].description, editions['000002'].publication) == ('NEW DESCRIPTION', 'P001')
+    created = editions['000003']
+    assert (created.description, created.publication, created._supplier_0) == ('NEW EDITION', 'P003', '1526')
+    # Columns that are not staged get the defaults of the model
+    assert (created.createUser, created.vasp_code) == ('ZINTR', '')
+    assert created.uniqueID
+
+
+def test_upsert_of_unchanged_editions_changes_nothing(editions_db):
+    with editions_db.get_db() as session:
+        upserted = EditionRepository(session).upsert_editions([edition_row('000001', 'UNCHANGED')])
+    assert upserted == EditionUpsert(inserted=0, updated=0)
+
+    with editions_db.get_db() as session:
+        assert EditionRepository(session).upsert_editions([]) == EditionUpsert(inserted=0, updated=0)
@@ -0,0 +1,141 @@
+"""
+FixedFormatParser on synthetic France Messagerie files, with the handler's recipe: the columnar
+detail layout against the row layout, in text and 'mmap' read modes, and the parallel parse
+(line-aligned chunks in the process pool) against the parse in the current process.
+"""
+
+from array import array
+from functools import partial
+
+import pytest
+
+from benchmarks.fm_sample import write_fm_file
+from benchmarks.parser_throughput import recipe
+from src.config.settings import PARALLEL_PARSING
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.parsers import fixed_format_parser, parallel
+from src.processing.parsers.columnar import ColumnarDetails
+from src.processing.parsers.fixed_format_parser import FixedFormatParser
+
+LINE_COUNT = 50
+READ_MODES = ['text', 'mmap']
+
+
+def row_recipe(read_mode: str) -> dict:
+    config = recipe(read_mode)
+    config.pop('detail_layout')
+    return config
+
+
+@pytest.fixture
+def fm_file(tmp_path):
+    return write_fm_file(tmp_path / 'fm.txt', LINE_COUNT)
+
+
+@pytest.mark.parametrize('read_mode', READ_MODES)
+def test_columnar_details_hold_the_rows(fm_file, read_mode):
+    columnar = FixedFormatParser().parse(fm_file, recipe(read_mode))
+    rows = FixedFormatParser().parse(fm_file, row_recipe(read_mode))
+
+    assert isinstance(columnar.details, ColumnarDetails)
+    assert len(columnar.details) == LINE_COUNT
+    assert list(columnar.details) == [dict(row) for row in rows.details]
+    assert (columnar.header, columnar.totals, columnar.footer) == (rows.header, rows.totals, rows.footer)
+    # The decoded integer fields are kept in arrays, the text fields in lists of str
+    assert isinstance(columnar.details['net_price'], array)
+    assert isinstance(columnar.details['description'], list)
+    assert columnar.details.column_sum('quantity') == sum(row['quantity'] for row in rows.details)
+
+
+@pytest.mark.parametrize('read_mode', READ_MODES)
+def test_columnar_and_row_conversions_agree(fm_file, read_mode):
+    columnar, columnar_totals = FranceMessagerieHandler._convert_details(
+        FixedFormatParser().parse(fm_file, recipe(read_mode))
+    )
+    rows, row_totals = FranceMessagerieHandler._convert_details(
+        FixedFormatParser().parse(fm_file, row_recipe(read_mode))
+    )
+
+    assert columnar == rows
+    assert columnar_totals == row_totals
+
+
+def test_column_with_an_invalid_value_becomes_a_list():
+    details = ColumnarDetails(('quantity', 'label'))
+    details.extend([(1, b'AB'), (2, b'CD')])
+    details.extend([(None, 'EF')])
+
+    assert details['quantity'] == [1, 2, None]
+    assert details['label'] == ['AB', 'CD', 'EF']
+    assert list(details) == [
+        {'quantity': 1, 'label': 'AB'},
+        {'quantity': 2, 'label': 'CD'},
+        {'quantity': None, 'label': 'EF'},
+    ]
+
+
+def test_invalid_amount_is_reported_with_its_chrono(fm_file):
+    parsed = FixedFormatParser().parse(fm_file, recipe('mmap'))
+    parsed.details.extend([{**dict(next(iter(parsed.details))), 'net_price': None, 'chrono': '777777'}.values()])
+
+    with pytest.raises(ValueError, match='chrono 777777'):
+        FranceMessagerieHandler._convert_details(parsed)
+
+
+@pytest.fixture
+def in_parallel(monkeypatch):
+    """Every file is parsed in the process pool, in chunks of about 2 KB (a few dozen lines)."""
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_WORKERS', 2)
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_PARALLEL_MIN_MB', 0)
+    monkeypatch.setattr(
+        fixed_format_parser, 'split_line_aligned', partial(parallel.split_line_aligned, chunk_size=2048)
+    )
+    yield
+    parallel.shutdown_process_pool()
+
+
+def with_line_ends(path, line_end: bytes):
+    path.write_bytes(path.read_bytes().replace(b'\r\n', line_end))
+    return path
+
+
+@pytest.mark.parametrize('line_end', [b'\r\n', b'\n', b'\r'], ids=['CRLF', 'LF', 'CR'])
+@pytest.mark.parametrize('config', [recipe('text'), recipe('mmap'), row_recipe('text'), row_recipe('mmap')])
+def test_parallel_parse_matches_the_serial_parse(tmp_path, in_parallel, line_end, config):
+    fm_file = with_line_ends(write_fm_file(tmp_path / 'fm.txt', LINE_COUNT), line_end)
+    parallel_document = FixedFormatParser().parse(fm_file, config)
+
+    PARALLEL_PARSING['PARSE_WORKERS'] = 1
+    serial_document = FixedFormatParser().parse(fm_file, config)
+
+    assert len(serial_document.details) == LINE_COUNT
+    assert [dict(row) for row in parallel_document.details] == [dict(row) for row in serial_document.details]
+    assert parallel_document.header == serial_document.header
+    assert parallel_document.totals == serial_document.totals
+    # The worker processes send decoded records: nothing is left to decode in this process
+    assert all(type(row) is dict for row in parallel_document.details)
+
+
+def test_iter_events_streams_the_document_in_order(fm_file):
+    events = FixedFormatParser().iter_events(fm_file, recipe('mmap'))
+
+    header = next(events)
+    assert (header.kind, header.line_num, header.data['invoice_number']) == ('header', 1, 'INV0000001')
+    details = next(events)
+    assert (details.kind, details.line_num) == ('details', 2)
+    # The details are read from the file as they are consumed: one list of values per line
+    assert len(list(details.data)) == LINE_COUNT
+    assert [event.kind for event in events] == ['totals', 'footer']
+
+
+def test_iter_events_reports_structural_errors_when_the_line_is_read(tmp_path):
+    fm_file = write_fm_file(tmp_path / 'fm.txt', LINE_COUNT)
+    lines = fm_file.read_bytes().splitlines(keepends=True)
+    # A second header line after the details
+    fm_file.write_bytes(b''.join([*lines[:-2], lines[0], *lines[-2:]]))
+
+    events = FixedFormatParser().iter_events(fm_file, recipe('text'))
+    assert next(events).kind == 'header'
+    assert len(list(next(events).data)) == LINE_COUNT
+    with pytest.raises(ValueError, match=f'line {LINE_COUNT + 2}'):
+        next(events)
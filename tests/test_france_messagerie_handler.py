@@ -0,0 +1,153 @@
+"""
+FranceMessagerieHandler.post_process end to end on the SQLite X3 tables: a sample file is parsed with
+the handler's recipe, its editions are resolved, and the invoice is numbered and written.
+"""
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.fm_sample import write_fm_file
+from benchmarks.parser_throughput import recipe
+from src.models.counter import CodeNumbers, SequenceNumbers
+from src.models.data_models import FranceMessagerieInvoice, TransferTask
+from src.models.edi_partner import EdiPartner
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+from src.models.edition import Edition
+from src.models.publication import Publication
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.parsers.fixed_format_parser import FixedFormatParser
+from src.repositories import edition_repository, publication_repository
+from src.repositories.description_index import DescriptionIndex
+from src.repositories.invoices.purchase_invoice_repository import PurchaseInvoiceRepository
+from src.repositories.reference_cache import ReferenceCache
+from src.repositories.supplier_repository import SupplierRepository
+from src.utils.local_menus import ImportExport, PositionType, YesNo
+
+LINE_COUNT = 20
+COUNTER = 'ZFM'
+
+
+@pytest.fixture(params=[True, False], ids=['cache', 'no-cache'])
+def handler_db(request, x3_db, monkeypatch):
+    """The X3 tables with a counter, the publications of the sample and the editions of its even lines."""
+    for module in ('src.processing.handlers.france_messagerie_handler', 'src.services.invoice_writer'):
+        monkeypatch.setattr(f'{module}.db', x3_db)
+
+    settings = {'CACHE_ENABLED': request.param}
+    monkeypatch.setattr(edition_repository, 'edition_cache', ReferenceCache('editions', settings))
+    monkeypatch.setattr(publication_repository, 'publication_cache', ReferenceCache('publications', settings))
+    monkeypatch.setattr(publication_repository, 'description_index', DescriptionIndex(settings))
+    # BPSUPPLIER is read with a SQL Server query: the supplier has no liquidation
+    monkeypatch.setattr(SupplierRepository, 'use_liquidation', lambda self, provider_id: False)
+
+    with x3_db.get_db() as session:
+        session.add(
+            CodeNumbers(
+                code_number=COUNTER,
+                number_of_components=2,
+                components_type=[PositionType.CONSTANT, PositionType.SEQUENCE],
+                components_length=[2, 6],
+                constants=['FM', ''],
+            )
+        )
+        session.add_all(Publication(code=f'P{i:03d}', description=f'PUBLICATION {i}') for i in range(LINE_COUNT))
+        session.add_all(
+            Edition(
+                edition=f'{i:06d}',
+                publication=f'P{i:03d}',
+                edition_number=f'{i:06d}',
+                suffix='A',
+                description=f'PUBLICATION {i}',
+                vasp_code='',
+                vasp_description='',
+            )
+            for i in range(0, LINE_COUNT, 2)
+        )
+    return x3_db
+
+
+@pytest.fixture
+def handler():
+    provider = EdiPartner(provider='1526', master_data=YesNo.YES, counter_files=[COUNTER])
+    task = TransferTask(delete=False, direction=ImportExport.IMPORT, index=0, is_active=True)
+    return FranceMessagerieHandler(provider, task)
+
+
+@pytest.fixture
+def parsed(tmp_path):
+    return FixedFormatParser().parse(write_fm_file(tmp_path / 'fm.txt', LINE_COUNT), recipe('mmap'))
+
+
+def sequence_numbers(db) -> list:
+    with db.get_db() as session:
+        return list(session.scalars(select(SequenceNumbers.sequence_number)))
+
+
+def test_post_process_writes_the_numbered_invoice(handler_db, handler, parsed):
+    assert handler.post_process(parsed)
+
+    with handler_db.get_db() as session:
+        header = session.execute(select(PurchaseInvoiceHeader.__table__)).mappings().one()
+        lines = session.scalars(select(PurchaseInvoiceLines).order_by(PurchaseInvoiceLines.line_number)).all()
+
+        assert header['NUM_0'] == 'FM000001'
+        assert header['LINNBR_0'] == LINE_COUNT
+        assert len(lines) == LINE_COUNT
+        assert {line.invoice_number for line in lines} == {'FM000001'}
+        # The editions found in ZITMINP (even lines) and those the run created (odd lines) are on their
+        # lines, whether or not they were cached
+        for line in lines:
+            index = line.line_number - 1
+            assert (line.edition, line.publication) == (f'{index:06d}', f'P{index:03d}')
+        assert session.scalar(select(func.count()).select_from(Edition)) == LINE_COUNT
+    assert sequence_numbers(handler_db) == [1]
+
+
+def test_master_data_rows(handler_db, handler, parsed):
+    details, _ = handler._convert_details(parsed)
+    # A new edition whose publication is not known is not created
+    details[1].description = 'UNKNOWN PUBLICATION'
+    with handler_db.get_db() as session:
+        handler._attach_editions(details, handler._resolve_editions(session, details))
+        header = handler._get_header_data(None, parsed.header['invoice_date'], parsed)
+        invoice = FranceMessagerieInvoice(header=header, details=details, totals=[], footer=None)
+        rows = {row['edition']: row for row in handler._master_data_rows(session, invoice)}
+
+    # The new editions of the odd lines, with their publication, and the even ones whose bipad changed
+    assert sorted(rows) == [f'{i:06d}' for i in range(LINE_COUNT) if i != 1]
+    for code, row in rows.items():
+        assert row['publication'] == f'P{int(code):03d}'
+        assert (row['bipad'], row['nim_code']) == (details[int(code)].bipad, '01')
+
+
+def test_failed_write_does_not_use_a_number(handler_db, handler, parsed, monkeypatch):
+    insert_headers = PurchaseInvoiceRepository.insert_headers
+
+    def failing_insert(self, headers):
+        raise RuntimeError('insert failed')
+
+    monkeypatch.setattr(PurchaseInvoiceRepository, 'insert_headers', failing_insert)
+    assert not handler.post_process(parsed)
+    with handler_db.get_db() as session:
+        assert session.scalar(select(func.count()).select_from(PurchaseInvoiceHeader)) == 0
+    assert sequence_numbers(handler_db) == []
+
+    # The file is processed again: it gets the number that was not used
+    monkeypatch.setattr(PurchaseInvoiceRepository, 'insert_headers', insert_headers)
+    assert handler.post_process(parsed)
+    with handler_db.get_db() as session:
+        assert session.scalar(select(PurchaseInvoiceHeader.invoice_number)) == 'FM000001'
+
+
+def test_invoice_reference_is_read_from_the_header(handler, tmp_path):
+    fm_file = write_fm_file(tmp_path / 'fm.txt', LINE_COUNT)
+    assert handler.get_invoice_reference(fm_file) == 'INV0000001'
+
+    # Only the header is read: the rest of the file is not checked
+    fm_file.write_bytes(fm_file.read_bytes().splitlines(keepends=True)[0] + b'not an FM line\r\n')
+    assert handler.get_invoice_reference(fm_file) == 'INV0000001'
+
+    fm_file.write_bytes(b'3 totals before the header\r\n')
+    assert handler.get_invoice_reference(fm_file) is None
+    fm_file.write_bytes(b'')
+    assert handler.get_invoice_reference(fm_file) is None
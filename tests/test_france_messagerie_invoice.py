@@ -0,0 +1,89 @@
+"""
+FranceMessagerieInvoiceRepository.create_invoice on the SQLite invoice tables: the rows written
+to ZPINVOICEV and ZPINVOICED for a converted France Messagerie invoice.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from benchmarks.fm_sample import write_fm_file
+from benchmarks.invoice_writer import build_invoice
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+from src.repositories.invoices.france_messagerie_invoice import FranceMessagerieInvoiceRepository
+from src.repositories.invoices.purchase_invoice_repository import PurchaseInvoiceRepository
+
+LINE_COUNT = 25
+INVOICE_NUMBER = 'PI0000001'
+SUPPLIER = 'FM'
+
+
+def assert_stored(stored: Decimal, value: Decimal, attribute):
+    """The database keeps the scale of the column: `value` is stored rounded to it."""
+    scale = attribute.property.columns[0].type.scale
+    assert abs(stored - value) <= Decimal(5).scaleb(-scale - 1)
+
+
+@pytest.fixture
+def invoice(tmp_path):
+    return build_invoice(write_fm_file(tmp_path / 'fm.txt', LINE_COUNT))
+
+
+@pytest.fixture
+def written(invoice_db, invoice):
+    # A batch smaller than the invoice: several executemany batches
+    with invoice_db.get_db() as session:
+        repository = FranceMessagerieInvoiceRepository(session)
+        repository.writer = PurchaseInvoiceRepository(session, batch_size=10)
+        assert repository.create_invoice(invoice, INVOICE_NUMBER, SUPPLIER, 'fm.txt') == LINE_COUNT
+    return invoice_db
+
+
+def test_create_invoice_writes_the_header(written, invoice):
+    with written.get_db() as session:
+        header = session.execute(select(PurchaseInvoiceHeader.__table__)).mappings().one()
+
+    totals = invoice.totals[0].decimal_amounts()
+    assert header['NUM_0'] == INVOICE_NUMBER
+    assert header['BPR_0'] == SUPPLIER
+    assert header['BPRVCR_0'] == invoice.header.invoice_number
+    assert header['BPRDAT_0'] == datetime.combine(invoice.header.invoice_date, datetime.min.time())
+    assert header['LINNBR_0'] == LINE_COUNT
+    # SQLite keeps the amounts as floats: the totals of the file have 4 decimal places
+    assert header['AMTATI_0'].quantize(Decimal('0.0001')) == totals['total_amount_including_tax']
+    assert header['AMTNOT_0'].quantize(Decimal('0.0001')) == totals['total_amount_excluding_tax']
+
+
+def test_create_invoice_writes_the_lines(written, invoice):
+    columns = (
+        PurchaseInvoiceLines.invoice_number,
+        PurchaseInvoiceLines.line_number,
+        PurchaseInvoiceLines.quantity,
+        PurchaseInvoiceLines.net_price,
+        PurchaseInvoiceLines.amount_excluding_tax,
+        PurchaseInvoiceLines.amount_including_tax,
+    )
+    with written.get_db() as session:
+        lines = session.execute(select(*columns).order_by(PurchaseInvoiceLines.line_number)).all()
+
+    assert [line.line_number for line in lines] == list(range(1, LINE_COUNT + 1))
+    for line, detail in zip(lines, invoice.details, strict=True):
+        amounts = detail.decimal_amounts()
+        assert line.invoice_number == INVOICE_NUMBER
+        assert line.quantity == detail.quantity
+        assert_stored(line.net_price, amounts['net_price_with_discount'], PurchaseInvoiceLines.net_price)
+        assert_stored(
+            line.amount_excluding_tax,
+            amounts['amount_without_tax_with_discount'],
+            PurchaseInvoiceLines.amount_excluding_tax,
+        )
+        assert_stored(line.amount_including_tax, amounts['amount_with_tax'], PurchaseInvoiceLines.amount_including_tax)
+
+
+def test_written_invoice_is_found_by_the_supplier_lookup(written, invoice):
+    with written.get_db() as session:
+        repository = PurchaseInvoiceRepository(session)
+        assert repository.supplier_invoice_exists(SUPPLIER, invoice.header.invoice_number)
+        assert not repository.supplier_invoice_exists(SUPPLIER, 'UNKNOWN')
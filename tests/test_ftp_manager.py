@@ -0,0 +1,98 @@
+"""
+FtpManager.delete_files against an in-memory FTP client: the DELE commands sent in a pipeline,
+and the serial fallback when the server loses track of the pipelined replies.
+"""
+
+from ftplib import error_perm, error_proto
+
+import pytest
+
+from src.config.connection_ftp import FtpConfig
+from src.transfer import ftp_manager
+from src.transfer.ftp_manager import FtpManager
+
+HOST = 'ftp.example.com'
+
+
+class FakeFTP:
+    """Keeps the files of the server; with `pipelining=False` the first pipelined reply is garbled."""
+
+    files: set[str] = set()
+    pipelining = True
+    connections = 0
+
+    def __init__(self, encoding='utf-8'):
+        self.sent: list[str] = []
+        self.closed = False
+
+    @staticmethod
+    def connect(host, port, timeout=None):
+        FakeFTP.connections += 1
+
+    def login(self, user, password):
+        pass
+
+    def set_pasv(self, value):
+        pass
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+    def putcmd(self, command):
+        self.sent.append(command)
+
+    def voidresp(self):
+        path = self.sent.pop(0).removeprefix('DELE ')
+        if not FakeFTP.pipelining:
+            raise error_proto('garbled reply')
+        self.delete(path)
+
+    @staticmethod
+    def delete(path):
+        if path not in FakeFTP.files:
+            raise error_perm(f'550 {path}: no such file')
+        FakeFTP.files.remove(path)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(ftp_manager, 'FTP', FakeFTP)
+    monkeypatch.setattr(FtpManager, '_no_pipelining_hosts', set())
+    monkeypatch.setattr(FakeFTP, 'files', {f'/out/{i}.txt' for i in range(40)})
+    monkeypatch.setattr(FakeFTP, 'pipelining', True)
+    monkeypatch.setattr(FakeFTP, 'connections', 0)
+    return FakeFTP
+
+
+def delete_files(paths: list[str]) -> dict[str, bool]:
+    with FtpManager(FtpConfig(host=HOST, user='user', password='secret')) as manager:
+        return manager.delete_files(paths)
+
+
+def test_pipelined_deletes(server):
+    paths = [f'/out/{i}.txt' for i in range(40)] + ['/out/missing.txt']
+
+    results = delete_files(paths)
+
+    assert results == {**dict.fromkeys(paths[:-1], True), '/out/missing.txt': False}
+    assert server.files == set()
+    assert server.connections == 1
+
+
+def test_deletes_are_retried_one_by_one_without_pipelining(server):
+    server.pipelining = False
+    paths = sorted(server.files)
+
+    assert delete_files(paths) == dict.fromkeys(paths, True)
+    # Every file is removed in the same run, on a new connection
+    assert server.files == set()
+    assert server.connections == 2
+    assert HOST in FtpManager._no_pipelining_hosts
+
+    # The server is known: the next run deletes one by one straight away
+    server.files = {'/out/next.txt'}
+    assert delete_files(['/out/next.txt']) == {'/out/next.txt': True}
+    assert server.connections == 3
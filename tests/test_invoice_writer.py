@@ -0,0 +1,110 @@
+"""
+InvoiceWriter on the SQLite invoice tables: single-transaction and chunked writes, and that
+no partial invoice is ever visible in ZPINVOICEV or ZPINVOICED.
+"""
+
+import pytest
+from sqlalchemy import func, select
+
+from src.models.edi_purchase_invoice import PurchaseInvoiceHeader, PurchaseInvoiceLines
+from src.services.invoice_writer import InvoiceWriter
+
+CHUNK_LINES = 5
+LINE_COUNT = 12
+
+
+@pytest.fixture(autouse=True)
+def writer_db(invoice_db, monkeypatch):
+    monkeypatch.setattr('src.services.invoice_writer.db', invoice_db)
+    return invoice_db
+
+
+def header_row(invoice_number: str = 'PI001') -> dict:
+    return {'invoice_number': invoice_number, 'supplier': 'FM', 'document_lines': LINE_COUNT, 'liquidation_number': ''}
+
+
+def line_rows(invoice_number: str = 'PI001', count: int = LINE_COUNT):
+    for line_number in range(1, count + 1):
+        yield {'invoice_number': invoice_number, 'line_number': line_number, 'supplier': 'FM', 'quantity': line_number}
+
+
+def counts(db) -> tuple[int, int]:
+    with db.get_db() as session:
+        headers = session.scalar(select(func.count()).select_from(PurchaseInvoiceHeader))
+        lines = session.scalar(select(func.count()).select_from(PurchaseInvoiceLines))
+    return headers, lines
+
+
+def stage_tables(db) -> list[str]:
+    """The stage tables left behind (on SQLite, '#' does not make a table temporary)."""
+    query = "SELECT name FROM sqlite_master WHERE name LIKE '#%' UNION ALL SELECT name FROM sqlite_temp_master"
+    with db.engine.connect() as connection:
+        return list(connection.exec_driver_sql(query).scalars())
+
+
+def test_small_invoice_in_one_transaction(writer_db):
+    assert InvoiceWriter(CHUNK_LINES).write(header_row(), line_rows(count=3), 3) == 3
+    assert counts(writer_db) == (1, 3)
+
+
+def test_chunked_invoice_is_published_with_its_header(writer_db):
+    assert InvoiceWriter(CHUNK_LINES).write(header_row(), line_rows(), LINE_COUNT) == LINE_COUNT
+    assert counts(writer_db) == (1, LINE_COUNT)
+    assert not stage_tables(writer_db)
+
+    columns = (PurchaseInvoiceLines.quantity, PurchaseInvoiceLines.uniqueID, PurchaseInvoiceLines.createUser)
+    with writer_db.get_db() as session:
+        lines = session.execute(select(*columns).order_by(PurchaseInvoiceLines.line_number)).all()
+    assert [line.quantity for line in lines] == list(range(1, LINE_COUNT + 1))
+    # The AUUID_0 default is drawn per row by the INSERT ... SELECT
+    assert len({line.uniqueID for line in lines}) == LINE_COUNT
+    assert all(line.createUser == 'ZINTR' for line in lines)
+
+
+def test_staged_lines_are_not_visible_before_the_header(writer_db):
+    seen = []
+
+    def lines():
+        for row in line_rows():
+            # Other sessions see nothing of the invoice while its chunks are staged
+            seen.append(counts(writer_db))
+            yield row
+
+    InvoiceWriter(CHUNK_LINES).write(header_row(), lines(), LINE_COUNT)
+    assert set(seen) == {(0, 0)}
+
+
+def test_failure_while_staging_publishes_nothing(writer_db):
+    def lines():
+        for row in line_rows():
+            if row['line_number'] == CHUNK_LINES + 2:
+                raise ValueError('bad line')
+            yield row
+
+    with pytest.raises(ValueError, match='bad line'):
+        InvoiceWriter(CHUNK_LINES).write(header_row(), lines(), LINE_COUNT)
+    assert counts(writer_db) == (0, 0)
+    assert not stage_tables(writer_db)
+
+
+def test_failure_while_publishing_publishes_nothing(writer_db):
+    InvoiceWriter(CHUNK_LINES).write(header_row(), line_rows(count=1), 1)
+
+    # NUM_0 is unique in ZPINVOICEV: the header insert of the same invoice number fails
+    with pytest.raises(Exception, match='UNIQUE'):
+        InvoiceWriter(CHUNK_LINES).write(header_row(), line_rows(), LINE_COUNT)
+    assert counts(writer_db) == (1, 1)
+    assert not stage_tables(writer_db)
+
+
+@pytest.mark.parametrize('line_count', [3, LINE_COUNT], ids=['single', 'chunked'])
+def test_numbering_sets_the_number_of_the_header_and_its_lines(writer_db, line_count):
+    def numbering(session):
+        # Drawn in the transaction that publishes the header: nothing is visible yet
+        assert session.scalar(select(func.count()).select_from(PurchaseInvoiceHeader)) == 0
+        return 'PI999'
+
+    InvoiceWriter(CHUNK_LINES).write(header_row(''), line_rows('', line_count), line_count, numbering=numbering)
+    with writer_db.get_db() as session:
+        assert session.scalar(select(PurchaseInvoiceHeader.invoice_number)) == 'PI999'
+        assert set(session.scalars(select(PurchaseInvoiceLines.invoice_number))) == {'PI999'}
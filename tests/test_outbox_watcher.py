@@ -0,0 +1,82 @@
+"""
+ScandirBackend, the outbox watcher's fallback without inotify: how often it reads the folders and
+when a new file is reported.
+"""
+
+import os
+
+import pytest
+
+from src.scheduler import outbox_watcher
+from src.scheduler.outbox_watcher import ScandirBackend
+
+POLL_SECONDS = 5.0
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The poll does not wait: the requested sleeps are recorded."""
+    recorded = []
+    monkeypatch.setattr(outbox_watcher.time, 'sleep', recorded.append)
+    return recorded
+
+
+def write(path, data: bytes, mtime: int):
+    with open(path, 'ab') as file:
+        file.write(data)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_poll_waits_for_the_configured_interval(tmp_path, sleeps):
+    backend = ScandirBackend([str(tmp_path)], POLL_SECONDS)
+    backend.poll(timeout=1.0)
+    assert sleeps == [POLL_SECONDS]
+
+
+def test_new_file_is_reported_once_it_has_settled(tmp_path, sleeps):
+    folder = str(tmp_path)
+    backend = ScandirBackend([folder], POLL_SECONDS)
+    write(tmp_path / 'out.txt', b'first part', mtime=1_000)
+
+    # Seen for the first time: it may still be written to
+    assert backend.poll(timeout=1.0) == []
+    # It grows between two reads
+    write(tmp_path / 'out.txt', b' second part', mtime=2_000)
+    assert backend.poll(timeout=1.0) == []
+    # Same size and mtime as in the previous read
+    assert backend.poll(timeout=1.0) == [(folder, 'out.txt')]
+    # Reported only once, even if the folder is read again
+    assert backend.poll(timeout=1.0) == []
+    assert backend.poll(timeout=1.0) == []
+
+
+def test_file_removed_before_it_settles_is_not_reported(tmp_path, sleeps):
+    backend = ScandirBackend([str(tmp_path)], POLL_SECONDS)
+    write(tmp_path / 'out.txt', b'data', mtime=1_000)
+
+    assert backend.poll(timeout=1.0) == []
+    os.remove(tmp_path / 'out.txt')
+    assert backend.poll(timeout=1.0) == []
+    assert backend.poll(timeout=1.0) == []
+
+
+def test_files_already_in_the_folder_are_not_reported(tmp_path, sleeps):
+    write(tmp_path / 'old.txt', b'data', mtime=1_000)
+    backend = ScandirBackend([str(tmp_path)], POLL_SECONDS)
+
+    assert backend.poll(timeout=1.0) == []
+    assert backend.poll(timeout=1.0) == []
+
+
+def test_file_replaced_under_the_same_name_is_reported_again(tmp_path, sleeps):
+    folder = str(tmp_path)
+    backend = ScandirBackend([folder], POLL_SECONDS)
+    write(tmp_path / 'out.txt', b'first', mtime=1_000)
+    assert backend.poll(timeout=1.0) == []
+    assert backend.poll(timeout=1.0) == [(folder, 'out.txt')]
+
+    # A new version is written aside and moved over the file: the folder changes, the name does not
+    write(tmp_path / 'out.tmp', b'second version', mtime=2_000)
+    os.replace(tmp_path / 'out.tmp', tmp_path / 'out.txt')
+    assert backend.poll(timeout=1.0) == []
+    assert backend.poll(timeout=1.0) == [(folder, 'out.txt')]
@@ -0,0 +1,93 @@
+"""
+The description tiers of PublicationRepository.find_publication_code on the SQLite X3 tables: the
+queries (single and batch) and the in-memory DescriptionIndex pick the same publications.
+"""
+
+import pytest
+
+from src.models.publication import Publication
+from src.repositories.description_index import CASE_SENSITIVE_DESCRIPTIONS, DescriptionIndex, clean_description
+from src.repositories.publication_repository import PublicationRepository
+from src.repositories.reference_cache import ReferenceCache
+
+SUPPLIER = '1526'
+
+# (code, DESPUB_0, BPSREF_0)
+PUBLICATIONS = [
+    ('P01', 'LE MONDE', 'OTHER'),
+    ('P02', 'Le Monde', SUPPLIER),
+    ('P03', 'Le Figaro', SUPPLIER),
+    ('P04', 'Le Figaro', 'OTHER'),
+    ('P05', " L'EQUIPE", SUPPLIER),
+    ('P06', "L'EQUIPE  ", 'OTHER'),
+    ('P07', 'LIBERATION\t', SUPPLIER),
+    ('P08', '100% FOOT', 'OTHER'),
+    ('P09', '100X FOOT', 'OTHER'),
+    ('P10', 'A_B', 'OTHER'),
+    ('P11', 'AXB', SUPPLIER),
+    ('P12', 'le parisien', SUPPLIER),
+]
+
+DESCRIPTIONS = [
+    *(description for _, description, _ in PUBLICATIONS),
+    'le monde',
+    '  LE FIGARO  ',
+    'LIBERATION',
+    'LE PARISIEN',
+    'UNKNOWN',
+]
+
+
+@pytest.fixture
+def publications_db(x3_db):
+    with x3_db.get_db() as session:
+        session.add_all(
+            Publication(code=code, description=description, supplier_reference=supplier)
+            for code, description, supplier in PUBLICATIONS
+        )
+    return x3_db
+
+
+def repository(session, use_index: bool) -> PublicationRepository:
+    settings = {'CACHE_ENABLED': use_index}
+    return PublicationRepository(session, ReferenceCache('publications', settings), DescriptionIndex(settings))
+
+
+def test_queries_and_index_pick_the_same_publications(publications_db):
+    cleaned = {clean_description(description) for description in DESCRIPTIONS}
+    with publications_db.get_db() as session:
+        queried = repository(session, use_index=False)._description_matches(SUPPLIER, cleaned)
+        indexed = repository(session, use_index=True)._description_matches(SUPPLIER, cleaned)
+        single = {
+            description: repository(session, use_index=False).find_publication_code('0000', SUPPLIER, description)
+            for description in DESCRIPTIONS
+        }
+
+    assert queried == indexed
+    assert single == {description: queried.get(clean_description(description)) for description in DESCRIPTIONS}
+
+
+def test_description_tiers(publications_db):
+    with publications_db.get_db() as session:
+        codes = {
+            description: repository(session, use_index=False).find_publication_code('0000', SUPPLIER, description)
+            for description in DESCRIPTIONS
+        }
+
+    # Tier 3: the raw description starts with the cleaned one
+    assert codes['LE MONDE'] == codes['le monde'] == 'P01'
+    # The LIKE wildcards of a description are matched as they are
+    assert (codes['100% FOOT'], codes['100X FOOT'], codes['A_B']) == ('P08', 'P09', 'P10')
+    # Tier 4: the supplier's publication, whose raw description does not start with the cleaned one
+    assert codes[" L'EQUIPE"] == 'P05'
+    assert codes['AXB'] == 'P11'
+    # Only spaces are trimmed, as by LTRIM/RTRIM
+    assert codes['LIBERATION\t'] == 'P07'
+    assert codes['LIBERATION'] is None
+    assert codes['UNKNOWN'] is None
+
+    # The prefix is compared with the collation of DESPUB_0 (Latin1_General_BIN2: case-sensitive)
+    assert CASE_SENSITIVE_DESCRIPTIONS
+    # Not a prefix match: the supplier's publication wins over the other supplier's
+    assert codes['Le Figaro'] == codes['  LE FIGARO  '] == 'P03'
+    assert codes['le parisien'] == codes['LE PARISIEN'] == 'P12'
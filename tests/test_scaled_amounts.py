@@ -0,0 +1,205 @@
+"""
+The scaled-integer amounts of France Messagerie (src/utils/money.py and the handler) against
+the same formulas in Decimal arithmetic, on seeded random fields and on the field-width boundaries.
+"""
+
+import random
+from decimal import Decimal, localcontext
+
+import pytest
+
+from src.models.data_models import (
+    FM_DISCOUNTED_SCALE,
+    FM_PRICE_SCALE,
+    FM_RECONCILE_SCALE,
+    FranceMessagerieRunningTotals,
+    FranceMessagerieTotals,
+)
+from src.processing.handlers.france_messagerie_handler import FranceMessagerieHandler
+from src.processing.parsers.decoders import compile_decoders
+from src.utils.conversions import Conversions
+from src.utils.money import rescale, to_decimal
+
+SEED = 20250814
+RANDOM_CASES = 2000
+# Share of random detail lines with a negative quantity (credit and return lines)
+NEGATIVE_SHARE = 0.2
+
+RECIPE = FranceMessagerieHandler.get_parser_config(None)
+
+
+def field_width(section: str, field_name: str) -> int:
+    start, end = RECIPE[f'{section}_map'][field_name]
+    return end - start
+
+
+DETAIL_AMOUNT_FIELDS = ('net_price', 'discount', 'weight', 'gross_price', 'tax')
+TOTALS_FIELDS = ('total_amount_including_tax', 'total_amount_excluding_tax')
+DETAIL_DECODERS = compile_decoders(RECIPE['detail_decoders'])
+TOTALS_DECODERS = compile_decoders(RECIPE['totals_decoders'])
+
+
+def decimal_detail_amounts(fields: dict[str, str]) -> dict[str, Decimal]:
+    """The amounts of a detail line in Decimal arithmetic: net_price * (1 - discount / 100), signed quantities."""
+    quantity = Conversions.to_int(fields['quantity'].strip()) or 0
+
+    net_price = Decimal(fields['net_price']) / 10000
+    discount = Decimal(fields['discount'].strip()) / 1000
+    gross_price = Decimal(fields['gross_price']) / 10000
+    weight = Decimal(fields['weight']) / 10000
+    tax = Decimal(fields['tax']) / 10000
+    net_price_with_discount = net_price * (1 - discount / 100)
+
+    return {
+        'quantity': quantity,
+        'net_price': net_price,
+        'discount': discount,
+        'weight': weight,
+        'gross_price': gross_price,
+        'tax': tax,
+        'amount_with_tax': gross_price * quantity,
+        'amount_without_tax': net_price * quantity,
+        'net_price_with_discount': net_price_with_discount,
+        'amount_without_tax_with_discount': net_price_with_discount * quantity,
+    }
+
+
+def legacy_total(value: str) -> Decimal:
+    """The Decimal arithmetic of FranceMessagerieHandler._get_totals_data before the scaled integers."""
+    total = Conversions.to_decimal(value, default=Decimal('0'))
+    return total / Decimal('10000') if total is not None else Decimal('0')
+
+
+def digits(rng: random.Random, width: int) -> str:
+    return ''.join(rng.choice('0123456789') for _ in range(width))
+
+
+def random_detail_fields(rng: random.Random) -> dict[str, str]:
+    fields = {name: digits(rng, field_width('detail', name)) for name in DETAIL_AMOUNT_FIELDS}
+    quantity = digits(rng, field_width('detail', 'quantity'))
+    # The sign takes the first position of the field
+    fields['quantity'] = '-' + quantity[1:] if rng.random() < NEGATIVE_SHARE else quantity
+    return fields
+
+
+def boundary_detail_fields() -> list[dict[str, str]]:
+    """Every field at zero, at one unit of its scale and at its largest value."""
+    cases = []
+    for fill in ('0', '1', '9'):
+        fields = {
+            name: (fill * field_width('detail', name) if fill != '1' else '1'.zfill(field_width('detail', name)))
+            for name in (*DETAIL_AMOUNT_FIELDS, 'quantity')
+        }
+        cases.append(fields)
+        cases.append({**fields, 'quantity': '-' + fields['quantity'][1:]})
+    return cases
+
+
+def convert_detail(fields: dict[str, str]):
+    raw = dict(fields)
+    for name, decode in DETAIL_DECODERS.items():
+        raw[name] = decode(fields[name])
+    return raw, FranceMessagerieHandler._get_details_data(raw)
+
+
+def detail_cases() -> list[dict[str, str]]:
+    rng = random.Random(SEED)
+    return boundary_detail_fields() + [random_detail_fields(rng) for _ in range(RANDOM_CASES)]
+
+
+def test_rescale_is_exact_and_refuses_to_round():
+    assert rescale(12345, FM_PRICE_SCALE, FM_PRICE_SCALE) == 12345
+    assert rescale(12345, FM_PRICE_SCALE, FM_DISCOUNTED_SCALE) == 1234500000
+    assert rescale(-1, FM_PRICE_SCALE, FM_RECONCILE_SCALE) == -100000
+    with pytest.raises(ValueError, match='without rounding'):
+        rescale(1234500000, FM_DISCOUNTED_SCALE, FM_PRICE_SCALE)
+
+
+@pytest.mark.parametrize(
+    ('units', 'scale', 'expected'),
+    [
+        (None, 4, None),
+        (0, 4, Decimal('0')),
+        (1, 4, Decimal('0.0001')),
+        (-1, 5, Decimal('-0.00001')),
+        (12345, 4, Decimal('1.2345')),
+        (10**15 - 1, 4, Decimal('99999999999.9999')),
+        # Beyond the 28 digits of the default context: still exact
+        (10**30 + 1, 4, Decimal('100000000000000000000000000.0001')),
+        (-(10**40) - 7, 9, Decimal('-10000000000000000000000000000000.000000007')),
+    ],
+)
+def test_to_decimal(units, scale, expected):
+    value = to_decimal(units, scale)
+    if expected is None:
+        assert value is None
+    else:
+        assert value == expected
+        assert value.as_tuple().exponent == -scale
+
+
+@pytest.mark.parametrize('fields', detail_cases())
+def test_detail_amounts_match_the_decimal_arithmetic(fields):
+    _, detail = convert_detail(fields)
+    with localcontext() as context:
+        context.prec = 60
+        expected = decimal_detail_amounts(fields)
+
+    assert detail.quantity == expected.pop('quantity')
+    # Equal values; the scaled integers always carry every decimal place of their scale
+    assert detail.decimal_amounts() == expected
+
+
+def test_totals_match_the_decimal_arithmetic():
+    rng = random.Random(SEED)
+    widths = {name: field_width('totals', name) for name in TOTALS_FIELDS}
+    cases = [{name: fill * width for name, width in widths.items()} for fill in ('0', '9')]
+    cases += [{name: digits(rng, width) for name, width in widths.items()} for _ in range(RANDOM_CASES)]
+
+    for fields in cases:
+        raw = {name: TOTALS_DECODERS[name](value) for name, value in fields.items()}
+        totals = FranceMessagerieHandler._get_totals_data(raw)
+        assert totals.decimal_amounts() == {name: legacy_total(value) for name, value in fields.items()}
+
+
+def test_running_totals_sum_the_persisted_amounts():
+    cases = detail_cases()
+    running_totals = FranceMessagerieRunningTotals()
+    details = []
+    for fields in cases:
+        _, detail = convert_detail(fields)
+        running_totals.add(detail)
+        details.append(detail)
+
+    with localcontext() as context:
+        context.prec = 60
+        expected = [decimal_detail_amounts(fields) for fields in cases]
+        including_tax = sum(amounts['amount_with_tax'] for amounts in expected)
+        excluding_tax = sum(amounts['amount_without_tax_with_discount'] for amounts in expected)
+        # What the lines of the invoice are written with (ZPINVOICED)
+        persisted_excluding_tax = sum(
+            detail.decimal_amounts()['amount_without_tax_with_discount'] for detail in details
+        )
+
+    assert to_decimal(running_totals.total_amount_including_tax, FM_RECONCILE_SCALE) == including_tax
+    assert to_decimal(running_totals.total_amount_excluding_tax, FM_RECONCILE_SCALE) == excluding_tax
+    assert persisted_excluding_tax == excluding_tax
+    # Credit and return lines are subtracted
+    assert any(amounts['quantity'] < 0 for amounts in expected)
+
+
+def test_running_totals_mismatches_within_tolerance():
+    fields = {'quantity': '0000010', 'net_price': '0000012345', 'discount': '25000', 'weight': '0000'}
+    fields |= {'gross_price': '1500', 'tax': '000000'}
+    _, detail = convert_detail(fields)
+    running_totals = FranceMessagerieRunningTotals()
+    running_totals.add(detail)
+
+    # 0.15 * 10 incl. tax, 1.2345 * 0.75 * 10 = 9.25875 excl. tax: the file rounds it to 9.2588
+    exact = FranceMessagerieTotals(total_amount_including_tax=15000, total_amount_excluding_tax=92588)
+    assert not running_totals.mismatches([exact], Decimal('0.01'))
+
+    off_by_two_cents = FranceMessagerieTotals(total_amount_including_tax=15200, total_amount_excluding_tax=92588)
+    assert running_totals.mismatches([off_by_two_cents], Decimal('0.01')) == {
+        'total_amount_including_tax': (Decimal('1.52'), Decimal('1.50')),
+    }
@@ -0,0 +1,112 @@
+"""
+BaseTransferStrategy.process_download with an in-memory file server: the files are downloaded as
+the orchestrator asks for them, so the downloads overlap the parsing of the files before them.
+The handler work is replaced by recorded events.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from src.config.settings import PARALLEL_PARSING
+from src.models.data_models import TransferTask
+from src.models.edi_partner import EdiPartner
+from src.processing import orchestrator
+from src.processing.orchestrator import FileProcessingOrchestrator
+from src.services.strategies.base import BaseTransferStrategy
+from src.utils.local_menus import ImportExport
+
+FILE_COUNT = 12
+FAILED_DOWNLOAD = 'F05.txt'
+
+
+class FakeManager:
+    def __init__(self, events: list):
+        self.events = events
+
+    @staticmethod
+    def list_files(remote_path: str, pattern: str) -> list[str]:
+        return [f'{remote_path}/F{i:02d}.txt' for i in range(FILE_COUNT)]
+
+    def download_file(self, remote_path: str, local_path: str) -> bool:
+        name = remote_path.rsplit('/', 1)[-1]
+        self.events.append(('download', name))
+        if name == FAILED_DOWNLOAD:
+            return False
+        with open(local_path, 'w', encoding='latin-1') as file:
+            file.write(name)
+        return True
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """The business logic of each file is replaced by a 'finish' event."""
+    recorded = []
+
+    def finish(self, handler, file_path, parsed_data, key):
+        assert parsed_data == file_path.name
+        recorded.append(('finish', file_path.name))
+        return True
+
+    monkeypatch.setattr(
+        FileProcessingOrchestrator, '_create_handler', lambda self: SimpleNamespace(get_parser_config=dict)
+    )
+    monkeypatch.setattr(FileProcessingOrchestrator, '_claim', lambda self, handler, file_path: (file_path.name, False))
+    monkeypatch.setattr(FileProcessingOrchestrator, '_finish', finish)
+    monkeypatch.setattr(orchestrator, 'parse_file', lambda file_path, parser_config: file_path.name)
+    return recorded
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Files are parsed side by side by 2 workers (threads here), with a window of 4 files."""
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_WORKERS', 2)
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_FILES_IN_POOL', True)
+    monkeypatch.setattr(orchestrator, 'get_process_pool', lambda: executor)
+    yield executor
+    executor.shutdown()
+
+
+def run_download(tmp_path, events) -> BaseTransferStrategy:
+    provider = EdiPartner(provider='1526', remote_input_folder='/out', remote_output_folder='/out')
+    provider._local_input_folder = str(tmp_path)
+    strategy = BaseTransferStrategy(FakeManager(events), provider)
+    task = TransferTask(delete=True, direction=ImportExport.IMPORT, index=0, is_active=True, filename='*.txt')
+    strategy.process_download(task)
+    return strategy
+
+
+def names(events: list, kind: str) -> list[str]:
+    return [name for event_kind, name in events if event_kind == kind]
+
+
+def test_downloads_overlap_the_parse_window(tmp_path, events, pool):
+    strategy = run_download(tmp_path, events)
+
+    downloaded = [f'F{i:02d}.txt' for i in range(FILE_COUNT)]
+    assert names(events, 'download') == downloaded
+    assert names(events, 'finish') == [name for name in downloaded if name != FAILED_DOWNLOAD]
+    assert strategy.pending_remote_deletes == [f'/out/{name}' for name in names(events, 'finish')]
+
+    # The first file is processed before the last ones are downloaded. Ahead of the files processed
+    # are at most the window (4 files), the file being processed and the download that failed
+    window = PARALLEL_PARSING['PARSE_WORKERS'] * 2
+    for finished, index in enumerate(i for i, (kind, _) in enumerate(events) if kind == 'finish'):
+        downloads_before = len(names(events[:index], 'download'))
+        assert downloads_before <= finished + window + 2
+    assert events.index(('finish', 'F00.txt')) < events.index(('download', f'F{FILE_COUNT - 1:02d}.txt'))
+
+
+def test_without_the_pool_each_file_is_processed_before_the_next_download(tmp_path, events, monkeypatch):
+    monkeypatch.setitem(PARALLEL_PARSING, 'PARSE_WORKERS', 1)
+    run_download(tmp_path, events)
+
+    expected = []
+    for i in range(FILE_COUNT):
+        name = f'F{i:02d}.txt'
+        expected.append(('download', name))
+        if name != FAILED_DOWNLOAD:
+            expected.append(('finish', name))
+    assert events == expected